@@ -0,0 +1,72 @@
+"""
+In-memory item selection for the adaptive final assessment.
+
+Each course gets a QuestionBank built from its compiled answer key
+(answer_keys.py) and the course's IRT item table (irt.py). A learner's
+answered questions are an int bitset over the key positions, so "has this
+been seen" is one bit test, and picking the most informative unanswered item
+for the current ability estimate is a walk down a precomputed row instead of
+a NOT IN (...) query that grows with every step. Questions without
+calibrated parameters use their easy / medium / hard label (see irt.py).
+
+Banks follow the answer key's version, so they are rebuilt whenever the
+course's questions change (update_course, AI-generated questions) or are
+recalibrated (analyse_items.py, calibrate_irt.py), on every worker.
+"""
+import random
+import threading
+
+import answer_keys
+import irt
+
+
+class QuestionBank:
+    def __init__(self, key, parameters=None):
+        self.key = key
+        self.items = irt.table_for(key, parameters or {})
+
+    def answered_bits(self, question_ids):
+        """Bitset of the key positions of already answered question ids."""
+        bits = 0
+        position = self.key.position
+        for qid in question_ids:
+            p = position.get(qid)
+            if p is not None:
+                bits |= 1 << p
+        return bits
+
+    def pick_informative(self, theta, answered_bits, rng):
+        """Position of a highly informative unanswered question at ability theta, or None."""
+        return self.items.pick(theta, answered_bits, rng)
+
+    def question(self, p):
+        """Learner-facing payload (no answers) of the question at position p."""
+        return dict(self.key.questions[p], difficulty=self.key.difficulties[p])
+
+
+_banks = {}
+_lock = threading.Lock()
+
+
+def bank_for(db, course_id):
+    key = answer_keys.for_course(db, course_id)
+    bank = _banks.get(course_id)
+    if bank is None or bank.key is not key:
+        bank = QuestionBank(key, irt.load_parameters(db, course_id))
+        with _lock:
+            _banks[course_id] = bank
+    return bank
+
+
+def rng_for(user_id, course_id, step):
+    """
+    Per-learner generator: every learner draws from the most informative
+    items in their own order, while a retried request for the same step draws
+    the same question.
+    """
+    return random.Random(f"{user_id}:{course_id}:{step}")
+
+
+def clear():
+    with _lock:
+        _banks.clear()
@@ -0,0 +1,38 @@
+"""
+Recompute per-question item statistics (p-value, point-biserial
+discrimination, distractor counts) from all stored quiz attempts.
+See item_analysis.py.
+
+    python analyse_items.py                      # every course
+    python analyse_items.py --course 3           # one course
+    python analyse_items.py --recalibrate        # also reset easy/medium/hard labels from p-values
+"""
+import argparse
+import time
+
+import database
+import item_analysis
+import models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=item_analysis.CHUNK_SIZE)
+    parser.add_argument("--recalibrate", action="store_true")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    started = time.perf_counter()
+    try:
+        analysed = item_analysis.analyse(db, course_id=args.course, chunk_size=args.chunk_size, recalibrate=args.recalibrate)
+    finally:
+        db.close()
+    print(f"Item analysis complete: {analysed} questions in {time.perf_counter() - started:.1f}s")
+    if args.recalibrate:
+        print("Difficulty labels updated. Running servers pick them up on their next answer key lookup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Compiled answer keys for quiz grading.
+
+A key is built once per module quiz and once per course assessment from the
+questions / question_options tables and kept in memory: parallel tuples of
+question ids, "is MCQ" flags and expected answers (correct option index or
+the normalised answer text), plus the review and question payloads the quiz
+endpoints return. Grading a submission is then a lookup and a single pass
+over the answers, with no question queries.
+
+Keys are versioned by courses.question_version, which bump_version()
+increments in the same transaction as any change to a course's questions
+(update_course, AI-generated questions, recalibrated labels or item
+parameters). Each lookup reads it back with a primary-key query, so every
+worker recompiles a stale key on its next lookup, whether or not the
+workers share a cache.
+"""
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+import cache
+import models
+
+KEY_CACHE_SIZE = 1024
+
+# Stand-in for an answer that cannot be read as an option index; never equals an expected value.
+_INVALID = object()
+
+
+class AnswerKey:
+    __slots__ = ("course_id", "version", "question_ids", "mcq", "expected", "difficulties", "position", "review", "questions")
+
+    def __init__(self, course_id, version, questions, lenient_mcq):
+        self.course_id = course_id
+        self.version = version
+        self.question_ids = tuple(q.id for q in questions)
+        # Module quizzes treat any question with options as MCQ; the final assessment goes by questionType
+        self.mcq = tuple(
+            q.questionType == "mcq" or (lenient_mcq and len(q.options) > 0)
+            for q in questions
+        )
+        self.expected = tuple(
+            q.correctOptionIndex if is_mcq else (q.correctAnswerText or "").strip().lower()
+            for q, is_mcq in zip(questions, self.mcq)
+        )
+        self.difficulties = tuple(q.difficulty or "medium" for q in questions)
+        self.position = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.review = tuple(
+            {
+                "id": q.id,
+                "questionText": q.questionText,
+                "questionType": q.questionType,
+                "options": [{"text": o.text} for o in q.options],
+                "correctOptionIndex": q.correctOptionIndex,
+                "correctAnswerText": q.correctAnswerText
+            } for q in questions
+        )
+        self.questions = tuple(
+            {
+                "id": q.id,
+                "questionText": q.questionText,
+                "questionType": q.questionType,
+                "options": [{"text": o.text} for o in q.options],
+            } for q in questions
+        )
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def positions_for(self, question_ids):
+        """Key positions of the given question ids, skipping ids that are not in this key."""
+        position = self.position
+        return [position[qid] for qid in question_ids if qid in position]
+
+    def grade(self, answers, positions=None):
+        """
+        Number of correct answers. answers[i] is checked against the question at
+        positions[i] (default: key order); extra answers are ignored.
+        """
+        if positions is None:
+            positions = range(len(self.question_ids))
+        mcq, expected = self.mcq, self.expected
+        return sum(
+            expected[p] == _normalise(answer, mcq[p])
+            for p, answer in zip(positions, answers or ())
+        )
+
+    def is_correct(self, question_id, answer):
+        p = self.position.get(question_id)
+        return p is not None and self.expected[p] == _normalise(answer, self.mcq[p])
+
+    def review_for(self, positions=None):
+        if positions is None:
+            return list(self.review)
+        return [self.review[p] for p in positions]
+
+
+def _normalise(answer, is_mcq):
+    if is_mcq:
+        try:
+            return int(answer)
+        except (ValueError, TypeError):
+            return _INVALID
+    return str(answer).strip().lower()
+
+
+_keys = cache.LRUCache(maxsize=KEY_CACHE_SIZE)
+
+
+def _version(db, course_id):
+    """
+    Current question version of a course as a string, None if it does not
+    exist. Adaptive sessions store it, so it has to survive a JSON round trip.
+    """
+    if course_id is None:
+        return None
+    # created_at tells a recreated course apart from a deleted one that had the same id
+    row = db.execute(
+        select(models.Course.question_version, models.Course.created_at).where(models.Course.id == course_id)
+    ).first()
+    if row is None:
+        return None
+    question_version, created_at = row
+    return f"{question_version}@{created_at.isoformat() if created_at else ''}"
+
+
+def bump_version(db, course_id):
+    """Mark a course's questions as changed; commit with the change itself."""
+    db.execute(
+        update(models.Course)
+        .where(models.Course.id == course_id)
+        .values(question_version=models.Course.question_version + 1)
+    )
+
+
+def _load(db, *criteria):
+    return db.scalars(
+        select(models.Question)
+        .where(*criteria)
+        .options(selectinload(models.Question.options))
+        .order_by(models.Question.id)
+    ).all()
+
+
+def for_module(db, module_id):
+    """Answer key of a module quiz, or None if the module does not exist."""
+    key = _keys.get(("module", module_id))
+    if key is not None and key.version is not None and key.version == _version(db, key.course_id):
+        return key
+
+    course_id = db.scalar(select(models.Module.course_id).where(models.Module.id == module_id))
+    if course_id is None and db.get(models.Module, module_id) is None:
+        return None
+    # Read the version before the questions so a concurrent edit can only make the key look older
+    version = _version(db, course_id)
+    key = AnswerKey(course_id, version, _load(db, models.Question.module_id == module_id), lenient_mcq=True)
+    if version is not None:
+        _keys.set(("module", module_id), key)
+    return key
+
+
+def for_course(db, course_id):
+    """Answer key of a course's final assessment (all questions with course_id set)."""
+    version = _version(db, course_id)
+    key = _keys.get(("course", course_id))
+    if key is not None and version is not None and key.version == version:
+        return key
+
+    key = AnswerKey(course_id, version, _load(db, models.Question.course_id == course_id), lenient_mcq=False)
+    if version is not None:
+        _keys.set(("course", course_id), key)
+    return key
+
+
+def clear():
+    _keys.clear()
@@ -1,12 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import database, models
 from passlib.context import CryptContext
 import os
+import hmac
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +18,12 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 30  # 30 days
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Same scheme, but a missing Authorization header yields None instead of a 401
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+# Operator diagnostics under /debug are enabled by setting DEBUG_TOKEN and
+# called with it in the X-Debug-Token header
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
 
 # Password hashing setup using pbkdf2_sha256 and bcrypt for maximum compatibility
 pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
@@ -64,7 +71,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         "role": user.role
     }
 
-def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> Optional[dict]:
+def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional), db: Session = Depends(database.get_db)) -> Optional[dict]:
+    if not token:
+        return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -81,3 +90,9 @@ def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session =
         }
     except Exception:
         return None
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
@@ -0,0 +1,96 @@
+"""
+Reward pipelines run by the job queue after a quiz submission commits.
+
+Both handlers are idempotent: membership rows are inserted with
+ON CONFLICT DO NOTHING and notifications are only written for rows that
+were actually inserted, so a retried job never double-awards.
+"""
+import uuid
+
+from sqlalchemy import select
+
+import database
+import jobs
+import models
+
+
+def tier_for(average):
+    if average >= 90:
+        return "Diamond"
+    if average >= 80:
+        return "Gold"
+    if average >= 70:
+        return "Silver"
+    return "Bronze"
+
+
+def _get_or_create_badge(db, name, description, icon):
+    badge = db.query(models.Badge).filter(models.Badge.name == name).first()
+    if not badge:
+        badge = models.Badge(name=name, description=description, icon=icon)
+        db.add(badge)
+        db.flush()
+    return badge
+
+
+def _grant_badge(db, user_id, badge):
+    """Insert the user_badges row; True if the learner did not have the badge yet."""
+    stmt = database.dialect_insert(models.user_badges).values(user_id=user_id, badge_id=badge.id).on_conflict_do_nothing()
+    return db.execute(stmt).rowcount == 1
+
+
+@jobs.job("award_course_completion")
+def award_course_completion(db, user_id, course_id):
+    course_progress = db.get(models.CourseProgress, (user_id, course_id))
+    if not course_progress or course_progress.total_modules == 0 or course_progress.completed_modules < course_progress.total_modules:
+        return
+
+    course = db.query(models.Course.title, models.Course.instructor_id).filter(models.Course.id == course_id).first()
+    if not course:
+        return
+
+    # Award Badge
+    badge_name = f"{course.title} Graduate"
+    badge = _get_or_create_badge(db, badge_name, f"Completed {course.title}", "Award")
+    if _grant_badge(db, user_id, badge):
+        db.add(models.Notification(user_id=user_id, title="Badge Earned!", message=f"Earned '{badge_name}'", type="success"))
+
+    # Batch tier from the average module score
+    b_name = tier_for(course_progress.module_average)
+    batch_id = db.scalar(select(models.Batch.id).where(models.Batch.course_id == course_id, models.Batch.name == b_name))
+    if batch_id is None:
+        batch = models.Batch(name=b_name, course_id=course_id, instructor_id=course.instructor_id)
+        db.add(batch)
+        db.flush()
+        batch_id = batch.id
+
+    # Single membership row instead of loading batch.students
+    stmt = database.dialect_insert(models.batch_students).values(batch_id=batch_id, student_id=user_id).on_conflict_do_nothing()
+    if db.execute(stmt).rowcount == 1:
+        db.add(models.Notification(user_id=user_id, title="Batch Assigned!", message=f"Assigned to {b_name} batch", type="info"))
+
+
+@jobs.job("award_final_assessment")
+def award_final_assessment(db, user_id, course_id, result_id):
+    result = db.get(models.QuizResult, result_id)
+    if not result or not result.total_questions:
+        return
+    if result.score / result.total_questions * 100 < 50:
+        return
+
+    # Award Certificate (one per learner and course)
+    has_certificate = db.query(models.Certificate.id).filter(
+        models.Certificate.user_id == user_id,
+        models.Certificate.course_id == course_id
+    ).first() is not None
+    if not has_certificate:
+        db.add(models.Certificate(
+            user_id=user_id,
+            course_id=course_id,
+            certificate_code=f"CERT-{uuid.uuid4().hex[:8].upper()}"
+        ))
+
+    # Award Master Badge
+    title = db.scalar(select(models.Course.title).where(models.Course.id == course_id))
+    badge = _get_or_create_badge(db, f"{title} Master", f"Mastered {title}", "Star")
+    _grant_badge(db, user_id, badge)
@@ -0,0 +1,21 @@
+import models, database, progress
+
+def backfill():
+    print(f"--- Database URL: {database.engine.url} ---")
+    # Creates course_progress on databases that predate it
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        print("Rebuilding course_progress from quiz_results...")
+        progress.rebuild(db)
+        db.commit()
+        rows = db.query(models.CourseProgress).count()
+        print(f"Backfill completed successfully ({rows} progress rows).")
+    except Exception as e:
+        print(f"Backfill failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill()
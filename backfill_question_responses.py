@@ -0,0 +1,66 @@
+"""
+Backfill question_responses from the answers / question_ids JSON of
+existing quiz results (see responses.py). Only results without any
+response rows are processed, so the script can be re-run safely.
+"""
+import sys
+
+from sqlalchemy import select, insert
+
+import answer_keys
+import database
+import models
+import responses
+
+CHUNK_SIZE = 2000
+
+
+def backfill(chunk_size=CHUNK_SIZE):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    total_results, total_rows = 0, 0
+    try:
+        has_rows = select(models.QuestionResponse.id).where(models.QuestionResponse.result_id == models.QuizResult.id).exists()
+        stmt = select(
+            models.QuizResult.id,
+            models.QuizResult.user_id,
+            models.QuizResult.module_id,
+            models.QuizResult.course_id,
+            models.QuizResult.question_ids,
+            models.QuizResult.answers,
+            models.QuizResult.completed_at
+        ).where(models.QuizResult.answers.isnot(None), ~has_rows).order_by(models.QuizResult.id)
+
+        keys = {}
+        last_id = 0
+        # Keyset chunks rather than one long read, so each chunk can commit (SQLite allows one writer)
+        while True:
+            chunk = db.execute(stmt.where(models.QuizResult.id > last_id).limit(chunk_size)).all()
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            rows = []
+            for result_id, user_id, module_id, course_id, question_ids, answers, completed_at in chunk:
+                scope = ("module", module_id) if module_id is not None else ("course", course_id)
+                if scope not in keys:
+                    keys[scope] = answer_keys.for_module(db, module_id) if module_id is not None else answer_keys.for_course(db, course_id)
+                key = keys[scope]
+                if key is None:
+                    continue
+                positions = [key.position.get(qid) for qid in question_ids] if question_ids else range(len(key))
+                rows.extend(responses.build_rows(result_id, user_id, key, positions, answers, completed_at))
+            if rows:
+                db.execute(insert(models.QuestionResponse), rows)
+            db.commit()
+            total_results += len(chunk)
+            total_rows += len(rows)
+            print(f"  {total_results} results, {total_rows} responses")
+    finally:
+        db.close()
+    return total_results, total_rows
+
+
+if __name__ == "__main__":
+    results, rows = backfill(int(sys.argv[1]) if len(sys.argv) > 1 else CHUNK_SIZE)
+    print(f"Backfill complete: {rows} question responses from {results} quiz results.")
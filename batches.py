@@ -0,0 +1,96 @@
+"""
+Set-based batch membership changes.
+
+assign_students() validates enrolment with one JOIN, diffs the requested
+set against the current batch_students rows and only inserts / deletes the
+delta, writing notifications for new members in one bulk insert.
+"""
+from sqlalchemy import select, insert, delete
+
+import models
+
+MODES = ("replace", "add", "remove")
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def enrolled_learner_ids(db, course_id, student_ids):
+    """Subset of student_ids that are learners enrolled in the course."""
+    valid = set()
+    for chunk in _chunks(set(student_ids)):
+        valid.update(db.scalars(
+            select(models.User.id)
+            .join(models.Enrolment, models.Enrolment.user_id == models.User.id)
+            .where(
+                models.User.id.in_(chunk),
+                models.User.role == "learner",
+                models.Enrolment.course_id == course_id,
+            )
+        ))
+    return valid
+
+
+def member_ids(db, batch_id):
+    return set(db.scalars(select(models.batch_students.c.student_id).where(models.batch_students.c.batch_id == batch_id)))
+
+
+def assign_students(db, batch, student_ids, mode="replace"):
+    """
+    Apply a membership change and return {"added", "removed", "skipped", "not_members"} id lists.
+      replace - membership becomes exactly the valid requested students
+      add     - valid requested students are added, nobody is removed
+      remove  - requested students are removed; those who were not members
+                are reported in not_members
+    Does not commit.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Use one of: {', '.join(MODES)}")
+
+    requested = set(student_ids)
+    current = member_ids(db, batch.id)
+
+    if mode == "remove":
+        valid = requested
+        to_add = set()
+        to_remove = requested & current
+    else:
+        valid = enrolled_learner_ids(db, batch.course_id, requested)
+        to_add = valid - current
+        to_remove = current - valid if mode == "replace" else set()
+
+    for chunk in _chunks(to_remove):
+        db.execute(delete(models.batch_students).where(
+            models.batch_students.c.batch_id == batch.id,
+            models.batch_students.c.student_id.in_(chunk)
+        ))
+
+    if to_add:
+        added = sorted(to_add)
+        db.execute(insert(models.batch_students), [{"batch_id": batch.id, "student_id": sid} for sid in added])
+
+        course_title = db.scalar(select(models.Course.title).where(models.Course.id == batch.course_id))
+        db.execute(insert(models.Notification), [
+            {
+                "user_id": sid,
+                "title": "Batch Assigned",
+                "message": f"You have been assigned to the '{batch.name}' batch for course '{course_title}'.",
+                "type": "info",
+            } for sid in added
+        ])
+
+    # The relationship collection (if loaded) no longer matches the table
+    db.expire(batch, ["students"])
+
+    return {
+        "added": sorted(to_add),
+        "removed": sorted(to_remove),
+        "skipped": sorted(requested - valid),
+        "not_members": sorted(requested - current) if mode == "remove" else [],
+    }
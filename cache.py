@@ -0,0 +1,269 @@
+"""
+Response cache for the public, read-heavy endpoints (course catalogue and
+course detail).
+
+Two tiers:
+  - an in-process LRU, always on, so repeated hits never leave the worker;
+  - an optional shared tier (anything exposing the Redis get/set/incr calls),
+    enabled with CACHE_REDIS_URL so several workers see the same entries.
+
+Entries are grouped by tags ("catalogue", "course:<id>"). Invalidating a tag
+bumps its version; keys embed the versions of their tags, so stale entries
+are never looked up again and simply age out of the LRU / expire in Redis.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+import tracing
+
+logger = logging.getLogger("edweb.cache")
+
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_LOCAL_SIZE = int(os.getenv("CACHE_LOCAL_SIZE", "512"))
+
+CachedResponse = namedtuple("CachedResponse", ["body", "etag"])
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the subset of redis.Redis the cache uses.
+    Share one instance between several ResponseCache objects to simulate
+    multiple workers talking to the same Redis.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None, nx=False):
+        if isinstance(value, str):
+            value = value.encode()
+        elif isinstance(value, int):
+            value = str(value).encode()
+        with self._lock:
+            if nx:
+                item = self._data.get(key)
+                if item is not None and (item[1] is None or item[1] >= time.monotonic()):
+                    return None
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value, expires_at = self._data.get(key, (b"0", None))
+            value = int(value) + amount
+            self._data[key] = (str(value).encode(), expires_at)
+            return value
+
+
+def shared_backend_from_env(env_var="CACHE_REDIS_URL"):
+    """Return a Redis client if the URL in env_var is configured, otherwise None."""
+    url = os.getenv(env_var)
+    if not url:
+        return None
+    if url == "fake://":
+        return FakeRedis()
+    try:
+        import redis
+    except ImportError:
+        logger.warning("%s is set but the 'redis' package is not installed. Using local cache only.", env_var)
+        return None
+    return redis.Redis.from_url(url)
+
+
+class ResponseCache:
+    def __init__(self, shared=None, local_size=CACHE_LOCAL_SIZE, ttl=CACHE_TTL_SECONDS, prefix="edweb:resp"):
+        self.local = LRUCache(maxsize=local_size, ttl=ttl)
+        self.shared = shared
+        self.ttl = ttl
+        self.prefix = prefix
+        self._local_versions = {}
+        self._lock = threading.Lock()
+
+    # --- tags ---
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}:tag:{tag}"
+
+    def tag_version(self, tag):
+        if self.shared is not None:
+            try:
+                value = self.shared.get(self._tag_key(tag))
+                return int(value) if value is not None else 0
+            except Exception as e:
+                logger.warning("Cache shared tier unavailable (%s); falling back to local versions.", e)
+        return self._local_versions.get(tag, 0)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            with self._lock:
+                self._local_versions[tag] = self._local_versions.get(tag, 0) + 1
+            if self.shared is not None:
+                try:
+                    self.shared.incr(self._tag_key(tag))
+                except Exception as e:
+                    logger.warning("Cache shared tier unavailable (%s); invalidation is local only.", e)
+
+    # --- entries ---
+
+    def _key(self, namespace, params, tags):
+        versions = ",".join(f"{t}={self.tag_version(t)}" for t in tags)
+        return f"{self.prefix}:{namespace}:{params}:{versions}"
+
+    def get(self, namespace, params, tags):
+        key = self._key(namespace, params, tags)
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(key)
+            except Exception:
+                raw = None
+            if raw is not None:
+                etag, _, body = raw.partition(b"\n")
+                entry = CachedResponse(body=body, etag=etag.decode())
+                self.local.set(key, entry)
+                return entry
+        return None
+
+    def set(self, namespace, params, tags, payload):
+        entry = make_entry(payload)
+        key = self._key(namespace, params, tags)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, entry.etag.encode() + b"\n" + entry.body, ex=self.ttl)
+            except Exception as e:
+                logger.warning("Cache shared tier unavailable (%s); entry kept locally.", e)
+        return entry
+
+    def clear(self):
+        self.local.clear()
+        with self._lock:
+            self._local_versions.clear()
+
+
+def encode_json(payload):
+    # Same encoding as fastapi's JSONResponse so cached and uncached bodies match.
+    with tracing.span("json.encode"):
+        return json.dumps(
+            jsonable_encoder(payload),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+def make_entry(payload):
+    body = encode_json(payload)
+    return CachedResponse(body=body, etag=make_etag(body))
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def extend_entry(entry: CachedResponse, extra: dict):
+    """
+    Append per-viewer keys to a cached JSON object without re-encoding it.
+    The ETag stays derived from the shared body plus the extra keys.
+    """
+    if not extra:
+        return entry
+    extra_body = encode_json(extra)
+    body = entry.body[:-1] + b"," + extra_body[1:]
+    etag = entry.etag[:-1] + "-" + hashlib.sha1(extra_body).hexdigest()[:8] + '"'
+    return CachedResponse(body=body, etag=etag)
+
+
+def json_response(request: Request, entry: CachedResponse):
+    """Serve a cached body, answering 304 when the client already has it."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def course_tag(course_id):
+    return f"course:{course_id}"
+
+
+def questions_tag(course_id):
+    # Versions the compiled answer keys in answer_keys.py
+    return f"questions:{course_id}"
+
+
+response_cache = ResponseCache(shared=shared_backend_from_env())
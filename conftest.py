@@ -0,0 +1,51 @@
+import os
+
+# In-process tests run against their own SQLite file so they never touch edweb.db.
+# This has to be set before any test module imports `database`.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_edweb.db")
+# ...and log to their own file instead of logs/edweb.log
+os.environ.setdefault("LOG_FILE", "./test_edweb.log")
+
+import pytest
+
+import adaptive
+import answer_keys
+import auth
+import cache
+import database
+import models
+import quiz_sessions
+
+
+def reset_database():
+    """Recreate every table and empty the in-process caches that hold rows from the old ones."""
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    cache.response_cache.clear()
+    answer_keys.clear()
+    adaptive.clear()
+    quiz_sessions.store.clear()
+
+
+def create_user(email, role):
+    """Insert a user and return (id, headers carrying a bearer token for them)."""
+    db = database.SessionLocal()
+    user = models.User(name=email.split("@")[0], email=email, password="x", role=role)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    token = auth.create_access_token({"sub": email})
+    return user.id, {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def fresh_database():
+    """A clean database for the requesting test module (pytestmark = pytest.mark.usefixtures("fresh_database"))."""
+    reset_database()
+
+
+@pytest.fixture
+def make_user():
+    """make_user(email, role) -> (id, auth headers)."""
+    return create_user
@@ -19,6 +19,10 @@ def enroll_user():
     if not enrollment:
         enrollment = models.Enrolment(user_id=user.id, course_id=course_id)
         db.add(enrollment)
+        db.query(models.Course).filter(models.Course.id == course_id).update(
+            {models.Course.enrolment_count: models.Course.enrolment_count + 1},
+            synchronize_session=False
+        )
         db.commit()
         print(f"Enrolled {user.email} in Course {course_id}")
     else:
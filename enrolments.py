@@ -0,0 +1,100 @@
+"""
+Enrolment writes on the uq_enrolments_user_course unique index.
+
+enrol() is a single INSERT ... ON CONFLICT DO NOTHING, so concurrent clicks
+cannot create duplicate enrolments. enrol_many() resolves a cohort given as
+user ids and / or emails, inserts it in chunked multi-row upserts and
+reports a status per requested row. Both keep courses.enrolment_count in
+the same transaction and do not commit.
+"""
+from sqlalchemy import func, select, update
+
+import database
+import models
+
+# Older SQLite builds reject statements with more bound parameters than this
+SQLITE_MAX_VARIABLES = 999
+# Each row of the multi-row enrolment insert binds user_id and course_id
+INSERT_PARAMS_PER_ROW = 2
+# Rows per statement: lookups bind one parameter per IN (...) value, inserts
+# INSERT_PARAMS_PER_ROW, so this keeps both under the limit
+CHUNK_SIZE = SQLITE_MAX_VARIABLES // INSERT_PARAMS_PER_ROW
+
+# Largest cohort accepted by one bulk request
+MAX_BULK = 10000
+
+ENROLLED = "enrolled"
+ALREADY_ENROLLED = "already_enrolled"
+NOT_FOUND = "not_found"
+NOT_A_LEARNER = "not_a_learner"
+DUPLICATE = "duplicate"
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def _insert(db, course_id, user_ids):
+    """Enrol user_ids, skipping existing enrolments. Returns the set of ids actually inserted."""
+    table = models.Enrolment.__table__
+    inserted = set()
+    for chunk in _chunks(user_ids):
+        stmt = database.dialect_insert(table).values([{"user_id": uid, "course_id": course_id} for uid in chunk])
+        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "course_id"]).returning(table.c.user_id)
+        inserted.update(db.scalars(stmt))
+    if inserted:
+        # Keep the denormalised counter in the same transaction as the enrolment rows
+        db.execute(update(models.Course).where(models.Course.id == course_id).values(
+            enrolment_count=models.Course.enrolment_count + len(inserted)
+        ))
+    return inserted
+
+
+def enrol(db, user_id, course_id):
+    """Enrol one user. Returns False if they were already enrolled."""
+    return bool(_insert(db, course_id, [user_id]))
+
+
+def enrol_many(db, course_id, user_ids=(), emails=()):
+    """
+    Enrol a cohort of learners. Returns one {"user_id", "email", "status"} row
+    per requested id / email, in request order (ids first).
+    """
+    requested = [("id", uid) for uid in user_ids] + [("email", e.strip()) for e in emails]
+
+    # Resolve ids and emails to users in chunks
+    by_id, by_email = {}, {}
+    ids = {v for kind, v in requested if kind == "id"}
+    for chunk in _chunks(ids):
+        for uid, email, role in db.execute(select(models.User.id, models.User.email, models.User.role).where(models.User.id.in_(chunk))):
+            by_id[uid] = (uid, email, role)
+    # Addresses match case-insensitively, as people type them
+    addresses = {v.lower() for kind, v in requested if kind == "email"}
+    for chunk in _chunks(addresses):
+        for uid, email, role in db.execute(select(models.User.id, models.User.email, models.User.role).where(func.lower(models.User.email).in_(chunk))):
+            by_email[email.lower()] = (uid, email, role)
+
+    rows, to_enrol, seen = [], [], set()
+    for kind, value in requested:
+        user = by_id.get(value) if kind == "id" else by_email.get(value.lower())
+        if user is None:
+            rows.append({"user_id": value if kind == "id" else None, "email": value if kind == "email" else None, "status": NOT_FOUND})
+            continue
+        uid, email, role = user
+        row = {"user_id": uid, "email": email, "status": None}
+        rows.append(row)
+        if uid in seen:
+            row["status"] = DUPLICATE
+        elif role != "learner":
+            row["status"] = NOT_A_LEARNER
+        else:
+            to_enrol.append(uid)
+        seen.add(uid)
+
+    inserted = _insert(db, course_id, to_enrol)
+    for row in rows:
+        if row["status"] is None:
+            row["status"] = ENROLLED if row["user_id"] in inserted else ALREADY_ENROLLED
+    return rows
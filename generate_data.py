@@ -0,0 +1,61 @@
+"""
+Build a synthetic database for load and performance testing (see synthetic.py).
+The target database must be empty; the same --seed and scale always produce
+the same rows. Every generated user's password is "password123".
+
+    python generate_data.py --database sqlite:///./load.db                   # small preset
+    python generate_data.py --database sqlite:///./load.db --scale large     # ~12M rows
+    python generate_data.py --scale medium --learners 50000 --seed 7         # preset with overrides
+
+Without --database, DATABASE_URL is used (edweb.db by default).
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+
+import database
+import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=None, help="SQLAlchemy URL of the (empty) target database")
+    parser.add_argument("--scale", choices=sorted(synthetic.PRESETS), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=synthetic.CHUNK_SIZE)
+    for field in synthetic.Scale._fields:
+        kind = type(synthetic.PRESETS["small"]._asdict()[field])
+        if kind is bool:
+            parser.add_argument(f"--{field.replace('_', '-')}", type=lambda v: v.lower() in ("1", "true", "yes"), default=None)
+        else:
+            parser.add_argument(f"--{field.replace('_', '-')}", type=kind, default=None)
+    args = parser.parse_args()
+
+    overrides = {f: getattr(args, f) for f in synthetic.Scale._fields if getattr(args, f) is not None}
+    scale = synthetic.PRESETS[args.scale]._replace(**overrides)
+    if args.database:
+        connect_args = {"check_same_thread": False} if args.database.startswith("sqlite") else {}
+        engine = create_engine(args.database, connect_args=connect_args)
+    else:
+        engine = database.engine
+
+    print(f"Generating ~{synthetic.estimate(scale):,} rows into {engine.url} (seed {args.seed})")
+    print(f"  {scale}")
+    started = time.perf_counter()
+
+    def report(learners, rows):
+        elapsed = time.perf_counter() - started
+        print(f"  {learners:,}/{scale.learners:,} learners, {rows:,} rows, {rows / elapsed:,.0f} rows/s", flush=True)
+
+    counts = synthetic.generate(engine, scale, seed=args.seed, chunk_size=args.chunk_size,
+                                progress=report if scale.learners >= 10000 else None)
+    elapsed = time.perf_counter() - started
+    for table, rows in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"  {table:<20} {rows:>12,}")
+    total = sum(counts.values())
+    print(f"Generated {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
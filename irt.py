@@ -0,0 +1,248 @@
+"""
+Two-parameter logistic (2PL) item response theory for the adaptive assessment.
+
+    P(correct | theta) = 1 / (1 + exp(-a * (theta - b)))
+
+Item parameters (a = discrimination, b = difficulty) are fitted offline by
+calibrate() from the graded final-assessment results and stored in
+item_parameters (run calibrate_irt.py). Questions without parameters fall
+back to a = 1 and b taken from their easy / medium / hard label.
+
+At runtime everything is evaluated on a fixed ability grid:
+  - ItemTable precomputes log P / log(1 - P) and, for every grid point, the
+    items ordered by Fisher information, so choosing the next item is a
+    walk down one precomputed row until an unanswered item turns up;
+  - a learner's ability is the posterior over the grid (standard normal
+    prior), updated with one vector add per answer; theta and its standard
+    error are the posterior mean and standard deviation (EAP).
+The assessment stops once the standard error drops below SE_THRESHOLD.
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+
+import answer_keys
+import database
+import models
+
+THETA_GRID = np.linspace(-4.0, 4.0, 81)
+LOG_PRIOR = -0.5 * THETA_GRID ** 2
+
+SE_THRESHOLD = float(os.getenv("IRT_SE_THRESHOLD", "0.35"))
+MIN_ITEMS = int(os.getenv("IRT_MIN_ITEMS", "3"))
+MAX_ITEMS = int(os.getenv("IRT_MAX_ITEMS", "20"))
+
+# Pick at random among this many most informative unanswered items so
+# learners do not all see the same sequence (item exposure control).
+RANDOMESQUE = 3
+
+DEFAULT_DIFFICULTY = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+# Items need this many responses before calibrate() trusts their estimates
+MIN_RESPONSES = int(os.getenv("IRT_MIN_RESPONSES", "20"))
+
+
+def probability(theta, a, b):
+    return 1.0 / (1.0 + np.exp(-a * (theta - b)))
+
+
+def information(theta, a, b):
+    p = probability(theta, a, b)
+    return a ** 2 * p * (1.0 - p)
+
+
+def difficulty_label(theta):
+    """Nearest easy / medium / hard label for an ability, used when generating new items."""
+    if theta < -0.5:
+        return "easy"
+    if theta > 0.5:
+        return "hard"
+    return "medium"
+
+
+class ItemTable:
+    """Precomputed 2PL tables for one question bank (columns are answer-key positions)."""
+
+    def __init__(self, a, b):
+        self.a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        grid = THETA_GRID[:, None]
+        p = np.clip(probability(grid, self.a, self.b), 1e-9, 1 - 1e-9)
+        self.log_p = np.log(p)
+        self.log_q = np.log1p(-p)
+        info = self.a ** 2 * p * (1.0 - p)
+        # Row g: item positions by decreasing information at THETA_GRID[g]
+        self.by_information = np.argsort(-info, axis=1, kind="stable").tolist() if len(self.a) else [[] for _ in THETA_GRID]
+
+    def __len__(self):
+        return len(self.a)
+
+    def pick(self, theta, answered_bits, rng):
+        """Position of one of the most informative unanswered items at theta, or None."""
+        g = int(np.abs(THETA_GRID - theta).argmin())
+        candidates = []
+        for p in self.by_information[g]:
+            if not answered_bits >> p & 1:
+                candidates.append(p)
+                if len(candidates) == RANDOMESQUE:
+                    break
+        return rng.choice(candidates) if candidates else None
+
+    def update(self, log_posterior, position, correct):
+        """Posterior after one more answer; returns (log_posterior, theta, se)."""
+        log_posterior = np.asarray(log_posterior if log_posterior is not None else LOG_PRIOR, dtype=float)
+        log_posterior = log_posterior + (self.log_p[:, position] if correct else self.log_q[:, position])
+        log_posterior -= log_posterior.max()
+        theta, se = estimate(log_posterior)
+        return log_posterior, theta, se
+
+
+def estimate(log_posterior):
+    """EAP ability and its standard error from a log posterior over THETA_GRID."""
+    weights = np.exp(np.asarray(log_posterior, dtype=float) - np.max(log_posterior))
+    weights /= weights.sum()
+    theta = float(weights @ THETA_GRID)
+    se = float(np.sqrt(weights @ (THETA_GRID - theta) ** 2))
+    return theta, se
+
+
+def should_stop(items_answered, se):
+    if items_answered >= MAX_ITEMS:
+        return True
+    return items_answered >= MIN_ITEMS and se is not None and se < SE_THRESHOLD
+
+
+def table_for(key, parameters):
+    """ItemTable for an answer key; parameters maps question_id -> (a, b)."""
+    a, b = [], []
+    for qid, difficulty in zip(key.question_ids, key.difficulties):
+        item_a, item_b = parameters.get(qid, (1.0, DEFAULT_DIFFICULTY.get(difficulty, 0.0)))
+        a.append(item_a)
+        b.append(item_b)
+    return ItemTable(a, b)
+
+
+def calibrate(responses, iterations=100, tolerance=1e-4):
+    """
+    Fit 2PL parameters by joint maximum likelihood.
+
+    responses is a learners x items array of 1 (correct), 0 (wrong) or NaN
+    (not answered). The model is fitted in slope / intercept form
+    (logit = a * theta + d, b = -d / a), which keeps hard and easy items
+    well conditioned. Every Newton step updates all abilities, then all
+    intercepts, then all slopes at once using the diagonal of the Hessian;
+    weak priors (theta ~ N(0, 1), d ~ N(0, 2), a ~ N(1, 0.5)) keep perfect
+    and zero scores finite.
+
+    Returns (a, b, theta, counts), counts being responses per item.
+    """
+    responses = np.asarray(responses, dtype=float)
+    answered = ~np.isnan(responses)
+    x = np.where(answered, responses, 0.0)
+    mask = answered.astype(float)
+    counts = mask.sum(axis=0)
+
+    # Start from logits of the proportion correct
+    p_item = (x.sum(axis=0) + 0.5) / (counts + 1.0)
+    p_person = (x.sum(axis=1) + 0.5) / (mask.sum(axis=1) + 1.0)
+    d = np.log(p_item / (1 - p_item))
+    theta = np.log(p_person / (1 - p_person))
+    theta = (theta - theta.mean()) / (theta.std() or 1.0)
+    a = np.ones(responses.shape[1])
+
+    def fit(theta, a, d):
+        p = 1.0 / (1.0 + np.exp(-(theta[:, None] * a + d)))
+        return (x - p) * mask, p * (1 - p) * mask
+
+    for _ in range(iterations):
+        previous = np.concatenate([a, d])
+
+        residual, w = fit(theta, a, d)
+        theta = np.clip(theta + ((residual * a).sum(axis=1) - theta) / ((w * a ** 2).sum(axis=1) + 1.0), -4, 4)
+
+        residual, w = fit(theta, a, d)
+        d = d + (residual.sum(axis=0) - d / 4.0) / (w.sum(axis=0) + 0.25)
+
+        residual, w = fit(theta, a, d)
+        a = a + ((residual * theta[:, None]).sum(axis=0) - (a - 1.0) / 0.25) / ((w * theta[:, None] ** 2).sum(axis=0) + 4.0)
+        a = np.clip(a, 0.2, 4.0)
+
+        # Fix the scale: abilities stay centred on 0 with unit spread
+        mean, std = theta.mean(), theta.std() or 1.0
+        theta = (theta - mean) / std
+        d = d + a * mean
+        a = a * std
+
+        if np.max(np.abs(np.concatenate([a, d]) - previous)) < tolerance:
+            break
+
+    return a, np.clip(-d / a, -4, 4), theta, counts
+
+
+def response_matrix(key, results):
+    """
+    Learners x items matrix for calibrate() from (question_ids, answers)
+    pairs of final-assessment results, graded with the course answer key.
+    Columns are answer-key positions.
+    """
+    rows = []
+    for question_ids, answers in results:
+        row = np.full(len(key), np.nan)
+        for qid, answer in zip(question_ids or (), answers or ()):
+            position = key.position.get(qid)
+            if position is not None:
+                row[position] = 1.0 if key.is_correct(qid, answer) else 0.0
+        rows.append(row)
+    return np.array(rows).reshape(len(rows), len(key))
+
+
+def load_parameters(db, course_id):
+    """question_id -> (a, b) for the calibrated items of a course."""
+    rows = db.query(
+        models.ItemParameter.question_id,
+        models.ItemParameter.discrimination,
+        models.ItemParameter.difficulty
+    ).filter(models.ItemParameter.course_id == course_id)
+    return {qid: (a, b) for qid, a, b in rows}
+
+
+def calibrate_course(db, course_id):
+    """
+    Fit and store item parameters for one course from its final-assessment
+    results. Items with fewer than MIN_RESPONSES answers are left uncalibrated.
+    Returns the number of items written and bumps the course's answer key
+    version so every worker rebuilds its bank. Does not commit.
+    """
+    key = answer_keys.for_course(db, course_id)
+    if not len(key):
+        return 0
+    results = db.query(models.QuizResult.question_ids, models.QuizResult.answers).filter(
+        models.QuizResult.course_id == course_id,
+        models.QuizResult.question_ids.isnot(None)
+    ).yield_per(1000)
+    responses = response_matrix(key, results)
+    if len(responses) < 2:
+        return 0
+
+    a, b, _, counts = calibrate(responses)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "question_id": qid,
+            "course_id": course_id,
+            "discrimination": float(a[p]),
+            "difficulty": float(b[p]),
+            "responses": int(counts[p]),
+            "calibrated_at": now,
+        }
+        for p, qid in enumerate(key.question_ids) if counts[p] >= MIN_RESPONSES
+    ]
+    if rows:
+        stmt = database.dialect_insert(models.ItemParameter.__table__)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["question_id"],
+            set_={c: stmt.excluded[c] for c in ("course_id", "discrimination", "difficulty", "responses", "calibrated_at")}
+        ), rows)
+        answer_keys.bump_version(db, course_id)
+    return len(rows)
@@ -0,0 +1,303 @@
+"""
+Classical item analysis over every stored quiz attempt.
+
+analyse() streams quiz_results in chunks (module quizzes and final
+assessments), grades each chunk against the compiled answer keys and folds
+it into per-question running sums with np.bincount, so memory is bounded by
+the number of questions, not the number of answers. From those sums it
+derives, per question:
+
+  p_value         share of correct answers (item easiness)
+  discrimination  corrected point-biserial: correlation between getting the
+                  item right and the score on the rest of the attempt
+  option_counts   how often each option was chosen (distractor analysis)
+
+and upserts them into question_stats. With recalibrate=True the
+easy / medium / hard label of well-answered questions is reset from the
+p-value.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, func, or_, update
+
+import answer_keys
+import cache
+import database
+import models
+
+CHUNK_SIZE = 5000
+
+# Recalibration: minimum responses and p-value bands
+MIN_RESPONSES = 30
+EASY_P_VALUE = 0.8
+HARD_P_VALUE = 0.4
+
+# Option index of an MCQ answer that is not a number
+INVALID_CHOICE = -2
+# Expected option of an MCQ without a correct option: matches no answer
+_NO_KEY = np.iinfo(np.int64).min
+_MAX_CHOICE = np.iinfo(np.int64).max
+
+
+class _Totals:
+    """Running per-question sums, indexed by the question's position in the analysed set."""
+
+    def __init__(self, size, max_options):
+        self.size = size
+        self.max_options = max_options
+        self.n = np.zeros(size)
+        self.correct = np.zeros(size)
+        # Only answers from attempts with at least two items enter the point-biserial sums
+        self.n_rest = np.zeros(size)
+        self.x = np.zeros(size)
+        self.rest = np.zeros(size)
+        self.rest_sq = np.zeros(size)
+        self.x_rest = np.zeros(size)
+        self.options = np.zeros(size * max_options)
+        self.invalid = np.zeros(size)
+
+    def add(self, items, correct, rest, chosen):
+        """One chunk as flat arrays; rest is NaN where it is undefined, chosen is -1 for non-MCQ, INVALID_CHOICE for invalid MCQ answers."""
+        size = self.size
+        self.n += np.bincount(items, minlength=size)
+        self.correct += np.bincount(items, weights=correct, minlength=size)
+
+        has_rest = ~np.isnan(rest)
+        q, x, r = items[has_rest], correct[has_rest], rest[has_rest]
+        self.n_rest += np.bincount(q, minlength=size)
+        self.x += np.bincount(q, weights=x, minlength=size)
+        self.rest += np.bincount(q, weights=r, minlength=size)
+        self.rest_sq += np.bincount(q, weights=r * r, minlength=size)
+        self.x_rest += np.bincount(q, weights=x * r, minlength=size)
+
+        valid = (chosen >= 0) & (chosen < self.max_options)
+        self.options += np.bincount(items[valid] * self.max_options + chosen[valid], minlength=size * self.max_options)
+        self.invalid += np.bincount(items[chosen == INVALID_CHOICE], minlength=size)
+
+    def p_values(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.correct / self.n
+
+    def discrimination(self):
+        n = self.n_rest
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_x = self.x / n
+            mean_rest = self.rest / n
+            cov = self.x_rest / n - mean_x * mean_rest
+            var_x = mean_x * (1 - mean_x)
+            var_rest = self.rest_sq / n - mean_rest ** 2
+            r = cov / np.sqrt(var_x * var_rest)
+        # Undefined when everyone (or no one) got the item or the rest score right
+        r[~np.isfinite(r)] = np.nan
+        return r
+
+
+def _question_meta(db, course_id=None):
+    """question_id -> (course_id, module_id, option count) for the questions to analyse."""
+    option_counts = select(
+        models.QuestionOption.question_id, func.count().label("n")
+    ).group_by(models.QuestionOption.question_id).subquery()
+    stmt = select(
+        models.Question.id,
+        func.coalesce(models.Question.course_id, models.Module.course_id),
+        models.Question.module_id,
+        func.coalesce(option_counts.c.n, 0)
+    ).outerjoin(models.Module, models.Module.id == models.Question.module_id).outerjoin(
+        option_counts, option_counts.c.question_id == models.Question.id
+    )
+    if course_id is not None:
+        stmt = stmt.where(or_(models.Question.course_id == course_id, models.Module.course_id == course_id))
+    return {qid: (cid, mid, n) for qid, cid, mid, n in db.execute(stmt)}
+
+
+class _KeyTable:
+    """
+    Every answer key met so far, concatenated into flat arrays: the question at
+    position p of a key sits at slot offset + p. Grading a chunk is then a
+    handful of array lookups and comparisons against these.
+    """
+
+    def __init__(self, db, index):
+        self.db = db
+        self.index = index
+        self._keys = {}
+        self._items, self._mcq, self._choice, self._text = [], [], [], []
+        self._arrays = None
+
+    def get(self, module_id, course_id):
+        """(answer key, offset) of a result's quiz, None if it has no key."""
+        scope = ("module", module_id) if module_id is not None else ("course", course_id)
+        if scope not in self._keys:
+            key = answer_keys.for_module(self.db, module_id) if module_id is not None else answer_keys.for_course(self.db, course_id)
+            self._keys[scope] = None if key is None else (key, self._add(key))
+        return self._keys[scope]
+
+    def _add(self, key):
+        offset = len(self._items)
+        # Questions outside the analysed set get item -1 and are dropped when grading
+        self._items.extend(self.index.get(qid, -1) for qid in key.question_ids)
+        self._mcq.extend(key.mcq)
+        self._choice.extend(e if m and e is not None else _NO_KEY for m, e in zip(key.mcq, key.expected))
+        self._text.extend(None if m else e for m, e in zip(key.mcq, key.expected))
+        self._arrays = None
+        return offset
+
+    def arrays(self):
+        """(item index, is MCQ, expected option, expected text) per slot."""
+        if self._arrays is None:
+            text = np.empty(len(self._text), dtype=object)
+            text[:] = self._text
+            self._arrays = (
+                np.array(self._items, dtype=np.int64),
+                np.array(self._mcq, dtype=bool),
+                np.array(self._choice, dtype=np.int64),
+                text,
+            )
+        return self._arrays
+
+
+def _choice(answer):
+    """An MCQ answer as an option index (as answer_keys grades it), INVALID_CHOICE if it is not one."""
+    try:
+        choice = int(answer)
+    except (ValueError, TypeError, OverflowError):
+        return INVALID_CHOICE
+    return choice if _NO_KEY < choice <= _MAX_CHOICE else INVALID_CHOICE
+
+
+def _grade_chunk(rows, keys):
+    """Grade a chunk of results into flat (question index, correct, rest score, chosen option) arrays."""
+    # Flatten: one slot, attempt number and normalised answer per stored answer
+    slots, attempts, choices, texts = [], [], [], []
+    for attempt, (module_id, course_id, question_ids, answers) in enumerate(rows):
+        found = keys.get(module_id, course_id)
+        if found is None or not answers:
+            continue
+        key, offset = found
+        # Final assessments store the question order; module quizzes follow the key order
+        positions = [key.position.get(qid) for qid in question_ids] if question_ids else range(len(key))
+        for p, answer in zip(positions, answers):
+            if p is None:
+                continue
+            slots.append(offset + p)
+            attempts.append(attempt)
+            if key.mcq[p]:
+                choices.append(_choice(answer))
+                texts.append(None)
+            else:
+                choices.append(-1)
+                texts.append(str(answer).strip().lower())
+
+    items, is_mcq, expected_choice, expected_text = keys.arrays()
+    slots = np.array(slots, dtype=np.int64)
+    answered = np.empty(len(texts), dtype=object)
+    answered[:] = texts
+    keep = items[slots] >= 0
+    slots, attempts, choices, answered = slots[keep], np.array(attempts, dtype=np.int64)[keep], np.array(choices, dtype=np.int64)[keep], answered[keep]
+
+    mcq = is_mcq[slots]
+    correct = np.where(mcq, choices == expected_choice[slots], answered == expected_text[slots]).astype(float)
+
+    # Rest score: share correct among the other items of the same attempt
+    k = np.bincount(attempts)[attempts]
+    total = np.bincount(attempts, weights=correct)[attempts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rest = np.where(k > 1, (total - correct) / (k - 1), np.nan)
+
+    return items[slots], correct, rest, np.where(mcq, choices, -1)
+
+
+def analyse(db, course_id=None, chunk_size=CHUNK_SIZE, recalibrate=False):
+    """
+    Recompute question_stats (for one course, or everything) and commit.
+    Returns the number of questions with statistics.
+    """
+    meta = _question_meta(db, course_id)
+    if not meta:
+        return 0
+    # Dense positions: the sums are sized by the number of questions, not the largest id
+    index = {qid: i for i, qid in enumerate(meta)}
+    size = len(index)
+    max_options = max(n for _, _, n in meta.values()) or 1
+    totals = _Totals(size, max_options)
+
+    stmt = select(
+        models.QuizResult.module_id,
+        models.QuizResult.course_id,
+        models.QuizResult.question_ids,
+        models.QuizResult.answers
+    ).where(models.QuizResult.answers.isnot(None))
+    if course_id is not None:
+        stmt = stmt.where(or_(
+            models.QuizResult.course_id == course_id,
+            models.QuizResult.module_id.in_(select(models.Module.id).where(models.Module.course_id == course_id))
+        ))
+
+    keys = _KeyTable(db, index)
+    # A separate connection streams the results while db is used for answer-key lookups
+    with database.engine.connect() as conn:
+        for rows in conn.execution_options(yield_per=chunk_size).execute(stmt).partitions():
+            items, correct, rest, chosen = _grade_chunk(rows, keys)
+            if len(items):
+                totals.add(items, correct, rest, chosen)
+
+    p_values = totals.p_values()
+    discrimination = totals.discrimination()
+    options = totals.options.reshape(size, max_options)
+    now = datetime.utcnow()
+
+    stats = []
+    for i, (qid, (cid, mid, n_options)) in enumerate(meta.items()):
+        if not totals.n[i]:
+            continue
+        stats.append({
+            "question_id": qid,
+            "course_id": cid,
+            "module_id": mid,
+            "responses": int(totals.n[i]),
+            "p_value": float(p_values[i]),
+            "discrimination": None if np.isnan(discrimination[i]) else float(discrimination[i]),
+            "option_counts": [int(c) for c in options[i, :n_options]] if n_options else None,
+            "invalid_answers": int(totals.invalid[i]),
+            "analysed_at": now,
+        })
+
+    if stats:
+        stmt = database.dialect_insert(models.QuestionStat.__table__)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["question_id"],
+            set_={c: stmt.excluded[c] for c in ("course_id", "module_id", "responses", "p_value", "discrimination", "option_counts", "invalid_answers", "analysed_at")}
+        ), stats)
+
+    changed_courses = set()
+    if recalibrate:
+        for label, members in _difficulty_bands(stats).items():
+            if not members:
+                continue
+            for start in range(0, len(members), 500):
+                chunk = members[start:start + 500]
+                db.execute(update(models.Question).where(models.Question.id.in_(chunk)).values(difficulty=label))
+            changed_courses.update(meta[qid][0] for qid in members)
+    # Answer keys and question banks carry the difficulty labels; every worker rebuilds them
+    for cid in changed_courses:
+        answer_keys.bump_version(db, cid)
+
+    db.commit()
+    for cid in changed_courses:
+        cache.response_cache.invalidate(cache.questions_tag(cid))
+    return len(stats)
+
+
+def _difficulty_bands(stats):
+    bands = {"easy": [], "medium": [], "hard": []}
+    for row in stats:
+        if row["responses"] < MIN_RESPONSES:
+            continue
+        if row["p_value"] >= EASY_P_VALUE:
+            bands["easy"].append(row["question_id"])
+        elif row["p_value"] <= HARD_P_VALUE:
+            bands["hard"].append(row["question_id"])
+        else:
+            bands["medium"].append(row["question_id"])
+    return bands
@@ -0,0 +1,181 @@
+"""
+Durable in-process job queue.
+
+Jobs are rows in the background_jobs table, inserted with enqueue() inside
+the same transaction as the work that triggers them, so a job exists if and
+only if that transaction committed. A daemon worker thread (started from the
+app's startup event) claims pending jobs, runs the registered handler in its
+own session and retries failures with exponential backoff.
+
+Handlers must be idempotent: a job can run again if the process dies after
+the handler committed but before the job was marked done.
+"""
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import database
+import models
+
+logger = logging.getLogger("edweb.jobs")
+
+POLL_INTERVAL_SECONDS = 2.0
+LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 2
+
+HANDLERS = {}
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_worker = None
+
+
+def job(name):
+    """Register a handler: @job("name") def handler(db, **payload)."""
+    def decorator(fn):
+        HANDLERS[name] = fn
+        return fn
+    return decorator
+
+
+def enqueue(db, name, payload=None, idempotency_key=None, max_attempts=5):
+    """
+    Add a job to the caller's transaction. A job whose idempotency_key already
+    exists is silently skipped. Call notify() after committing.
+    """
+    if name not in HANDLERS:
+        raise ValueError(f"Unknown job '{name}'")
+    stmt = database.dialect_insert(models.BackgroundJob.__table__).values(
+        name=name,
+        payload=payload or {},
+        idempotency_key=idempotency_key,
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+        created_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    db.execute(stmt)
+
+
+def notify():
+    """Wake the worker so freshly committed jobs run without waiting for the next poll."""
+    _wakeup.set()
+
+
+def _claim(db):
+    now = datetime.utcnow()
+    candidate = db.query(models.BackgroundJob.id).filter(
+        models.BackgroundJob.status == "pending",
+        models.BackgroundJob.run_after <= now
+    ).order_by(models.BackgroundJob.id).first()
+    if candidate is None:
+        return None
+
+    # Conditional update so two workers can never claim the same job
+    claimed = db.execute(
+        update(models.BackgroundJob)
+        .where(models.BackgroundJob.id == candidate.id, models.BackgroundJob.status == "pending")
+        .values(status="running", claimed_at=now, attempts=models.BackgroundJob.attempts + 1)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        return False
+    return db.get(models.BackgroundJob, candidate.id)
+
+
+def _run(job_row):
+    handler = HANDLERS.get(job_row.name)
+    work_db = database.SessionLocal()
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler registered for job '{job_row.name}'")
+        handler(work_db, **(job_row.payload or {}))
+        work_db.commit()
+        return None
+    except Exception:
+        work_db.rollback()
+        return traceback.format_exc()
+    finally:
+        work_db.close()
+
+
+def run_pending(limit=None):
+    """Run due jobs until none are left (or `limit` have run). Returns the number processed."""
+    processed = 0
+    db = database.SessionLocal()
+    try:
+        while limit is None or processed < limit:
+            job_row = _claim(db)
+            if job_row is None:
+                break
+            if job_row is False:
+                continue
+
+            error = _run(job_row)
+            if error is None:
+                job_row.status = "done"
+                job_row.finished_at = datetime.utcnow()
+                job_row.last_error = None
+            elif job_row.attempts >= job_row.max_attempts:
+                job_row.status = "failed"
+                job_row.finished_at = datetime.utcnow()
+                job_row.last_error = error
+                logger.error("Job %s (%s) failed permanently:\n%s", job_row.id, job_row.name, error)
+            else:
+                job_row.status = "pending"
+                job_row.run_after = datetime.utcnow() + timedelta(seconds=BACKOFF_BASE_SECONDS ** job_row.attempts)
+                job_row.last_error = error
+            db.commit()
+            processed += 1
+    finally:
+        db.close()
+    return processed
+
+
+def recover_stale():
+    """Requeue jobs whose worker died mid-run (lease expired)."""
+    db = database.SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+        db.execute(
+            update(models.BackgroundJob)
+            .where(models.BackgroundJob.status == "running", models.BackgroundJob.claimed_at < cutoff)
+            .values(status="pending")
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _loop():
+    while not _stop.is_set():
+        try:
+            recover_stale()
+            run_pending()
+        except Exception:
+            logger.error("Job worker iteration failed", exc_info=True)
+        _wakeup.wait(POLL_INTERVAL_SECONDS)
+        _wakeup.clear()
+
+
+def start_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    _stop.clear()
+    _worker = threading.Thread(target=_loop, name="edweb-jobs", daemon=True)
+    _worker.start()
+
+
+def stop_worker(timeout=5):
+    global _worker
+    _stop.set()
+    _wakeup.set()
+    if _worker is not None:
+        _worker.join(timeout)
+    _worker = None
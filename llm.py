@@ -0,0 +1,162 @@
+"""
+LLM backends behind rag.client.
+
+rag.py only ever calls client.chat.completions.create(**kwargs) and reads
+result.choices[0].message.content, so a backend is anything with that shape.
+LLM_BACKEND picks one:
+
+  groq       the Groq SDK (default). LLM_BASE_URL points it somewhere else,
+             e.g. a local llm_simulator.py server; it calls <url>/openai/v1/chat/completions
+  openai     any OpenAI-compatible chat-completions server over plain httpx:
+             POST <LLM_BASE_URL>/chat/completions (e.g. http://127.0.0.1:8765/v1)
+  simulator  llm_simulator.Simulator in-process, no network at all;
+             LLM_SIMULATOR_LATENCY / LLM_SIMULATOR_ERROR_RATE tune it
+
+LLM_API_KEY (falling back to GROQ_API_KEY) is sent as the bearer token;
+LLM_TIMEOUT and LLM_MAX_RETRIES apply to the openai backend. Without a key
+the groq backend is off unless LLM_BASE_URL is set, since a local server
+does not check it.
+"""
+import json
+import logging
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import httpx
+
+logger = logging.getLogger("edweb.llm")
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# Statuses worth another attempt, as in the provider SDKs
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class LLMError(Exception):
+    """A chat completion failed: HTTP status (None for a timeout or connection error) and message."""
+
+    def __init__(self, status, message):
+        super().__init__(f"LLM error {status}: {message}" if status else f"LLM error: {message}")
+        self.status = status
+        self.message = message
+
+
+def to_namespace(value):
+    """Parsed JSON -> attribute access (result.choices[0].message.content), like the SDK models."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(v) for v in value]
+    return value
+
+
+def retry_delay(attempt, headers=None):
+    """Seconds to wait before retry number attempt + 1: the server's Retry-After, else jittered backoff."""
+    headers = headers or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.75, 1.0)
+
+
+class ChatCompletionsClient:
+    """
+    Minimal OpenAI-compatible client: create() returns the parsed completion,
+    or with stream=True an iterator of chunks (server-sent events). Connections
+    are pooled; 429 / 5xx / timeouts are retried up to max_retries times
+    (streams are not retried once they started).
+    """
+
+    def __init__(self, base_url, api_key=None, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, max_connections=100):
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.max_retries = max_retries
+        self._http = httpx.Client(
+            base_url=base_url.rstrip("/"), headers=headers, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        headers = kwargs.pop("extra_headers", None) or {}
+        timeout = kwargs.pop("timeout", self._http.timeout)
+        if kwargs.get("stream"):
+            return self._stream(kwargs, headers, timeout)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = self._http.post("/chat/completions", json=kwargs, headers=headers, timeout=timeout)
+            except httpx.TimeoutException as e:
+                if attempt == self.max_retries:
+                    raise LLMError(None, f"timed out: {e}") from e
+                time.sleep(retry_delay(attempt))
+                continue
+            except httpx.HTTPError as e:
+                raise LLMError(None, str(e)) from e
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                time.sleep(retry_delay(attempt, resp.headers))
+                continue
+            if resp.status_code >= 400:
+                raise LLMError(resp.status_code, _error_message(resp))
+            return to_namespace(resp.json())
+
+    def _stream(self, body, headers, timeout):
+        with self._http.stream("POST", "/chat/completions", json=body, headers=headers, timeout=timeout) as resp:
+            if resp.status_code >= 400:
+                resp.read()
+                raise LLMError(resp.status_code, _error_message(resp))
+            for line in resp.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                yield to_namespace(json.loads(data))
+
+    def close(self):
+        self._http.close()
+
+
+def _error_message(resp):
+    try:
+        return resp.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return resp.text[:200]
+
+
+def _groq(api_key):
+    if not api_key and not LLM_BASE_URL:
+        return None
+    from groq import Groq
+    return Groq(api_key=api_key or "local", base_url=LLM_BASE_URL)
+
+
+def _openai(api_key):
+    if not LLM_BASE_URL:
+        logger.warning("LLM_BACKEND=openai needs LLM_BASE_URL. AI features are off.")
+        return None
+    return ChatCompletionsClient(LLM_BASE_URL, api_key)
+
+
+def _simulator(api_key):
+    import llm_simulator
+    return llm_simulator.Simulator.from_env()
+
+
+BACKENDS = {"groq": _groq, "openai": _openai, "simulator": _simulator}
+
+
+def make_client(api_key=None, backend=None):
+    """The chat-completions client of the configured backend, or None when it is not configured."""
+    backend = backend or LLM_BACKEND
+    if backend not in BACKENDS:
+        logger.warning("Unknown LLM_BACKEND '%s' (expected one of %s). AI features are off.", backend, ", ".join(BACKENDS))
+        return None
+    return BACKENDS[backend](os.getenv("LLM_API_KEY") or api_key)
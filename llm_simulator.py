@@ -0,0 +1,393 @@
+"""
+Local stand-in for the Groq / OpenAI chat-completions API.
+
+Answers the prompts rag.py sends with canned payloads of the right shape
+(question lists and single adaptive questions as JSON, chat answers and
+cleaned speech as text), after a delay drawn from a latency distribution:
+time to first token from --latency, then --tokens-per-second for the rest.
+Faults are injected at random: HTTP errors (429 with Retry-After, 500, 503),
+truncated JSON, and stalls that outlast the caller's timeout.
+
+Latency specs (milliseconds): fixed:300, uniform:100:900, normal:400:100,
+lognormal:400:0.5 (median, sigma), exponential:400 (mean), or a profile
+name from PROFILES, which also sets the token rate.
+
+As a server (OpenAI and Groq URL layouts, streaming over server-sent events):
+
+    python llm_simulator.py --port 8765 --latency groq --error-rate 0.02
+    LLM_BACKEND=openai LLM_BASE_URL=http://127.0.0.1:8765/v1 uvicorn main:app
+    LLM_BASE_URL=http://127.0.0.1:8765 uvicorn main:app          # through the Groq SDK
+
+or in-process without sockets: LLM_BACKEND=simulator (see llm.py), or
+Simulator(...) wherever a client is expected, e.g. rag.client in tests.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import llm
+
+# name -> (time to first token, tokens per second)
+PROFILES = {
+    "instant": ("fixed:0", 0),
+    "fast": ("lognormal:150:0.3", 1200),
+    "groq": ("lognormal:300:0.5", 600),
+    "openai": ("lognormal:700:0.6", 90),
+    "slow": ("lognormal:2000:0.7", 30),
+}
+ERROR_STATUSES = (429, 500, 503)
+MAX_GENERATED_QUESTIONS = 50
+
+
+class Latency:
+    """A delay distribution in milliseconds; sample(rng) returns seconds."""
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, kind, *params):
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"bad latency distribution {kind}{params}; expected one of {', '.join(self.KINDS)}")
+        self.kind = kind
+        self.params = tuple(float(p) for p in params)
+
+    @classmethod
+    def parse(cls, spec):
+        kind, *params = spec.split(":")
+        return cls(kind, *params)
+
+    def sample(self, rng):
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            ms = rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        else:
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+    def __str__(self):
+        return ":".join([self.kind, *(f"{p:g}" for p in self.params)])
+
+
+class Simulator:
+    """
+    Decides each reply (payload, latency, fault) and keeps what it served:
+    latencies (seconds per answered request) and statuses (Counter, None for
+    a stall). Usable in-process as a client (.chat.completions.create) or
+    behind serve().
+    """
+
+    def __init__(self, latency="fixed:0", tokens_per_second=None, error_rate=0.0, error_statuses=ERROR_STATUSES,
+                 malformed_rate=0.0, stall_rate=0.0, stall_seconds=30.0, retry_after=0.1, seed=None):
+        if latency in PROFILES:
+            latency, profile_rate = PROFILES[latency]
+            tokens_per_second = profile_rate if tokens_per_second is None else tokens_per_second
+        self.latency = latency if isinstance(latency, Latency) else Latency.parse(latency)
+        self.tokens_per_second = tokens_per_second or 0
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.malformed_rate = malformed_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = Counter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @classmethod
+    def from_env(cls):
+        tps = os.getenv("LLM_SIMULATOR_TOKENS_PER_SECOND")
+        return cls(
+            latency=os.getenv("LLM_SIMULATOR_LATENCY", "groq"),
+            tokens_per_second=float(tps) if tps else None,
+            error_rate=float(os.getenv("LLM_SIMULATOR_ERROR_RATE", "0")),
+            seed=int(os.getenv("LLM_SIMULATOR_SEED")) if os.getenv("LLM_SIMULATOR_SEED") else None,
+        )
+
+    def __repr__(self):
+        return (f"Simulator(latency={self.latency}, tokens_per_second={self.tokens_per_second:g}, "
+                f"error_rate={self.error_rate:g}, malformed_rate={self.malformed_rate:g}, stall_rate={self.stall_rate:g})")
+
+    # --- replies ---
+
+    def plan(self, body):
+        """What to answer to one request: status (None = stall), time to first token, content tokens."""
+        with self._lock:
+            roll = self._rng.random()
+            ttft = self.latency.sample(self._rng)
+            status = 200
+            if roll < self.stall_rate:
+                status = None
+            elif roll < self.stall_rate + self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+            malformed = self._rng.random() < self.malformed_rate
+            content_rng = random.Random(self._rng.random())
+        content = respond(body, content_rng)
+        if malformed and _json_mode(body):
+            content = content[:len(content) // 2]
+        tokens = re.findall(r"\S+\s*", content)[:body.get("max_tokens") or None]
+        return SimpleNamespace(status=status, ttft=ttft, tokens=tokens, content="".join(tokens))
+
+    def generation_time(self, reply):
+        return reply.ttft + (len(reply.tokens) / self.tokens_per_second if self.tokens_per_second else 0.0)
+
+    def record(self, status, seconds=None):
+        with self._lock:
+            self.statuses[status] += 1
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def error_body(self, status):
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        return {"error": {"message": f"Simulated {status}", "type": kind, "code": kind}}
+
+    # --- in-process client ---
+
+    def create(self, **kwargs):
+        """Same contract as the SDKs' chat.completions.create; failures raise llm.LLMError (no retries)."""
+        timeout = kwargs.pop("timeout", None)
+        kwargs.pop("extra_headers", None)
+        started = time.perf_counter()
+        reply = self.plan(kwargs)
+        if reply.status is None:
+            time.sleep(min(self.stall_seconds, timeout or self.stall_seconds))
+            self.record(None)
+            raise llm.LLMError(None, "timed out")
+        if reply.status != 200:
+            self.record(reply.status, time.perf_counter() - started)
+            raise llm.LLMError(reply.status, self.error_body(reply.status)["error"]["message"])
+        if kwargs.get("stream"):
+            return self._stream(kwargs, reply, started)
+        time.sleep(self.generation_time(reply))
+        self.record(200, time.perf_counter() - started)
+        return llm.to_namespace(completion(kwargs, reply))
+
+    def _stream(self, body, reply, started):
+        for chunk, delay in stream_chunks(self, body, reply):
+            time.sleep(delay)
+            yield llm.to_namespace(chunk)
+        self.record(200, time.perf_counter() - started)
+
+
+def _json_mode(body):
+    return (body.get("response_format") or {}).get("type") == "json_object"
+
+
+def _prompt(body):
+    return "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+
+def question(rng, topic, difficulty="medium", question_type="mcq"):
+    """One question in the shape rag.py asks for."""
+    stem = rng.choice(("Which statement about {} is correct?", "What is the main purpose of {}?",
+                       "Which of these is an example of {}?", "What happens first when working with {}?"))
+    q = {
+        "questionText": stem.format(topic) + f" ({difficulty}, #{rng.randrange(10 ** 6)})",
+        "questionType": question_type,
+        "difficulty": difficulty,
+    }
+    if question_type == "mcq":
+        q["options"] = [{"text": f"{topic} option {k + 1}"} for k in range(4)]
+        q["correctOptionIndex"] = rng.randrange(4)
+    else:
+        q["correctAnswerText"] = f"Key points about {topic}: definition, purpose and one example."
+    return q
+
+
+def respond(body, rng):
+    """Canned content for a request, recognised from the prompts in rag.py."""
+    prompt = _prompt(body)
+    if _json_mode(body):
+        single = re.search(r"Generate exactly ONE (\w+) difficulty (\w+) question about '([^']*)'", prompt)
+        if single:
+            difficulty, question_type, topic = single.groups()
+            return json.dumps(question(rng, topic, difficulty.lower(), question_type))
+        batch = re.search(r"Generate (\d+) (\w+) difficulty (multiple choice|descriptive) questions about '([^']*)'", prompt)
+        count, difficulty, kind, topic = batch.groups() if batch else ("1", "medium", "multiple choice", "the course")
+        question_type = "mcq" if kind == "multiple choice" else "descriptive"
+        return json.dumps({"questions": [question(rng, topic, difficulty, question_type)
+                                         for _ in range(min(int(count), MAX_GENERATED_QUESTIONS))]})
+
+    speech = re.search(r"Input:\n(.*?)\n\nCorrected sentence:", prompt, re.S)
+    if speech:
+        words = []
+        for word in speech.group(1).split():
+            if not words or word.lower() != words[-1].lower():
+                words.append(word)
+        sentence = " ".join(words).strip(" .") or "Nothing was said"
+        return sentence[0].upper() + sentence[1:] + "."
+
+    asked = re.search(r"Student Question:\n(.*?)\n", prompt, re.S)
+    subject = asked.group(1).strip().rstrip("?") if asked else "this topic"
+    paragraphs = rng.randint(2, 4)
+    return "\n\n".join(
+        f"Point {i + 1} on '{subject}': start from the definition, work through a small example, "
+        f"then check your understanding by explaining it back in your own words." for i in range(paragraphs)
+    )
+
+
+def completion(body, reply):
+    prompt_tokens = len(_prompt(body).split())
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "simulator"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply.content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply.tokens),
+                  "total_tokens": prompt_tokens + len(reply.tokens)},
+    }
+
+
+def stream_chunks(simulator, body, reply):
+    """(chunk, delay before it) pairs of a streamed reply, role first and finish_reason last."""
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": body.get("model", "simulator")}
+    per_token = 1 / simulator.tokens_per_second if simulator.tokens_per_second else 0.0
+    yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}, reply.ttft
+    for token in reply.tokens:
+        yield {**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}, per_token
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}, 0.0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    verbose = False
+
+    @property
+    def simulator(self):
+        return self.server.simulator
+
+    def _send_json(self, status, payload, headers=()):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "llama-3.1-8b-instant", "object": "model"}]})
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        sim = self.simulator
+        reply = sim.plan(body)
+        if reply.status is None:
+            # Outlast the caller's timeout, then drop the connection
+            time.sleep(sim.stall_seconds)
+            sim.record(None)
+            self.close_connection = True
+            return
+        if reply.status != 200:
+            headers = [("Retry-After", f"{sim.retry_after:g}"), ("retry-after-ms", f"{sim.retry_after * 1000:g}")] \
+                if reply.status == 429 else []
+            self._send_json(reply.status, sim.error_body(reply.status), headers)
+            sim.record(reply.status, time.perf_counter() - started)
+            return
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for chunk, delay in stream_chunks(sim, body, reply):
+                time.sleep(delay)
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        else:
+            time.sleep(sim.generation_time(reply))
+            self._send_json(200, completion(body, reply))
+        sim.record(200, time.perf_counter() - started)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many concurrent callers; the default of 5 refuses connections under load
+    request_queue_size = 256
+
+    def __init__(self, simulator, host="127.0.0.1", port=0, verbose=False):
+        handler = type("Handler", (_Handler,), {"verbose": verbose})
+        super().__init__((host, port), handler)
+        self.simulator = simulator
+        self.url = f"http://{host}:{self.server_port}"
+
+
+def serve(simulator, host="127.0.0.1", port=0):
+    """Start a SimulatorServer in a background thread; call .shutdown() when done."""
+    server = SimulatorServer(simulator, host, port)
+    threading.Thread(target=server.serve_forever, name="llm-simulator", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="groq", help="time to first token: a spec or one of " + ", ".join(PROFILES))
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default=",".join(map(str, ERROR_STATUSES)))
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of JSON replies cut in half")
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of simulated 429s (seconds)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    simulator = Simulator(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",")], malformed_rate=args.malformed_rate,
+        stall_rate=args.stall_rate, stall_seconds=args.stall_seconds, retry_after=args.retry_after, seed=args.seed,
+    )
+    server = SimulatorServer(simulator, args.host, args.port, verbose=args.verbose)
+    print(f"{simulator} listening on {server.url}")
+    print(f"  LLM_BACKEND=openai LLM_BASE_URL={server.url}/v1   or   LLM_BASE_URL={server.url} (Groq SDK)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Load tests: concurrent virtual users running realistic traffic against the API.
+
+Each virtual user loops over scenarios picked by weight (--mix):
+  learner     login -> catalogue -> my courses -> course detail -> module quiz
+              submit -> adaptive final assessment (start, answer until finished, submit)
+  instructor  login -> my courses -> my learners -> roster -> batches -> CSV performance report
+  chat        anonymous RAG chat
+  ai          instructor: login -> generate questions -> clean speech
+
+Accounts are those of a synthetic database (synthetic.py, password
+"password123"), so --scale must match the one the target was generated with.
+Every request is timed by endpoint (route template, not raw path). The report
+gives throughput, error rate and p50/p95/p99 per endpoint, can be saved as a
+JSON baseline, and later runs are compared against it: a p95 or error rate
+worse than the tolerance fails the run (exit status 1).
+
+In-process the LLM is llm_simulator.py, called directly or (--llm-transport
+http) over a local server and llm.ChatCompletionsClient, the full network
+path with retries. --llm-latency / --llm-error-rate set what the upstream
+does, and the report adds the latency the simulator itself served, so the
+AI endpoints' own overhead and queueing show against a known upstream delay.
+Against --url, start the server with LLM_BACKEND / LLM_BASE_URL aimed at
+`python llm_simulator.py` to the same effect.
+
+    python loadtest.py --url http://127.0.0.1:8000 --users 50 --duration 60
+    python loadtest.py --in-process --users 20 --duration 20        # main.app, fresh synthetic DB, simulated LLM
+    python loadtest.py --in-process --save-baseline loadtest_baseline.json
+    python loadtest.py --in-process --baseline loadtest_baseline.json --tolerance 0.25
+    python loadtest.py --in-process --mix chat=1,ai=1 --users 50 --llm-latency groq --llm-transport http   # AI paths
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+import synthetic
+
+SCENARIOS = ("learner", "instructor", "chat", "ai")
+DEFAULT_MIX = {"learner": 6, "instructor": 3, "chat": 1}
+# Regressions smaller than this are noise, whatever the tolerance
+MIN_LATENCY_DELTA_MS = 5.0
+MIN_ERROR_RATE_DELTA = 0.01
+ADAPTIVE_MAX_STEPS = 10
+
+
+def percentile(values, p):
+    """Linear-interpolated percentile (p in 0..100) of unsorted values, None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, ms, ok):
+        self.latencies[endpoint].append(ms)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 3),
+                "error_rate": round(self.errors[endpoint] / len(values), 4),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(max(values), 3),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "duration_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Regressions of report against baseline: slower p95 / p99, more errors, lower throughput."""
+    regressions = []
+    for endpoint, old in baseline["endpoints"].items():
+        new = report["endpoints"].get(endpoint)
+        if new is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] > MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{endpoint}: {key} {old[key]:.1f} -> {new[key]:.1f}")
+        if new["error_rate"] - old["error_rate"] > MIN_ERROR_RATE_DELTA:
+            regressions.append(f"{endpoint}: error rate {old['error_rate']:.2%} -> {new['error_rate']:.2%}")
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput_rps']:.1f} -> {report['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+class VirtualUser:
+    """One simulated client: its own token, random stream and share of the learner accounts.
+
+    Learners are dealt out round-robin (user n of N gets every Nth learner), so
+    two users never race each other through the same learner's assessment.
+    """
+
+    def __init__(self, client, stats, rng, scale, n=0, users=1):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.scale = scale
+        self.learners = range(scale.instructors + 1 + n % scale.learners, scale.instructors + scale.learners + 1, users)
+        self.headers = {}
+
+    async def call(self, endpoint, method, url, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, headers=self.headers, **kwargs)
+            ok = resp.status_code in expect
+        except httpx.HTTPError:
+            resp, ok = None, False
+        self.stats.record(endpoint, (time.perf_counter() - started) * 1000, ok)
+        return resp if ok else None
+
+    async def login(self, role):
+        self.headers = {}
+        if role == "learner":
+            uid = self.rng.choice(self.learners)
+        else:
+            uid = 1 + self.rng.randrange(self.scale.instructors)
+        resp = await self.call("POST /auth/login", "POST", "/auth/login",
+                               json={"username": f"{role}{uid}@synthetic.edweb", "password": synthetic.PASSWORD})
+        if resp is not None:
+            self.headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        return resp is not None
+
+    # --- scenarios ---
+
+    async def learner(self):
+        if not await self.login("learner"):
+            return
+        await self.call("GET /courses", "GET", "/courses")
+        mine = await self.call("GET /courses/my-courses", "GET", "/courses/my-courses")
+        if mine is None or not mine.json():
+            return
+        course_id = self.rng.choice(mine.json())["id"]
+        detail = await self.call("GET /courses/{course_id}", "GET", f"/courses/{course_id}")
+        if detail is None:
+            return
+        modules = [m for m in detail.json().get("modules", []) if m.get("quiz")]
+        if modules:
+            module = self.rng.choice(modules)
+            answers = [self.rng.randrange(4) for _ in module["quiz"]]
+            await self.call("POST /modules/{module_id}/quiz/submit", "POST", f"/modules/{module['id']}/quiz/submit",
+                            json={"answers": answers, "total_questions": len(answers)})
+        await self._adaptive_assessment(course_id)
+
+    async def _adaptive_assessment(self, course_id):
+        start = await self.call("POST /quizzes/{course_id}/adaptive/start", "POST", f"/quizzes/{course_id}/adaptive/start")
+        if start is None or start.json().get("completed"):
+            return
+        session_id, question = start.json()["session_id"], start.json()["question"]
+        for _ in range(ADAPTIVE_MAX_STEPS):
+            step = await self.call("POST /quizzes/{course_id}/adaptive/next", "POST", f"/quizzes/{course_id}/adaptive/next",
+                                   json={"session_id": session_id, "question_id": question["id"], "answer": self.rng.randrange(4)})
+            if step is None or step.json().get("finished"):
+                break
+            question = step.json()["question"]
+        await self.call("POST /quizzes/{course_id}/submit", "POST", f"/quizzes/{course_id}/submit",
+                        json={"is_adaptive": True, "session_id": session_id})
+
+    async def instructor(self):
+        if not await self.login("instructor"):
+            return
+        mine = await self.call("GET /courses/my-courses", "GET", "/courses/my-courses")
+        await self.call("GET /courses/my-learners", "GET", "/courses/my-learners")
+        await self.call("GET /batches", "GET", "/batches")
+        if mine is None or not mine.json():
+            return
+        course_id = self.rng.choice(mine.json())["id"]
+        await self.call("GET /courses/{course_id}/students", "GET", f"/courses/{course_id}/students")
+        await self.call("GET /courses/{course_id}/reports/performance", "GET", f"/courses/{course_id}/reports/performance?format=csv")
+
+    async def chat(self):
+        self.headers = {}
+        topic = self.rng.choice(synthetic.TOPICS)
+        await self.call("POST /api/chat", "POST", "/api/chat", json={"message": f"Can you explain {topic} simply?"})
+
+    async def ai(self):
+        if not await self.login("instructor"):
+            return
+        topic = self.rng.choice(synthetic.TOPICS)
+        await self.call("POST /api/ai/generate-questions", "POST", "/api/ai/generate-questions",
+                        json={"topic": topic, "questionType": self.rng.choice(("mcq", "descriptive")), "count": 5})
+        await self.call("POST /api/ai/clean-speech", "POST", "/api/ai/clean-speech",
+                        json={"text": f"what what is is {topic.lower()} uh used used for"})
+
+
+def upstream_report(simulator):
+    """What the LLM simulator served: requests, statuses and its own latency percentiles."""
+    latencies = [s * 1000 for s in simulator.latencies]
+    report = {"requests": sum(simulator.statuses.values()),
+              "statuses": {str(status): n for status, n in sorted(simulator.statuses.items(), key=str)}}
+    for p in (50, 95, 99):
+        report[f"p{p}_ms"] = round(percentile(latencies, p), 3) if latencies else None
+    return report
+
+
+async def run(client, users, duration, mix=None, scale="small", seed=0, ramp_up=0.0):
+    """Run `users` virtual users against client (an httpx.AsyncClient) for `duration` seconds. Returns Stats."""
+    scale = synthetic.PRESETS[scale] if isinstance(scale, str) else scale
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(n):
+        rng = random.Random(f"{seed}:vu:{n}")
+        vu = VirtualUser(client, stats, rng, scale, n, users)
+        if ramp_up:
+            await asyncio.sleep(ramp_up * n / users)
+        while time.perf_counter() < deadline:
+            await getattr(vu, rng.choices(names, weights)[0])()
+
+    await asyncio.gather(*(virtual_user(n) for n in range(users)))
+    stats.finished = time.perf_counter()
+    return stats
+
+
+def print_report(report, out=sys.stdout):
+    print(f"{report['requests']} requests in {report['duration_s']:.1f}s: {report['throughput_rps']:.1f} req/s, "
+          f"{report['error_rate']:.2%} errors", file=out)
+    print(f"  {'endpoint':<48} {'reqs':>6} {'req/s':>7} {'err':>6} {'p50':>8} {'p95':>8} {'p99':>8}", file=out)
+    for endpoint, e in report["endpoints"].items():
+        print(f"  {endpoint:<48} {e['requests']:>6} {e['throughput_rps']:>7.1f} {e['error_rate']:>6.1%} "
+              f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f}", file=out)
+    upstream = report.get("upstream")
+    if upstream and upstream["requests"]:
+        statuses = ", ".join(f"{status}: {n}" for status, n in upstream["statuses"].items())
+        print(f"  {'(LLM upstream)':<48} {upstream['requests']:>6} {'':>7} {'':>6} {upstream['p50_ms'] or 0:>8.1f} "
+              f"{upstream['p95_ms'] or 0:>8.1f} {upstream['p99_ms'] or 0:>8.1f}  [{statuses}]", file=out)
+
+
+def _in_process_client(args, simulator):
+    """An httpx client bound to main.app over a synthetic database, with the LLM simulated."""
+    os.environ["DATABASE_URL"] = args.database
+    os.environ.setdefault("LOG_CONSOLE", "0")  # keep the report readable; the log file still has everything
+    import database
+    import main
+    import rag
+    try:
+        synthetic.generate(database.engine, args.scale, seed=args.seed)
+    except ValueError:
+        pass  # generated by an earlier run
+    if args.llm_transport == "http":
+        import llm
+        import llm_simulator
+        server = llm_simulator.serve(simulator)
+        rag.client = llm.ChatCompletionsClient(f"{server.url}/v1", max_connections=args.users)
+    else:
+        rag.client = simulator
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadtest")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8000")
+    target.add_argument("--in-process", action="store_true", help="drive main.app directly (no server, no network)")
+    parser.add_argument("--database", default="sqlite:///./loadtest.db", help="in-process database, generated if empty")
+    parser.add_argument("--scale", choices=sorted(synthetic.PRESETS), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds until every user is running")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--llm-latency", default="fixed:50", help="simulated LLM latency spec or profile (in-process), see llm_simulator.py")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of simulated LLM calls that fail")
+    parser.add_argument("--llm-transport", choices=("direct", "http"), default="direct",
+                        help="call the simulator directly or through a local HTTP server")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="compare against this report")
+    parser.add_argument("--save-baseline", help="write the report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (part.split("=") for part in args.mix.split(","))}
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    simulator = None
+    if args.in_process:
+        import llm_simulator
+        simulator = llm_simulator.Simulator(latency=args.llm_latency, error_rate=args.llm_error_rate, seed=args.seed)
+
+    async def go():
+        limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+        client = _in_process_client(args, simulator) if args.in_process else httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+        async with client:
+            return await run(client, args.users, args.duration, mix, args.scale, args.seed, args.ramp_up)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report = asyncio.run(go()).report()
+    report["settings"] = {"users": args.users, "duration": args.duration, "mix": mix, "scale": args.scale,
+                          "target": "in-process" if args.in_process else args.url}
+    if simulator is not None:
+        report["settings"]["llm"] = repr(simulator)
+        report["upstream"] = upstream_report(simulator)
+    print_report(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
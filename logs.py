@@ -0,0 +1,167 @@
+"""
+Non-blocking, structured application logging.
+
+configure() puts a QueueHandler on the root logger: request handlers only
+enqueue the record, and a QueueListener thread formats it as one JSON line
+and writes it to a rotating file (and the console). Every record carries the
+id of the request it was logged from (see the middleware in main.py), so all
+lines of one request can be grepped together.
+
+Settings (environment):
+  LOG_FILE          log file path, empty to log to the console only (logs/edweb.log)
+  LOG_LEVEL         minimum level (INFO)
+  LOG_MAX_BYTES     size-based rotation threshold (10 MB)
+  LOG_BACKUP_COUNT  rotated files kept (5)
+  LOG_ROTATE_WHEN   time-based rotation instead, e.g. "midnight" or "H"
+  LOG_CONSOLE       also log to stderr ("1")
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Records beyond this many waiting for the writer are dropped, not buffered
+QUEUE_SIZE = 10000
+
+_request_id = ContextVar("request_id", default=None)
+_listener = None
+_handler = None
+
+
+def set_request_id(value):
+    return _request_id.set(value)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps the current request id on the record while still on the request's thread."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return True
+
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_plain = logging.Formatter()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the writer falls behind."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now (args / exc_info may not survive the thread hop),
+        # but keep the traceback separate for the JSON "exception" field
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _file_handler(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    backups = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    when = os.getenv("LOG_ROTATE_WHEN")
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))), backupCount=backups, encoding="utf-8"
+    )
+
+
+def configure(path=None, level=None):
+    """Route all logging through the queue (once per process). Returns the QueueHandler."""
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+
+    path = os.getenv("LOG_FILE", "logs/edweb.log") if path is None else path
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+
+    formatter = JsonFormatter()
+    handlers = []
+    if path:
+        handlers.append(_file_handler(path))
+    if os.getenv("LOG_CONSOLE", "1") == "1":
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _handler = _QueueHandler(queue.Queue(QUEUE_SIZE))
+    _handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    # One INFO line per outgoing HTTP call (LLM provider, TestClient) is noise
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    return _handler
+
+
+def flush():
+    """Block until every record enqueued so far has been written."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def shutdown():
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_handler)
+    _listener = _handler = None
@@ -1,25 +1,61 @@
 import models, database, auth, schemas, random
 from datetime import timedelta, datetime
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request, Header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-import os, shutil, csv
-from io import StringIO
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from starlette.concurrency import run_in_threadpool
+import os, shutil, json, time, logging, uuid, functools
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import or_, select, func
 from pydantic import BaseModel  # Import BaseModel
 import rag  # Import the RAG engine
+import cache
+import answer_keys
+import adaptive
+import quiz_sessions
+import jobs
+import awards  # registers the reward job handlers
+import batches
+import enrolments
+import progress
+import responses
+import reports
+import metrics
+import logs
+import slow_queries
+import profiling
+import tracing
 from dotenv import load_dotenv
 
 # Load environment variables at the very beginning
 load_dotenv(override=True)
 
+# JSON logs written by a background thread (see logs.py)
+logs.configure()
+
+# Spans exported in the background, off unless TRACE_EXPORTER is set (see tracing.py)
+tracing.configure()
+
 # Create database tables
 models.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI(title="EdWeb API (SQLAlchemy)")
+# FastAPI traces each request (route, dependencies, endpoint, serialisation) into our provider
+app = FastAPI(title="EdWeb API (SQLAlchemy)", telemetry={
+    "tracer_provider": tracing.provider,
+    "metrics": False,
+    "logs": False,
+    "exclude": lambda scope: not tracing.provider.enabled,
+})
+logger = logging.getLogger("edweb")
+
+# SQL statement counts and time per request (see metrics.py)
+metrics.instrument_engine(database.engine)
+# One span per SQL statement, under the request's span
+tracing.instrument_engine(database.engine)
+# Opt-in: statements slower than SLOW_QUERY_MS are logged with their plans
+slow_queries.install(database.engine)
 
 # Configure CORS
 app.add_middleware(
@@ -30,15 +66,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_job_worker():
+    jobs.start_worker()
+
+@app.on_event("shutdown")
+def stop_job_worker():
+    jobs.stop_worker()
+
+@app.on_event("shutdown")
+def save_slow_query_report():
+    if slow_queries.recorder is not None:
+        slow_queries.recorder.save_report()
+
 # --- RAG Integration ---
 @app.on_event("startup")
 def startup_event():
     # Only index content if not already indexed (lazy/persisted)
     if rag.is_indexed():
-        print("RAG Index found on disk. Skipping startup indexing.")
+        logger.info("RAG Index found on disk. Skipping startup indexing.")
         return
 
-    print("Building initial RAG Index...")
+    logger.info("Building initial RAG Index...")
     db = database.SessionLocal()
     try:
         courses = db.query(models.Course).filter(models.Course.status == "Published").all()
@@ -55,9 +104,9 @@ def startup_event():
         
         # Build Index
         rag.index_content(courses_data)
-        print("RAG Index built and persisted successfully.")
+        logger.info("RAG Index built and persisted successfully.")
     except Exception as e:
-        print(f"Failed to build RAG index: {e}")
+        logger.exception("Failed to build RAG index")
     finally:
         db.close()
 
@@ -66,8 +115,10 @@ class ChatRequest(BaseModel):
     history: Optional[List[dict]] = []
 
 
+# The AI endpoints are plain defs: FastAPI runs them in the threadpool, so a
+# slow LLM call holds one worker thread instead of the whole event loop
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest):
     user_query = request.message
     
     # 1. Retrieve Context
@@ -79,7 +130,7 @@ async def chat_endpoint(request: ChatRequest):
     return {"response": response_text}
 
 @app.post("/api/ai/clean-speech", response_model=schemas.CleanSpeechResponse)
-async def clean_speech_endpoint(request: schemas.CleanSpeechRequest):
+def clean_speech_endpoint(request: schemas.CleanSpeechRequest):
     """
     Intelligently reconstructs fragmented/impaired speech using Groq.
     Part of the Accessibility Voice Mode feature.
@@ -88,12 +139,12 @@ async def clean_speech_endpoint(request: schemas.CleanSpeechRequest):
         cleaned = rag.clean_speech(request.text)
         return {"cleaned_text": cleaned, "confidence": None}
     except Exception as e:
-        print(f"Clean Speech Endpoint Error: {e}")
+        logger.exception("Clean Speech Endpoint Error")
         # Always return something safe for accessibility users
         return {"cleaned_text": request.text, "confidence": None}
 
 @app.post("/api/ai/generate-questions")
-async def ai_generate_questions(request: schemas.AIGenerateRequest, current_user: dict = Depends(auth.get_current_user)):
+def ai_generate_questions(request: schemas.AIGenerateRequest, current_user: dict = Depends(auth.get_current_user)):
     if current_user["role"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can generate questions")
     
@@ -101,21 +152,68 @@ async def ai_generate_questions(request: schemas.AIGenerateRequest, current_user
     return {"questions": questions}
 
 
-# Global Exception Handler
+# Request metrics and global exception handler
 @app.middleware("http")
 async def catch_exceptions_middleware(request: Request, call_next):
+    # Every log line of the request carries its id; clients may pass their own
+    request_id = (request.headers.get("X-Request-ID") or uuid.uuid4().hex)[:64]
+    request_token = logs.set_request_id(request_id)
+    stats, token = metrics.begin_request(request.scope)
+    metrics.IN_FLIGHT.inc()
+    # Opt-in CPU profile of this request (see profiling.py)
+    sampler = profiling.start() if profiling.requested(request.headers) else None
+    started = time.perf_counter()
+    status_code = 500
     try:
-        return await call_next(request)
+        response = await call_next(request)
+        status_code = response.status_code
     except Exception as e:
-        import traceback
-        with open("backend_errors_global.log", "a") as f:
-            f.write(f"\nUnhandled Error: {request.method} {request.url}\n")
-            f.write(traceback.format_exc())
-            print(traceback.format_exc()) # Print to console too
-        return JSONResponse(
+        logger.exception("Unhandled Error: %s %s", request.method, request.url)
+        response = JSONResponse(
             status_code=500,
             content={"detail": "Internal Server Error", "error": str(e)}
         )
+    finally:
+        metrics.IN_FLIGHT.dec()
+        metrics.observe_request(request.method, metrics.route_of(request), status_code, time.perf_counter() - started, stats)
+        metrics.end_request(token)
+        logs.reset_request_id(request_token)
+    response.headers["X-Request-ID"] = request_id
+    if sampler is not None:
+        route = metrics.route_of(request)
+        name = profiling.store.new_name(request.method, route, request_id)
+        response.headers["X-Profile-Id"] = name
+        finish = functools.partial(profiling.finish, sampler, name, request.method, request.url.path, route, status_code, started, request_id)
+        if hasattr(response, "body_iterator"):
+            # The body (e.g. a streamed report) is produced after call_next returns
+            response.body_iterator = profiling.profiled_body(response.body_iterator, finish)
+        else:
+            await run_in_threadpool(finish)
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus scrape endpoint
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/slow-queries", include_in_schema=False, dependencies=[Depends(auth.require_debug_token)])
+def get_slow_queries():
+    if slow_queries.recorder is None:
+        raise HTTPException(status_code=404, detail="The slow-query log is disabled. Set SLOW_QUERY_MS to enable it.")
+    return {"threshold_ms": slow_queries.recorder.threshold_ms, "queries": slow_queries.recorder.report()}
+
+@app.get("/debug/profiles", include_in_schema=False, dependencies=[Depends(auth.require_debug_token)])
+def list_profiles():
+    # Newest first, each with its hottest frames
+    return {"profiles": profiling.store.list()}
+
+@app.get("/debug/profiles/{name}", include_in_schema=False, dependencies=[Depends(auth.require_debug_token)])
+def get_profile(name: str):
+    # Folded stacks: feed to flamegraph.pl or drop into speedscope
+    folded = profiling.store.folded(name)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(folded, media_type="text/plain; charset=utf-8")
 
 
 # Ensure upload directory exists
@@ -225,7 +323,28 @@ def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(
     return {"message": "Password reset successfully"}
 
 @app.get("/courses", response_model=List[dict])
-def get_all_courses(q: Optional[str] = None, db: Session = Depends(database.get_db)):
+def get_all_courses(request: Request, q: Optional[str] = None, current_user_opt: Optional[dict] = Depends(auth.get_current_user_optional), db: Session = Depends(database.get_db)):
+    # The explore feed is the same for every visitor with the same search, so serve it
+    # from the response cache; a matching If-None-Match gets a 304 without any query.
+    entry = cache.response_cache.get("courses", q or "", ("catalogue",))
+    if entry is None:
+        entry = cache.response_cache.set("courses", q or "", ("catalogue",), _build_catalogue(q, db))
+
+    # isEnrolled is the only per-viewer field; learners get it from one indexed lookup
+    if current_user_opt and current_user_opt.get("role") == "learner":
+        enrolled_ids = {
+            course_id for (course_id,) in db.query(models.Enrolment.course_id).filter(
+                models.Enrolment.user_id == current_user_opt["id"]
+            )
+        }
+        if enrolled_ids:
+            courses = json.loads(entry.body)
+            for c in courses:
+                c["isEnrolled"] = c["id"] in enrolled_ids
+            entry = cache.make_entry(courses)
+    return cache.json_response(request, entry)
+
+def _build_catalogue(q: Optional[str], db: Session):
     # Only return published courses for the general explore feed
     query = db.query(models.Course).filter(models.Course.status == "Published")
     
@@ -250,7 +369,8 @@ def get_all_courses(q: Optional[str] = None, db: Session = Depends(database.get_
             "price": c.price,
             "status": c.status,
             "instructor_id": c.instructor_id,
-            "enrolledStudents": [e.user_id for e in c.enrolments],
+            "enrolledCount": c.enrolment_count or 0,
+            "isEnrolled": False,
             "progress": 0,
             "instructor": schemas.UserResponse.from_orm(c.instructor) if c.instructor else None
         })
@@ -264,16 +384,15 @@ def get_my_courses(
     db: Session = Depends(database.get_db)
 ):
     user_id = current_user["id"]
+    # Instructors are loaded with the courses, not one lazy load per course
+    query = db.query(models.Course).options(joinedload(models.Course.instructor))
     if current_user["role"] == "instructor":
-        query = db.query(models.Course).filter(models.Course.instructor_id == user_id)
+        query = query.filter(models.Course.instructor_id == user_id)
     else:
-        # Get courses the user is enrolled in
-        enrolments = db.query(models.Enrolment).filter(models.Enrolment.user_id == user_id).all()
-        course_ids = [e.course_id for e in enrolments]
-        
+        # Courses the user is enrolled in.
         # Learners should ONLY see 'Published' courses in their learning list
-        query = db.query(models.Course).filter(
-            models.Course.id.in_(course_ids),
+        query = query.filter(
+            models.Course.id.in_(select(models.Enrolment.course_id).where(models.Enrolment.user_id == user_id)),
             models.Course.status == "Published"
         )
     
@@ -289,18 +408,13 @@ def get_my_courses(
         )
 
     courses = query.all()
+
+    # One lookup for every course's progress instead of a count per course
+    progress_by_course = progress.for_learner(db, user_id) if current_user["role"] == "learner" else {}
     
     result = []
     for c in courses:
-        progress = 0
-        if current_user["role"] == "learner":
-            total_modules = len(c.modules)
-            if total_modules > 0:
-                completed_modules = db.query(models.QuizResult.module_id).filter(
-                    models.QuizResult.user_id == user_id,
-                    models.QuizResult.module_id.in_([m.id for m in c.modules])
-                ).distinct().count()
-                progress = int((completed_modules / total_modules) * 100)
+        course_progress = progress_by_course.get(c.id)
                 
         result.append({
             "id": c.id,
@@ -311,8 +425,9 @@ def get_my_courses(
             "price": c.price,
             "status": c.status,
             "instructor_id": c.instructor_id,
-            "enrolledStudents": [e.user_id for e in c.enrolments],
-            "progress": progress,
+            "enrolledCount": c.enrolment_count or 0,
+            "isEnrolled": current_user["role"] == "learner",
+            "progress": course_progress.progress if course_progress else 0,
             "instructor": schemas.UserResponse.from_orm(c.instructor) if c.instructor else None
         })
     return result
@@ -402,6 +517,7 @@ def create_course(course: schemas.CourseCreate, current_user: dict = Depends(aut
         db.add(notif)
 
     db.commit()
+    cache.response_cache.invalidate("catalogue")
     return {**schemas.CourseResponse.from_orm(new_course).dict(), "_id": new_course.id}
 
 @app.put("/courses/{course_id}/status")
@@ -416,6 +532,7 @@ def update_course_status(course_id: int, status_update: dict, current_user: dict
     
     course.status = status_update.get("status", "Draft")
     db.commit()
+    cache.response_cache.invalidate("catalogue", cache.course_tag(course_id))
 
     # If status is Published, notify all learners
     if course.status == "Published":
@@ -455,10 +572,11 @@ def update_course(course_id: int, course_update: schemas.CourseUpdate, current_u
     incoming_module_ids = [m.id for m in course_update.modules if m.id is not None]
     
     # Delete modules not in update
-    db.query(models.Module).filter(
+    removed_modules = db.query(models.Module).filter(
         models.Module.course_id == course_id,
         ~models.Module.id.in_(incoming_module_ids)
     ).delete(synchronize_session=False)
+    modules_changed = removed_modules > 0 or len(incoming_module_ids) < len(course_update.modules)
     
     for mod_data in course_update.modules:
         if mod_data.id:
@@ -536,7 +654,13 @@ def update_course(course_id: int, course_update: schemas.CourseUpdate, current_u
             for opt_data in q_data.options:
                 db.add(models.QuestionOption(text=opt_data.text, question_id=db_q.id))
 
+    # Completed/total module counts depend on the module set
+    if modules_changed:
+        progress.rebuild(db, course_id=course_id)
+
+    answer_keys.bump_version(db, course_id)
     db.commit()
+    cache.response_cache.invalidate("catalogue", cache.course_tag(course_id), cache.questions_tag(course_id))
     return {"message": "Course updated successfully"}
 
 @app.delete("/courses/{course_id}")
@@ -552,12 +676,12 @@ def delete_course(course_id: int, current_user: dict = Depends(auth.get_current_
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Deletion is handled by cascades in models.py
+    progress.delete_course(db, course_id)
     db.delete(db_course)
     db.commit()
+    cache.response_cache.invalidate("catalogue", cache.course_tag(course_id), cache.questions_tag(course_id))
     return {"message": "Course deleted successfully"}
 
-import traceback
-
 @app.get("/courses/my-learners", response_model=List[dict])
 def get_my_learners(current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     try:
@@ -566,31 +690,21 @@ def get_my_learners(current_user: dict = Depends(auth.get_current_user), db: Ses
         
         instructor_id = current_user["id"]
         
-        # Courses owned by this instructor
-        my_courses = db.query(models.Course).filter(models.Course.instructor_id == instructor_id).all()
-        my_course_ids = [c.id for c in my_courses]
-        
-        # Find all enrollments for these courses
-        relevant_enrolments = db.query(models.Enrolment).filter(models.Enrolment.course_id.in_(my_course_ids)).all()
+        # Enrolments in this instructor's courses with learner, course title and
+        # precomputed progress, all in one query
+        rows = db.query(models.Enrolment, models.User, models.Course.title, models.CourseProgress).join(
+            models.User, models.User.id == models.Enrolment.user_id
+        ).join(
+            models.Course, models.Course.id == models.Enrolment.course_id
+        ).outerjoin(
+            models.CourseProgress,
+            (models.CourseProgress.user_id == models.Enrolment.user_id) & (models.CourseProgress.course_id == models.Enrolment.course_id)
+        ).filter(models.Course.instructor_id == instructor_id).all()
         
         # Group by student and calculate progress
         student_map = {}
-        for e in relevant_enrolments:
-            student = e.user
-            course = e.course
-            
-            if not student or not course:
-                continue
-                
-            # Get total modules in this course to calculate progress for this specific course/student pair
-            total_modules = len(course.modules)
-            course_progress = 0
-            if total_modules > 0:
-                completed_modules = db.query(models.QuizResult.module_id).filter(
-                    models.QuizResult.user_id == student.id,
-                    models.QuizResult.module_id.in_([m.id for m in course.modules])
-                ).distinct().count()
-                course_progress = int((completed_modules / total_modules) * 100)
+        for e, student, course_title, progress_row in rows:
+            course_progress = progress_row.progress if progress_row else 0
 
             # Create student entry if it doesn't exist
             if student.id not in student_map:
@@ -610,7 +724,7 @@ def get_my_learners(current_user: dict = Depends(auth.get_current_user), db: Ses
                 }
             
             student_data = student_map[student.id]
-            student_data["courses"].append(course.title)
+            student_data["courses"].append(course_title)
             student_data["progress_total"] += course_progress
             student_data["course_count"] += 1
             if course_progress == 100 and "Legend" not in student_data["badges"]:
@@ -631,25 +745,83 @@ def get_my_learners(current_user: dict = Depends(auth.get_current_user), db: Ses
         
         return result
     except Exception as e:
-        print("ERROR in get_my_learners:")
-        traceback.print_exc()
+        logger.exception("ERROR in get_my_learners")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _course_detail(course: models.Course, include_answers: bool):
+    return {
+        "id": course.id,
+        "_id": course.id,
+        "title": course.title,
+        "description": course.description,
+        "thumbnail": course.thumbnail,
+        "price": course.price,
+        "status": course.status,
+        "instructor_id": course.instructor_id,
+        "enrolledCount": course.enrolment_count or 0,
+        "instructor": {
+            "id": course.instructor.id if course.instructor else None,
+            "name": course.instructor.name if course.instructor else "Unknown",
+            "email": course.instructor.email if course.instructor else ""
+        },
+        "modules": [
+            {
+                "id": m.id,
+                "title": m.title,
+                "contentLink": m.contentLink,
+                "quiz": [
+                    {
+                        "id": q.id,
+                        "questionText": q.questionText,
+                        "questionType": q.questionType,
+                        "options": [{"text": o.text} for o in q.options]
+                        # Removed correctOptionIndex for learner security
+                    } for q in m.quiz
+                ]
+            } for m in course.modules
+        ],
+        "assessment": [
+            {
+                "id": q.id,
+                "questionText": q.questionText,
+                "questionType": q.questionType,
+                "options": [{"text": o.text} for o in q.options],
+                # Only instructor sees answers and difficulty in course view
+                **({
+                    "correctOptionIndex": q.correctOptionIndex,
+                    "correctAnswerText": q.correctAnswerText,
+                    "difficulty": q.difficulty
+                } if include_answers else {})
+            } for q in course.assessment
+        ]
+    }
+
 @app.get("/courses/{course_id}")
-def get_course(course_id: int, current_user_opt: Optional[dict] = Depends(auth.get_current_user_optional), db: Session = Depends(database.get_db)):
+def get_course(course_id: int, request: Request, current_user_opt: Optional[dict] = Depends(auth.get_current_user_optional), db: Session = Depends(database.get_db)):
     try:
-        course = db.query(models.Course).filter(models.Course.id == course_id).first()
-        if not course:
-            raise HTTPException(status_code=404, detail="Course not found")
-        
+        tags = (cache.course_tag(course_id),)
+
+        # Status and owner are all the access checks need, so they are cached on their own
+        meta_entry = cache.response_cache.get("course-meta", str(course_id), tags)
+        if meta_entry is None:
+            course = db.query(models.Course).filter(models.Course.id == course_id).first()
+            if not course:
+                raise HTTPException(status_code=404, detail="Course not found")
+            meta_entry = cache.response_cache.set("course-meta", str(course_id), tags, {
+                "status": course.status,
+                "instructor_id": course.instructor_id
+            })
+        meta = json.loads(meta_entry.body)
+
+        is_owner = bool(current_user_opt and current_user_opt.get("role") == "instructor" and meta["instructor_id"] == current_user_opt.get("id"))
+        is_learner = bool(current_user_opt and current_user_opt.get("role") == "learner")
+
         # Security: If not published and user is not the instructor, deny access
-        if course.status != "Published":
-            is_instructor = current_user_opt and current_user_opt.get("role") == "instructor" and course.instructor_id == current_user_opt.get("id")
-            if not is_instructor:
-                raise HTTPException(status_code=403, detail="This course is currently not available (Draft/Archived)")
+        if meta["status"] != "Published" and not is_owner:
+            raise HTTPException(status_code=403, detail="This course is currently not available (Draft/Archived)")
         
         # Batch Timing Check for Learners
-        if current_user_opt and current_user_opt.get("role") == "learner":
+        if is_learner:
             user_id = current_user_opt.get("id")
             # Find if user is in any batch for this specific course
             batch = db.query(models.Batch).join(models.Batch.students).filter(
@@ -669,66 +841,40 @@ def get_course(course_id: int, current_user_opt: Optional[dict] = Depends(auth.g
                         status_code=403, 
                         detail=f"Your batch access ended at {batch.end_time.strftime('%Y-%m-%d %H:%M:%S')} UTC"
                     )
-        
-        return {
-            "id": course.id,
-            "_id": course.id,
-            "title": course.title,
-            "description": course.description,
-            "thumbnail": course.thumbnail,
-            "price": course.price,
-            "status": course.status,
-            "instructor_id": course.instructor_id,
-            "enrolledStudents": [e.user_id for e in course.enrolments],
-            "instructor": {
-                "id": course.instructor.id if course.instructor else None,
-                "name": course.instructor.name if course.instructor else "Unknown",
-                "email": course.instructor.email if course.instructor else ""
-            },
-                "modules": [
-                    {
-                        "id": m.id,
-                        "title": m.title,
-                        "contentLink": m.contentLink,
-                        "quiz": [
-                            {
-                                "id": q.id,
-                                "questionText": q.questionText,
-                                "questionType": q.questionType,
-                                "options": [{"text": o.text} for o in q.options]
-                                # Removed correctOptionIndex for learner security
-                            } for q in m.quiz
-                        ]
-                    } for m in course.modules
-                ],
-                "assessment": [
-                    {
-                        "id": q.id,
-                        "questionText": q.questionText,
-                        "questionType": q.questionType,
-                        "options": [{"text": o.text} for o in q.options],
-                        # Only instructor sees answers and difficulty in course view
-                        **({
-                            "correctOptionIndex": q.correctOptionIndex,
-                            "correctAnswerText": q.correctAnswerText,
-                            "difficulty": q.difficulty
-                        } if (current_user_opt and current_user_opt.get("role") == "instructor" and course.instructor_id == current_user_opt.get("id")) else {})
-                    } for q in course.assessment
-                ],
-                "isAssessmentCompleted": db.query(models.QuizResult).filter(
-                    models.QuizResult.user_id == current_user_opt.get("id"),
-                    models.QuizResult.course_id == course_id
-                ).first() is not None if (current_user_opt and current_user_opt.get("role") == "learner") else False,
-                "hasCertificate": db.query(models.Certificate).filter(
-                    models.Certificate.user_id == current_user_opt.get("id"),
-                    models.Certificate.course_id == course_id
-                ).first() is not None if (current_user_opt and current_user_opt.get("role") == "learner") else False
+
+        # The course body is the same for every viewer (the owner also gets the answer keys)
+        variant = "owner" if is_owner else "public"
+        entry = cache.response_cache.get("course", f"{course_id}:{variant}", tags)
+        if entry is None:
+            # The whole tree in one query per level instead of one per module / question
+            course = db.query(models.Course).options(
+                joinedload(models.Course.instructor),
+                selectinload(models.Course.modules).selectinload(models.Module.quiz).selectinload(models.Question.options),
+                selectinload(models.Course.assessment).selectinload(models.Question.options)
+            ).filter(models.Course.id == course_id).first()
+            if not course:
+                raise HTTPException(status_code=404, detail="Course not found")
+            entry = cache.response_cache.set("course", f"{course_id}:{variant}", tags, _course_detail(course, include_answers=is_owner))
+
+        flags = {
+            "isEnrolled": db.query(models.Enrolment.id).filter(
+                models.Enrolment.user_id == current_user_opt.get("id"),
+                models.Enrolment.course_id == course_id
+            ).first() is not None if is_learner else False,
+            "isAssessmentCompleted": db.query(models.QuizResult).filter(
+                models.QuizResult.user_id == current_user_opt.get("id"),
+                models.QuizResult.course_id == course_id
+            ).first() is not None if is_learner else False,
+            "hasCertificate": db.query(models.Certificate).filter(
+                models.Certificate.user_id == current_user_opt.get("id"),
+                models.Certificate.course_id == course_id
+            ).first() is not None if is_learner else False
         }
+        return cache.json_response(request, cache.extend_entry(entry, flags))
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        with open("backend_errors.log", "a") as f:
-            f.write(f"\nError in get_course({course_id}):\n")
-            f.write(traceback.format_exc())
+        logger.exception("Error in get_course(%s)", course_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/courses/{course_id}/enroll")
@@ -738,24 +884,90 @@ def enroll_in_course(course_id: int, current_user: dict = Depends(auth.get_curre
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    # Check if already enrolled
-    existing_enrolment = db.query(models.Enrolment).filter(
-        models.Enrolment.user_id == current_user["id"],
-        models.Enrolment.course_id == course_id
-    ).first()
-    
-    if existing_enrolment:
+    # INSERT ... ON CONFLICT DO NOTHING: concurrent clicks cannot enrol twice
+    if not enrolments.enrol(db, current_user["id"], course_id):
+        db.rollback()
         return {"message": "Already enrolled"}
-    
-    new_enrolment = models.Enrolment(
-        user_id=current_user["id"],
-        course_id=course_id
-    )
-    db.add(new_enrolment)
     db.commit()
+    # enrolledCount is part of the cached catalogue and course payloads
+    cache.response_cache.invalidate("catalogue", cache.course_tag(course_id))
     
     return {"message": "Enrolled successfully"}
 
+@app.post("/courses/{course_id}/enrolments/bulk", response_model=schemas.BulkEnrolmentResult)
+def bulk_enrol(course_id: int, request: schemas.BulkEnrolmentRequest, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    if current_user["role"] != "instructor":
+        raise HTTPException(status_code=403, detail="Only instructors can enrol cohorts")
+
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if course.instructor_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if len(request.user_ids) + len(request.emails) > enrolments.MAX_BULK:
+        raise HTTPException(status_code=400, detail=f"At most {enrolments.MAX_BULK} users can be enrolled per request")
+
+    # The whole cohort is enrolled in one transaction
+    rows = enrolments.enrol_many(db, course_id, request.user_ids, request.emails)
+    db.commit()
+
+    statuses = [row["status"] for row in rows]
+    enrolled = statuses.count(enrolments.ENROLLED)
+    if enrolled:
+        cache.response_cache.invalidate("catalogue", cache.course_tag(course_id))
+
+    already = statuses.count(enrolments.ALREADY_ENROLLED)
+    # Repeats of a row that was already handled are not failures
+    duplicates = statuses.count(enrolments.DUPLICATE)
+    return {
+        "enrolled": enrolled,
+        "already_enrolled": already,
+        "duplicates": duplicates,
+        "failed": len(rows) - enrolled - already - duplicates,
+        "results": rows
+    }
+
+@app.get("/courses/{course_id}/students", response_model=schemas.RosterPage)
+def get_course_roster(course_id: int, after: Optional[int] = None, limit: int = 50, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    if current_user["role"] != "instructor":
+        raise HTTPException(status_code=403, detail="Only instructors can view course rosters")
+
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if course.instructor_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    limit = max(1, min(limit, 500))
+
+    # Keyset pagination on enrolment id, so deep pages cost the same as the first one
+    query = db.query(models.Enrolment, models.User).join(
+        models.User, models.User.id == models.Enrolment.user_id
+    ).filter(models.Enrolment.course_id == course_id)
+    if after is not None:
+        query = query.filter(models.Enrolment.id > after)
+    rows = query.order_by(models.Enrolment.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "students": [
+            {
+                "enrolment_id": e.id,
+                "id": u.id,
+                "name": u.name,
+                "email": u.email,
+                "enrolled_at": e.enrolled_at,
+                "accessibility_enabled": e.accessibility_enabled
+            } for e, u in rows
+        ],
+        "total": course.enrolment_count or 0,
+        "next_after": rows[-1][0].id if has_more else None
+    }
+
 @app.put("/api/instructor/enrolments/{enrolment_id}/accessibility")
 def update_accessibility_status(enrolment_id: int, update: schemas.EnrolmentAccessibilityUpdate, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     if current_user["role"] != "instructor":
@@ -773,6 +985,37 @@ def update_accessibility_status(enrolment_id: int, update: schemas.EnrolmentAcce
     db.commit()
     return {"message": "Accessibility status updated", "accessibility_enabled": enrolment.accessibility_enabled}
 
+@app.get("/courses/{course_id}/item-stats", response_model=List[schemas.QuestionStatResponse])
+def get_item_stats(course_id: int, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    """Item analysis written by analyse_items.py: easiness, discrimination and distractor counts per question."""
+    if current_user["role"] != "instructor":
+        raise HTTPException(status_code=403, detail="Only instructors can view item statistics")
+
+    course = db.query(models.Course).filter(models.Course.id == course_id).first()
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    if course.instructor_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    rows = db.query(models.QuestionStat, models.Question.questionText, models.Question.difficulty).join(
+        models.Question, models.Question.id == models.QuestionStat.question_id
+    ).filter(models.QuestionStat.course_id == course_id).order_by(models.QuestionStat.question_id).all()
+    return [
+        {
+            "question_id": stat.question_id,
+            "questionText": text,
+            "module_id": stat.module_id,
+            "difficulty": difficulty,
+            "responses": stat.responses,
+            "p_value": stat.p_value,
+            "discrimination": stat.discrimination,
+            "option_counts": stat.option_counts,
+            "invalid_answers": stat.invalid_answers,
+            "analysed_at": stat.analysed_at,
+        } for stat, text, difficulty in rows
+    ]
+
 @app.get("/api/learner/courses/{course_id}/accessibility")
 def get_learner_accessibility_status(course_id: int, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     enrolment = db.query(models.Enrolment).filter(
@@ -785,150 +1028,88 @@ def get_learner_accessibility_status(course_id: int, current_user: dict = Depend
     
     return {"accessibility_enabled": enrolment.accessibility_enabled}
 
+def _module_quiz_response(answer_key, result_id, user_id, module_id, answers, completed_at):
+    total_questions = len(answer_key)
+    correct_count = answer_key.grade(answers)
+    return {
+        "id": result_id,
+        "user_id": user_id,
+        "module_id": module_id,
+        "score": correct_count,
+        "total_questions": total_questions,
+        "completed_at": completed_at,
+        "percentage": int((correct_count / total_questions * 100)) if total_questions > 0 else 0,
+        "correctCount": correct_count,
+        "totalQuestions": total_questions,
+        "review": answer_key.review_for(),
+        "userAnswers": answers
+    }
+
 @app.post("/modules/{module_id}/quiz/submit", response_model=schemas.QuizResultResponse)
-def submit_quiz_result(module_id: int, result: schemas.QuizResultCreate, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def submit_quiz_result(module_id: int, result: schemas.QuizResultCreate, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     try:
-        module = db.query(models.Module).filter(models.Module.id == module_id).first()
-        if not module:
+        answer_key = answer_keys.for_module(db, module_id)
+        if answer_key is None:
             raise HTTPException(status_code=404, detail="Module not found")
         
-        correct_count = 0
-        total_questions = len(module.quiz)
-        
-        if result.answers is not None:
-            # Align with the order in CoursePage.jsx (indices 0..N)
-            for i, q in enumerate(module.quiz):
-                if i >= len(result.answers):
-                    break
-                
-                user_answer = result.answers[i]
-                if q.questionType == 'mcq' or (q.options and len(q.options) > 0):
-                    try:
-                        if int(user_answer) == q.correctOptionIndex:
-                            correct_count += 1
-                    except (ValueError, TypeError):
-                        pass
-                else: # descriptive
-                    if str(user_answer).strip().lower() == (q.correctAnswerText or "").strip().lower():
-                        correct_count += 1
-        
-        percentage = int((correct_count / total_questions * 100)) if total_questions > 0 else 0
-
-        # Check if user already submitted a result for this module
-        existing_result = db.query(models.QuizResult).filter(
-            models.QuizResult.user_id == current_user["id"],
-            models.QuizResult.module_id == module_id
-        ).first()
-        
-        if existing_result:
-            # Update existing result instead of failing
-            existing_result.score = correct_count
-            existing_result.total_questions = total_questions
-            existing_result.answers = result.answers
-            existing_result.completed_at = datetime.utcnow()
-            db.commit()
-            db.refresh(existing_result)
-            new_result = existing_result
-        else:
-            new_result = models.QuizResult(
-                user_id=current_user["id"],
-                module_id=module_id,
-                score=correct_count,
-                total_questions=total_questions,
-                answers=result.answers
-            )
-            db.add(new_result)
-            db.commit()
-            db.refresh(new_result)
-
-        # Check for course completion and award badge
-        course = module.course
-        if course:
-            total_modules = len(course.modules)
-            completed_modules = db.query(models.QuizResult.module_id).filter(
+        # Answers align with the order in CoursePage.jsx (indices 0..N)
+        total_questions = len(answer_key)
+        correct_count = answer_key.grade(result.answers)
+        completed_at = datetime.utcnow()
+
+        # One row per learner and module: a single upsert on uq_quiz_results_user_module,
+        # so concurrent re-submissions cannot create duplicates
+        table = models.QuizResult.__table__
+        stmt = database.dialect_insert(table).values(
+            user_id=current_user["id"],
+            module_id=module_id,
+            score=correct_count,
+            total_questions=total_questions,
+            answers=result.answers,
+            completed_at=completed_at,
+            attempt=1,
+            submission_key=idempotency_key
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "module_id"],
+            set_={c: stmt.excluded[c] for c in ("score", "total_questions", "answers", "completed_at", "submission_key")},
+            # A retry carrying the key that already wrote the row leaves it untouched
+            where=table.c.submission_key.is_distinct_from(stmt.excluded.submission_key) if idempotency_key else None
+        ).returning(table.c.id)
+        result_id = db.execute(stmt).scalar()
+
+        if result_id is None:
+            # Duplicate delivery of the same submission: answer with what it stored
+            db.rollback()
+            stored = db.query(models.QuizResult).filter(
                 models.QuizResult.user_id == current_user["id"],
-                models.QuizResult.module_id.in_([m.id for m in course.modules])
-            ).distinct().count()
-
-            if total_modules > 0 and completed_modules == total_modules:
-                # Award Badge
-                badge_name = f"{course.title} Graduate"
-                badge = db.query(models.Badge).filter(models.Badge.name == badge_name).first()
-                if not badge:
-                    badge = models.Badge(name=badge_name, description=f"Completed {course.title}", icon="Award")
-                    db.add(badge)
-                    db.flush()
-                
-                # Use scalar ID from current_user
-                user_id = current_user["id"]
-                user_obj = db.query(models.User).get(user_id)
-                
-                if badge not in user_obj.badges:
-                    user_obj.badges.append(badge)
-                    notif = models.Notification(user_id=user_id, title="Badge Earned!", message=f"Earned '{badge_name}'", type="success")
-                    db.add(notif)
-                
-                # Batch logic
-                quiz_results = db.query(models.QuizResult).filter(
-                    models.QuizResult.user_id == user_id,
-                    models.QuizResult.module_id.in_([m.id for m in course.modules])
-                ).all()
-                
-                t_score = 0
-                t_count = 0
-                for qr in quiz_results:
-                    if qr.total_questions and qr.total_questions > 0:
-                        t_score += (qr.score / qr.total_questions) * 100
-                        t_count += 1
-                
-                if t_count > 0:
-                    avg = t_score / t_count
-                    b_name = "Bronze"
-                    if avg >= 90: b_name = "Diamond"
-                    elif avg >= 80: b_name = "Gold"
-                    elif avg >= 70: b_name = "Silver"
-                    
-                    batch = db.query(models.Batch).filter(models.Batch.course_id == course.id, models.Batch.name == b_name).first()
-                    if not batch:
-                        batch = models.Batch(name=b_name, course_id=course.id, instructor_id=course.instructor_id)
-                        db.add(batch)
-                        db.flush()
-                    
-                    if user_obj not in batch.students:
-                        batch.students.append(user_obj)
-                        notif2 = models.Notification(user_id=user_id, title="Batch Assigned!", message=f"Assigned to {b_name} batch", type="info")
-                        db.add(notif2)
-                
-                db.commit()
+                models.QuizResult.module_id == module_id
+            ).one()
+            return _module_quiz_response(answer_key, stored.id, stored.user_id, module_id, stored.answers, stored.completed_at)
+
+        responses.record(db, result_id, current_user["id"], answer_key, range(len(answer_key)), result.answers, completed_at)
+
+        # Progress and the reward job commit in the same transaction as the result.
+        # Badges, tier batches and notifications are awarded by the job worker afterwards.
+        if answer_key.course_id:
+            course_progress = progress.refresh(db, current_user["id"], answer_key.course_id)
+            if course_progress.total_modules > 0 and course_progress.completed_modules == course_progress.total_modules:
+                jobs.enqueue(
+                    db, "award_course_completion",
+                    {"user_id": current_user["id"], "course_id": answer_key.course_id},
+                    # Re-evaluated when the scores change (tier may move), deduped otherwise
+                    idempotency_key=f"course-completion:{current_user['id']}:{answer_key.course_id}:{course_progress.module_score_sum:.0f}"
+                )
 
-        return {
-            "id": new_result.id,
-            "user_id": new_result.user_id,
-            "module_id": new_result.module_id,
-            "score": new_result.score,
-            "total_questions": new_result.total_questions,
-            "completed_at": new_result.completed_at,
-            "percentage": percentage,
-            "correctCount": correct_count,
-            "totalQuestions": total_questions,
-            "review": [
-                {
-                    "id": q.id,
-                    "questionText": q.questionText,
-                    "questionType": q.questionType,
-                    "options": [{"text": o.text} for o in q.options],
-                    "correctOptionIndex": q.correctOptionIndex,
-                    "correctAnswerText": q.correctAnswerText
-                } for q in module.quiz
-            ],
-            "userAnswers": result.answers
-        }
+        response = _module_quiz_response(answer_key, result_id, current_user["id"], module_id, result.answers, completed_at)
+        db.commit()
+        jobs.notify()
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
-        import traceback
-        with open("quiz_submit_error.log", "a") as f:
-            f.write(f"\n--- {datetime.now()} ---\n")
-            f.write(traceback.format_exc())
+        logger.exception("Error submitting quiz for module %s", module_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/quizzes/{course_id}")
@@ -940,13 +1121,9 @@ def get_quiz_questions(course_id: int, current_user: dict = Depends(auth.get_cur
     ).first()
     
     if existing_result:
-        # Fetch questions based on stored IDs if available, otherwise course questions
-        if existing_result.question_ids:
-            questions = db.query(models.Question).filter(models.Question.id.in_(existing_result.question_ids)).all()
-            q_map = {q.id: q for q in questions}
-            sorted_review_questions = [q_map[qid] for qid in existing_result.question_ids if qid in q_map]
-        else:
-            sorted_review_questions = db.query(models.Question).filter(models.Question.course_id == course_id).all()
+        # Review questions based on stored IDs if available, otherwise course questions
+        answer_key = answer_keys.for_course(db, course_id)
+        positions = answer_key.positions_for(existing_result.question_ids) if existing_result.question_ids else None
         
         # Return result and detailed review
         return {
@@ -957,16 +1134,7 @@ def get_quiz_questions(course_id: int, current_user: dict = Depends(auth.get_cur
             "userAnswers": existing_result.answers,
             "completed_at": existing_result.completed_at,
             "certificate": db.query(models.Certificate).filter(models.Certificate.user_id == current_user["id"], models.Certificate.course_id == course_id).first() is not None,
-            "review": [
-                {
-                    "id": q.id,
-                    "questionText": q.questionText,
-                    "questionType": q.questionType,
-                    "options": [{"text": o.text} for o in q.options],
-                    "correctOptionIndex": q.correctOptionIndex,
-                    "correctAnswerText": q.correctAnswerText
-                } for q in sorted_review_questions
-            ]
+            "review": answer_key.review_for(positions)
         }
 
     # Check enrollment
@@ -977,19 +1145,8 @@ def get_quiz_questions(course_id: int, current_user: dict = Depends(auth.get_cur
     if not enrollment:
         raise HTTPException(status_code=403, detail="You must be enrolled in the course to access the assessment.")
     
-    questions = db.query(models.Question).filter(models.Question.course_id == course_id).all()
-    
-    return {
-        "questions": [
-            {
-                "id": q.id,
-                "questionText": q.questionText,
-                "questionType": q.questionType,
-                "options": [{"text": o.text} for o in q.options],
-                # Do not return correct answers to the student!
-            } for q in questions
-        ]
-    }
+    # The answer key's question payload never includes the correct answers
+    return {"questions": list(answer_keys.for_course(db, course_id).questions)}
 
 @app.post("/quizzes/{course_id}/adaptive/start")
 def start_adaptive_quiz(course_id: int, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
@@ -1000,13 +1157,9 @@ def start_adaptive_quiz(course_id: int, current_user: dict = Depends(auth.get_cu
     ).first()
     
     if existing_result:
-        # Fetch questions based on stored IDs if available
-        if existing_result.question_ids:
-            questions = db.query(models.Question).filter(models.Question.id.in_(existing_result.question_ids)).all()
-            q_map = {q.id: q for q in questions}
-            sorted_review_questions = [q_map[qid] for qid in existing_result.question_ids if qid in q_map]
-        else:
-            sorted_review_questions = db.query(models.Question).filter(models.Question.course_id == course_id).all()
+        # Review questions based on stored IDs if available
+        answer_key = answer_keys.for_course(db, course_id)
+        positions = answer_key.positions_for(existing_result.question_ids) if existing_result.question_ids else None
 
         return {
             "completed": True,
@@ -1015,16 +1168,7 @@ def start_adaptive_quiz(course_id: int, current_user: dict = Depends(auth.get_cu
             "percentage": int((existing_result.score / existing_result.total_questions * 100) if existing_result.total_questions > 0 else 0),
             "userAnswers": existing_result.answers,
             "certificate": db.query(models.Certificate).filter(models.Certificate.user_id == current_user["id"], models.Certificate.course_id == course_id).first() is not None,
-            "review": [
-                {
-                    "id": q.id,
-                    "questionText": q.questionText,
-                    "questionType": q.questionType,
-                    "options": [{"text": o.text} for o in q.options],
-                    "correctOptionIndex": q.correctOptionIndex,
-                    "correctAnswerText": q.correctAnswerText
-                } for q in sorted_review_questions
-            ]
+            "review": answer_key.review_for(positions)
         }
 
     # Check enrollment
@@ -1035,15 +1179,11 @@ def start_adaptive_quiz(course_id: int, current_user: dict = Depends(auth.get_cu
     if not enrollment:
          raise HTTPException(status_code=403, detail="Not enrolled")
 
-    # Start with a medium question
-    question = db.query(models.Question).filter(
-        models.Question.course_id == course_id,
-        models.Question.difficulty == "medium"
-    ).first()
-
-    if not question:
-        # Try fallback to any question in DB
-        question = db.query(models.Question).filter(models.Question.course_id == course_id).first()
+    # Start with one of the most informative questions at average ability (each learner gets their own)
+    bank = adaptive.bank_for(db, course_id)
+    rng = adaptive.rng_for(current_user["id"], course_id, 0)
+    position = bank.pick_informative(0.0, 0, rng)
+    question = bank.question(position) if position is not None else None
 
     # If STILL no question, generate one via AI
     if not question:
@@ -1066,70 +1206,72 @@ def start_adaptive_quiz(course_id: int, current_user: dict = Depends(auth.get_cu
                     for opt in ai_q_data["options"]:
                         db.add(models.QuestionOption(text=opt["text"], question_id=new_q.id))
                 
+                answer_keys.bump_version(db, course_id)
                 db.commit()
-                question = new_q
-                print(f"AI Generated First Medium Question: {question.id}")
+                cache.response_cache.invalidate(cache.questions_tag(course_id))
+                bank = adaptive.bank_for(db, course_id)
+                question = bank.question(bank.key.position[new_q.id])
+                logger.info("AI Generated First Medium Question: %s", new_q.id)
 
     if not question:
         raise HTTPException(status_code=404, detail="No questions found and AI generation failed.")
 
-    return {
-        "question": {
-            "id": question.id,
-            "questionText": question.questionText,
-            "questionType": question.questionType,
-            "difficulty": question.difficulty,
-            "options": [{"text": o.text} for o in question.options]
-        }
-    }
+    session = quiz_sessions.store.create(current_user["id"], course_id, question)
+    return {"session_id": session.session_id, "question": question}
+
+def _adaptive_session(session_id: str, course_id: int, current_user: dict):
+    session = quiz_sessions.store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Adaptive session not found or expired. Start the assessment again.")
+    if session.user_id != current_user["id"] or session.course_id != course_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return session
 
 @app.post("/quizzes/{course_id}/adaptive/next")
 def next_adaptive_question(course_id: int, request: schemas.AdaptiveNextRequest, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    # 1. Identify the last question answered (the last ID in answered_ids)
-    if not request.answered_ids:
-        raise HTTPException(status_code=400, detail="answered_ids cannot be empty")
-    
-    last_q_id = request.answered_ids[-1]
-    last_q = db.query(models.Question).filter(models.Question.id == last_q_id).first()
-    if not last_q:
-        raise HTTPException(status_code=404, detail="Last question not found")
-
-    # 2. Evaluate if the last answer was correct
-    is_correct = False
-    if last_q.questionType == "mcq":
-        try:
-            is_correct = int(request.last_answer) == last_q.correctOptionIndex
-        except (ValueError, TypeError):
-            is_correct = False
-    else:
-        is_correct = str(request.last_answer).strip().lower() == (last_q.correctAnswerText or "").strip().lower()
-
-    # 3. Determine next difficulty
-    diff_map = {"easy": 1, "medium": 2, "hard": 3}
-    rev_diff_map = {1: "easy", 2: "medium", 3: "hard"}
-    
-    curr_level = diff_map.get(request.last_difficulty, 2)
-    if is_correct:
-        next_level = min(curr_level + 1, 3)
-    else:
-        next_level = max(curr_level - 1, 1)
-    
-    target_diff = rev_diff_map[next_level]
-    
-    # 4. Find next question in database with target difficulty
-    question = db.query(models.Question).filter(
-        models.Question.course_id == course_id,
-        models.Question.difficulty == target_diff,
-        ~models.Question.id.in_(request.answered_ids)
-    ).first()
-    
-    # 5. If not in DB, try AI Generation for this specific difficulty
+    # The session is read, checked and written back as one step; a concurrent request for it is turned away
+    try:
+        with quiz_sessions.store.step(request.session_id):
+            return _next_adaptive_step(course_id, request, current_user, db)
+    except quiz_sessions.SessionBusy:
+        raise HTTPException(status_code=409, detail="This question is already being answered.")
+
+def _next_adaptive_step(course_id: int, request: schemas.AdaptiveNextRequest, current_user: dict, db: Session):
+    # 1. Load the server-side session (answered items, ability estimate)
+    session = _adaptive_session(request.session_id, course_id, current_user)
+    if session.finished:
+        return {"finished": True}
+    if request.question_id != session.current_id:
+        raise HTTPException(status_code=409, detail="This question has already been answered.")
+
+    # 2. Evaluate the answer to the current question and update the IRT ability estimate
+    bank = adaptive.bank_for(db, course_id)
+    answer_key = bank.key
+    last_q_id = session.current_id
+    is_correct = answer_key.is_correct(last_q_id, request.answer)
+    session.record(bank, request.answer, is_correct)
+
+    # 3. Stop as soon as the ability is measured precisely enough
+    if session.converged:
+        session.current_id = None
+        quiz_sessions.store.save(session)
+        return {"finished": True, "ability": session.ability, "standardError": session.standard_error}
+
+    target_diff = session.difficulty
+    
+    # 4. Pick the most informative unanswered question for the current ability
+    rng = adaptive.rng_for(current_user["id"], course_id, len(session.question_ids))
+    position = bank.pick_informative(session.ability, session.bits_for(bank), rng)
+    question = bank.question(position) if position is not None else None
+    
+    # 5. Bank used up: try AI Generation at the difficulty matching the ability
     if not question:
         course = db.query(models.Course).get(course_id)
         if course:
             topic = course.title
             context = course.description
-            q_type = last_q.questionType if last_q else "mcq"
+            last_position = answer_key.position.get(last_q_id)
+            q_type = (answer_key.review[last_position]["questionType"] if last_position is not None else None) or "mcq"
             
             ai_q_data = rag.generate_single_adaptive_question(topic, target_diff, q_type, context)
             
@@ -1150,119 +1292,114 @@ def next_adaptive_question(course_id: int, request: schemas.AdaptiveNextRequest,
                     for opt in ai_q_data["options"]:
                         db.add(models.QuestionOption(text=opt["text"], question_id=new_q.id))
                 
+                answer_keys.bump_version(db, course_id)
                 db.commit()
-                question = new_q
-                print(f"AI Generated New {target_diff.upper()} Question: {question.id}")
+                cache.response_cache.invalidate(cache.questions_tag(course_id))
+                bank = adaptive.bank_for(db, course_id)
+                question = bank.question(bank.key.position[new_q.id])
+                logger.info("AI Generated New %s Question: %s", target_diff.upper(), new_q.id)
 
-    # 6. Final fallback: Any remaining question in DB
-    if not question:
-        question = db.query(models.Question).filter(
-            models.Question.course_id == course_id,
-            ~models.Question.id.in_(request.answered_ids)
-        ).first()
+    session.current_id = question["id"] if question else None
+    quiz_sessions.store.save(session)
         
     if not question:
-        return {"finished": True}
+        return {"finished": True, "ability": session.ability, "standardError": session.standard_error}
 
+    return {"finished": False, "question": question}
+
+def _final_assessment_response(score, total):
+    percentage = (score / total * 100) if total > 0 else 0
+    passed = percentage >= 50
     return {
-        "finished": False,
-        "question": {
-            "id": question.id,
-            "questionText": question.questionText,
-            "questionType": question.questionType,
-            "difficulty": question.difficulty,
-            "options": [{"text": o.text} for o in question.options]
-        }
+        "score": score,
+        "totalQuestions": total,
+        "percentage": int(percentage),
+        # The badge and certificate are issued by the job worker; these say the attempt earns them
+        "badgeEligible": passed,
+        "certificate": passed,
+        "rewardsPending": passed
     }
 
+def _replayed_final_assessment(db: Session, course_id: int, user_id: int, idempotency_key: Optional[str]):
+    """The stored response of an earlier submission made with the same Idempotency-Key, if any."""
+    if not idempotency_key:
+        return None
+    stored = db.query(models.QuizResult).filter(
+        models.QuizResult.user_id == user_id,
+        models.QuizResult.course_id == course_id,
+        models.QuizResult.submission_key == idempotency_key
+    ).first()
+    if stored is None:
+        return None
+    return _final_assessment_response(stored.score, stored.total_questions)
+
 @app.post("/quizzes/{course_id}/submit")
-def submit_course_quiz(course_id: int, request: schemas.QuizSubmitRequest, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def submit_course_quiz(course_id: int, request: schemas.QuizSubmitRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"), current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    answer_key = answer_keys.for_course(db, course_id)
     if request.is_adaptive:
-        questions = db.query(models.Question).filter(models.Question.id.in_(request.question_ids)).all()
-        # Sort questions to match the order of answer ids provided
-        id_to_q = {q.id: q for q in questions}
-        sorted_questions = [id_to_q[qid] for qid in request.question_ids if qid in id_to_q]
+        # Graded from what the session recorded, never from client-supplied ids
+        if not request.session_id:
+            raise HTTPException(status_code=400, detail="session_id is required for adaptive submissions")
+        try:
+            session = _adaptive_session(request.session_id, course_id, current_user)
+        except HTTPException as e:
+            # The session is deleted once its result is stored; a retry gets the stored result
+            replayed = _replayed_final_assessment(db, course_id, current_user["id"], idempotency_key) if e.status_code == 404 else None
+            if replayed is None:
+                raise
+            return replayed
+        # Questions removed from the course since they were answered are not counted
+        kept = [(qid, a) for qid, a in zip(session.question_ids, session.answers) if qid in answer_key.position]
+        question_ids = [qid for qid, _ in kept]
+        answers = [a for _, a in kept]
+        positions = answer_key.positions_for(question_ids)
     else:
-        sorted_questions = db.query(models.Question).filter(models.Question.course_id == course_id).all()
-
-    score = 0
-    total = len(sorted_questions)
-    
-    for i, q in enumerate(sorted_questions):
-        if i >= len(request.answers): break
-        user_answer = request.answers[i]
-        
-        if q.questionType == "mcq":
-            if user_answer is not None and int(user_answer) == q.correctOptionIndex:
-                score += 1
-        else: # descriptive
-            if str(user_answer).strip().lower() == (q.correctAnswerText or "").strip().lower():
-                score += 1
-                
-    percentage = (score / total * 100) if total > 0 else 0
-    
-    # Save results (using module_id=None or create a separate table for final assessment results)
-    # The models currently only have QuizResult with module_id.
-    # We'll use module_id=None if allowed or just save it.
-    # Looking at models.py, QuizResult has module_id = Column(Integer, ForeignKey("modules.id"))
-    # it doesn't say nullable=False, so let's hope it works.
-    
-    # Check if already submitted
-    existing_result = db.query(models.QuizResult).filter(
-        models.QuizResult.user_id == current_user["id"],
-        models.QuizResult.course_id == course_id
-    ).first()
-    if existing_result:
-        raise HTTPException(status_code=400, detail="You have already completed the final assessment for this course.")
-
-    res = models.QuizResult(
-        user_id = current_user["id"],
-        course_id = course_id,
-        score = score, # score is already raw count here
-        total_questions = total,
-        answers = request.answers,
-        question_ids = request.question_ids if request.is_adaptive else [q.id for q in sorted_questions]
-    )
-    db.add(res)
-    db.commit()
-    
-    badge_awarded = False
-    certificate_generated = False
-    
-    if percentage >= 50:
-        # Award Certificate
-        import uuid
-        cert = models.Certificate(
-            user_id = current_user["id"],
-            course_id = course_id,
-            certificate_code = f"CERT-{uuid.uuid4().hex[:8].upper()}"
+        question_ids, answers = list(answer_key.question_ids), request.answers or []
+        positions = list(range(len(answer_key)))
+
+    total = len(positions)
+    score = answer_key.grade(answers, positions)
+    response = _final_assessment_response(score, total)
+    completed_at = datetime.utcnow()
+
+    # The final assessment can be taken once: the first attempt wins on
+    # uq_quiz_results_user_course_attempt, whoever else races it inserts nothing
+    table = models.QuizResult.__table__
+    stmt = database.dialect_insert(table).values(
+        user_id=current_user["id"],
+        course_id=course_id,
+        score=score, # score is already raw count here
+        total_questions=total,
+        answers=answers,
+        question_ids=question_ids,
+        completed_at=completed_at,
+        attempt=1,
+        submission_key=idempotency_key
+    ).on_conflict_do_nothing(index_elements=["user_id", "course_id", "attempt"]).returning(table.c.id)
+    result_id = db.execute(stmt).scalar()
+    if result_id is None:
+        db.rollback()
+        replayed = _replayed_final_assessment(db, course_id, current_user["id"], idempotency_key)
+        if replayed is None:
+            raise HTTPException(status_code=400, detail="You have already completed the final assessment for this course.")
+        return replayed
+
+    responses.record(db, result_id, current_user["id"], answer_key, positions, answers, completed_at)
+    progress.refresh(db, current_user["id"], course_id)
+
+    # Certificate and Master badge are issued by the job worker once this commits
+    if response["badgeEligible"]:
+        jobs.enqueue(
+            db, "award_final_assessment",
+            {"user_id": current_user["id"], "course_id": course_id, "result_id": result_id},
+            idempotency_key=f"final-assessment:{result_id}"
         )
-        db.add(cert)
-        certificate_generated = True
-        
-        # Award Master Badge
-        course = db.query(models.Course).get(course_id)
-        badge_name = f"{course.title} Master"
-        badge = db.query(models.Badge).filter(models.Badge.name == badge_name).first()
-        if not badge:
-            badge = models.Badge(name=badge_name, description=f"Mastered {course.title}", icon="Star")
-            db.add(badge)
-            db.flush()
-        
-        user = db.query(models.User).get(current_user["id"])
-        if badge not in user.badges:
-            user.badges.append(badge)
-            badge_awarded = True
-
     db.commit()
+    jobs.notify()
+    if request.is_adaptive:
+        quiz_sessions.store.delete(request.session_id)
     
-    return {
-        "score": score,
-        "totalQuestions": total,
-        "percentage": int(percentage),
-        "badgeAwarded": badge_awarded,
-        "certificate": certificate_generated
-    }
+    return response
 
 # --- New Feature Endpoints ---
 
@@ -1305,7 +1442,7 @@ def get_my_messages(current_user: dict = Depends(auth.get_current_user), db: Ses
     ).order_by(models.Message.created_at.desc()).all()
 
 # Batches
-@app.post("/batches", response_model=schemas.Batch)
+@app.post("/batches", response_model=schemas.BatchSummary)
 def create_batch(batch: schemas.BatchCreate, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     if current_user["role"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can create batches")
@@ -1320,10 +1457,11 @@ def create_batch(batch: schemas.BatchCreate, current_user: dict = Depends(auth.g
     db.add(new_batch)
     db.commit()
     db.refresh(new_batch)
+    new_batch.course_title = db.query(models.Course.title).filter(models.Course.id == new_batch.course_id).scalar()
     return new_batch
 
 @app.post("/batches/{batch_id}/students")
-def assign_students_to_batch(batch_id: int, student_ids: List[int], current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def assign_students_to_batch(batch_id: int, student_ids: List[int], mode: str = "replace", current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     if current_user["role"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can assign students to batches")
     
@@ -1333,49 +1471,95 @@ def assign_students_to_batch(batch_id: int, student_ids: List[int], current_user
     
     if batch.instructor_id != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to manage this batch")
-    
-    # Clear existing students and re-assign? Or add new ones? 
-    # Usually manual assignment replaces or adds. Let's do a set-based replacement for simplicity if the list is provided.
-    students = db.query(models.User).filter(models.User.id.in_(student_ids), models.User.role == "learner").all()
-    
-    # Check if students are enrolled in the course
-    enrolled_student_ids = [e.user_id for e in batch.course.enrolments]
-    valid_students = [s for s in students if s.id in enrolled_student_ids]
-    
-    if len(valid_students) != len(student_ids):
-        # Some students are not enrolled or don't exist
-        print(f"Warning: Some student IDs were skipped for assignment to batch {batch_id}")
-
-    batch.students = valid_students
-    db.commit()
 
-    # Create notifications for assigned students
-    for student in valid_students:
-        notif = models.Notification(
-            user_id=student.id,
-            title="Batch Assigned",
-            message=f"You have been assigned to the '{batch.name}' batch for course '{batch.course.title}'.",
-            type="info"
-        )
-        db.add(notif)
+    if mode not in batches.MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(batches.MODES)}")
     
+    # Only the difference between the current and requested membership is written
+    changes = batches.assign_students(db, batch, student_ids, mode)
     db.commit()
-    return {"message": f"Successfully assigned {len(valid_students)} students to batch."}
 
-@app.get("/batches", response_model=List[schemas.Batch])
+    if changes["skipped"]:
+        # Some students are not enrolled or don't exist
+        logger.warning("%s student IDs were skipped for assignment to batch %s", len(changes["skipped"]), batch_id)
+    if changes["not_members"]:
+        logger.warning("%s student IDs to remove from batch %s were not members", len(changes["not_members"]), batch_id)
+
+    return {
+        "message": f"Batch updated: {len(changes['added'])} added, {len(changes['removed'])} removed.",
+        **changes
+    }
+
+@app.get("/batches", response_model=List[schemas.BatchSummary])
 def get_batches(current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     if current_user["role"] == "instructor":
-        batches = db.query(models.Batch).filter(models.Batch.instructor_id == current_user["id"]).all()
+        visible = models.Batch.instructor_id == current_user["id"]
     else:
         # Learners can see batches they are in
-        batches = db.query(models.Batch).join(models.Batch.students).filter(models.User.id == current_user["id"]).all()
-    
-    # Manually populate course_title if needed, though SQLAlchemy relationship might handle it if schema is right
-    # To be explicit and avoid lazy loading issues in response model:
-    for b in batches:
-        b.course_title = b.course.title if b.course else "Unknown Course"
-    
-    return batches
+        visible = models.Batch.id.in_(
+            select(models.batch_students.c.batch_id).where(models.batch_students.c.student_id == current_user["id"])
+        )
+
+    # Member counts come from one grouped query; the rosters themselves are paged
+    # separately through GET /batches/{batch_id}/students
+    member_counts = select(
+        models.batch_students.c.batch_id,
+        func.count().label("member_count")
+    ).where(
+        models.batch_students.c.batch_id.in_(select(models.Batch.id).where(visible))
+    ).group_by(models.batch_students.c.batch_id).subquery()
+
+    rows = db.query(
+        models.Batch,
+        models.Course.title,
+        func.coalesce(member_counts.c.member_count, 0)
+    ).outerjoin(
+        models.Course, models.Course.id == models.Batch.course_id
+    ).outerjoin(
+        member_counts, member_counts.c.batch_id == models.Batch.id
+    ).filter(visible).order_by(models.Batch.id).all()
+
+    return [
+        {
+            "id": b.id,
+            "name": b.name,
+            "course_id": b.course_id,
+            "instructor_id": b.instructor_id,
+            "start_time": b.start_time,
+            "end_time": b.end_time,
+            "created_at": b.created_at,
+            "course_title": course_title or "Unknown Course",
+            "member_count": member_count
+        } for b, course_title, member_count in rows
+    ]
+
+@app.get("/batches/{batch_id}/students", response_model=schemas.BatchMemberPage)
+def get_batch_students(batch_id: int, after: Optional[int] = None, limit: int = 50, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    batch = db.query(models.Batch).filter(models.Batch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    if batch.instructor_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to view this batch")
+
+    limit = max(1, min(limit, 500))
+
+    # Keyset pagination on user id
+    query = db.query(models.User).join(
+        models.batch_students, models.batch_students.c.student_id == models.User.id
+    ).filter(models.batch_students.c.batch_id == batch_id)
+    if after is not None:
+        query = query.filter(models.User.id > after)
+    students = query.order_by(models.User.id).limit(limit + 1).all()
+
+    has_more = len(students) > limit
+    students = students[:limit]
+    total = db.query(func.count()).select_from(models.batch_students).filter(models.batch_students.c.batch_id == batch_id).scalar()
+    return {
+        "students": students,
+        "total": total,
+        "next_after": students[-1].id if has_more else None
+    }
 
 # Badges
 @app.get("/users/me/badges", response_model=List[schemas.Badge])
@@ -1391,7 +1575,9 @@ def get_all_badges(db: Session = Depends(database.get_db)):
 # Certificates
 @app.get("/users/me/certificates", response_model=List[schemas.CertificateResponse])
 def get_my_certificates(current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    certs = db.query(models.Certificate).filter(models.Certificate.user_id == current_user["id"]).all()
+    certs = db.query(models.Certificate).options(
+        joinedload(models.Certificate.course), joinedload(models.Certificate.user)
+    ).filter(models.Certificate.user_id == current_user["id"]).all()
     # Populate extra fields for the response model
     for cert in certs:
         cert.course_title = cert.course.title if cert.course else "Unknown Course"
@@ -1412,7 +1598,7 @@ def get_course_certificate(course_id: int, current_user: dict = Depends(auth.get
     return cert
 
 @app.get("/courses/{course_id}/reports/performance")
-def get_performance_report(course_id: int, current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+def get_performance_report(course_id: int, format: str = "csv", current_user: dict = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     if current_user["role"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can download performance reports")
     
@@ -1422,61 +1608,21 @@ def get_performance_report(course_id: int, current_user: dict = Depends(auth.get
     
     if course.instructor_id != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to access reports for this course")
-    
-    # 1. Fetch Enrolled Students
-    # Joining with Enrolment table to find all students for this course
-    enrolled_users = db.query(models.User).join(models.Enrolment).filter(models.Enrolment.course_id == course_id).all()
-    
-    # 2. Prepare CSV Header
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Student Name", "Email", "Progress (%)", "Module Quiz Avg (%)", "Final Assessment Status", "Final Grade (%)"])
-    
-    total_modules = len(course.modules)
-    
-    for student in enrolled_users:
-        # Progress: Completed modules / total modules
-        completed_results = db.query(models.QuizResult).filter(
-            models.QuizResult.user_id == student.id,
-            models.QuizResult.module_id.in_([m.id for m in course.modules])
-        ).all()
-        
-        completed_count = len(completed_results)
-        progress = (completed_count / total_modules * 100) if total_modules > 0 else 0
-        
-        # Module Average
-        quiz_scores = []
-        for r in completed_results:
-            if r.total_questions and r.total_questions > 0:
-                quiz_scores.append((r.score / r.total_questions) * 100)
-        
-        mod_avg = sum(quiz_scores) / len(quiz_scores) if quiz_scores else 0
-        
-        # Final Assessment
-        final_result = db.query(models.QuizResult).filter(
-            models.QuizResult.user_id == student.id,
-            models.QuizResult.course_id == course_id
-        ).first()
-        
-        final_status = "Completed" if final_result else "Not Attempted"
-        final_score = int((final_result.score / final_result.total_questions * 100) if final_result and final_result.total_questions and final_result.total_questions > 0 else 0)
-        
-        writer.writerow([
-            student.name,
-            student.email,
-            f"{int(progress)}%",
-            f"{int(mod_avg)}%",
-            final_status,
-            f"{final_score}%" if final_result else "N/A"
-        ])
-    
-    output.seek(0)
+
+    try:
+        reports.check_format(format)
+    except reports.ReportFormatUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = reports.FORMATS[format]
     sanitized_title = "".join(c for c in course.title if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
-    filename = f"Performance_Report_{sanitized_title}.csv"
+    filename = f"Performance_Report_{sanitized_title}.{extension}"
     
+    # Rows are produced by one grouped query and written as they are fetched,
+    # so the export uses constant memory regardless of class size
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        reports.stream_performance_report(course_id, format),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
@@ -0,0 +1,242 @@
+"""
+In-process request, SQL and LLM metrics in the Prometheus text format.
+
+The HTTP middleware in main.py times every request by route template and
+status, tracks the requests in flight and, through SQLAlchemy cursor events,
+the number of SQL statements and the time spent in them per request. rag.py
+times its LLM calls with llm_call(). render() serves everything at /metrics.
+
+Metrics are plain thread-safe counters kept per process (no client library
+needed); with several workers, each worker is scraped separately.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Statements per request
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+UNMATCHED_ROUTE = "unmatched"
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (_registry if registry is None else registry).append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = sorted(self._snapshot().items())
+        for key, value in values:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _snapshot(self):
+        return dict(self._values)
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._labels(key)} {_format(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Per-bucket counts (the last slot is +Inf), cumulated when rendered
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def _snapshot(self):
+        return {key: (list(counts), total, n) for key, (counts, total, n) in self._values.items()}
+
+    def _samples(self, key, value):
+        counts, total, n = value
+        lines, cumulative = [], 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(key)} {_format(total)}")
+        lines.append(f"{self.name}_count{self._labels(key)} {n}")
+        return lines
+
+
+# --- HTTP ---
+REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency until the response starts.", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+
+# --- SQL ---
+REQUEST_STATEMENTS = Histogram("http_request_db_statements", "SQL statements executed per HTTP request.", ("method", "route"), STATEMENT_BUCKETS)
+REQUEST_SQL_TIME = Histogram("http_request_db_seconds", "Time spent executing SQL per HTTP request.", ("method", "route"))
+STATEMENTS = Counter("db_statements_total", "SQL statements executed, in and outside requests.")
+SQL_TIME = Counter("db_statement_seconds_total", "Time spent executing SQL, in and outside requests.")
+
+# --- LLM ---
+LLM_REQUESTS = Counter("llm_requests_total", "LLM chat completion calls by operation and outcome.", ("operation", "outcome"))
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "LLM chat completion latency.", ("operation",), LLM_BUCKETS)
+
+
+class RequestStats:
+    """SQL cost of the request being served (shared with the threadpool through a ContextVar)."""
+    __slots__ = ("statements", "sql_seconds", "scope")
+
+    def __init__(self, scope=None):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # The ASGI scope; routing adds the matched route to it
+        self.scope = scope
+
+
+_current = ContextVar("metrics_request", default=None)
+
+
+def begin_request(scope=None):
+    stats = RequestStats(scope)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def route_of(request):
+    """The matched route template (/courses/{course_id}), never the raw path, to keep labels bounded."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def current_route():
+    """ "GET /courses/{course_id}" for the request being served, None outside requests."""
+    stats = _current.get()
+    if stats is None or stats.scope is None:
+        return None
+    route = stats.scope.get("route")
+    return f"{stats.scope.get('method')} {getattr(route, 'path', None) or UNMATCHED_ROUTE}"
+
+
+def observe_request(method, route, status, seconds, stats):
+    REQUESTS.inc(method=method, route=route, status=status)
+    REQUEST_LATENCY.observe(seconds, method=method, route=route)
+    REQUEST_STATEMENTS.observe(stats.statements, method=method, route=route)
+    REQUEST_SQL_TIME.observe(stats.sql_seconds, method=method, route=route)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    STATEMENTS.inc()
+    SQL_TIME.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def llm_call(operation):
+    """Time one LLM call; exceptions are counted as errors and re-raised."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LLM_REQUESTS.inc(operation=operation, outcome=outcome)
+        LLM_LATENCY.observe(time.perf_counter() - started, operation=operation)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
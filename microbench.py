@@ -0,0 +1,356 @@
+"""
+Micro-benchmarks of the hot in-process functions, at several input sizes.
+
+  rag.get_embedding / rag.cosine_similarity / rag.retrieve / rag.index_content
+  grading.module_quiz       answer key + _module_quiz_response (submit_quiz_result)
+  grading.final_assessment  answer key + grade + _final_assessment_response (submit_course_quiz)
+  serialise.course_detail   _course_detail (get_course), plus encode_json
+  serialise.catalogue       _build_catalogue (get_all_courses) over in-memory SQLite
+  auth.create_access_token / auth.decode_token
+
+Each benchmark is timed the timeit way: the loop count is grown until one
+run takes at least --min-time / --repeat, then the run is repeated. The
+fastest run is the one least disturbed by the rest of the machine, so it is
+the figure compared (the median and spread are reported alongside).
+Absolute times depend on the machine, so every result is also divided by a
+fixed pure-Python calibration loop timed right before it; baselines are
+compared on that normalised figure, which survives moving between a laptop
+and CI (and a shared runner's clock drifting mid-run) far better than
+nanoseconds do.
+
+    python microbench.py                                    # everything, table on stdout
+    python microbench.py --filter rag. --output bench.json
+    python microbench.py --baseline microbench_baseline.json --tolerance 0.25   # exit 1 on regression
+    python microbench.py --save-baseline microbench_baseline.json               # after an intended change
+
+pytest-benchmark / pyperf are not dependencies of this repo; the harness is
+plain timeit so it runs wherever the app does.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+MIN_TIME = 1.0
+REPEAT = 5
+# Changes below this many nanoseconds per call are timer noise, whatever the tolerance
+MIN_DELTA_NS = 200
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes):
+    """Register setup(size) -> zero-argument callable under name, to be run at each size."""
+    def register(setup):
+        BENCHMARKS[name] = (tuple(sizes), setup)
+        return setup
+    return register
+
+
+def _words(rng, n, vocabulary=2000):
+    return " ".join(f"w{rng.randrange(vocabulary)}" for _ in range(n))
+
+
+# --- rag ---
+
+@benchmark("rag.get_embedding", sizes=(10, 100, 1000))
+def _get_embedding(size):
+    import rag
+    text = _words(random.Random(size), size)
+    return lambda: rag.get_embedding(text)
+
+
+@benchmark("rag.cosine_similarity", sizes=(10, 100, 1000))
+def _cosine_similarity(size):
+    import rag
+    rng = random.Random(size)
+    a, b = rag.get_embedding(_words(rng, size)), rag.get_embedding(_words(rng, size))
+    return lambda: rag.cosine_similarity(a, b)
+
+
+@benchmark("rag.retrieve", sizes=(10, 100, 1000))
+def _retrieve(size):
+    import rag
+    rng = random.Random(size)
+    rag.VECTOR_STORE = [{"text": f"chunk {i}", "embedding": rag.get_embedding(_words(rng, 40))} for i in range(size)]
+    query = _words(rng, 8)
+    return lambda: rag.retrieve(query)
+
+
+@benchmark("rag.index_content", sizes=(10, 100, 1000))
+def _index_content(size):
+    import rag
+    rng = random.Random(size)
+    courses = [{"title": _words(rng, 4), "description": _words(rng, 40)} for _ in range(size)]
+    # save_index() is part of the call; keep it off the working tree
+    rag.INDEX_FILE = os.path.join(tempfile.mkdtemp(prefix="microbench-"), "vector_store.json")
+    return lambda: rag.index_content(courses)
+
+
+# --- grading ---
+
+def _questions(rng, n, start_id=1):
+    questions = []
+    for i in range(n):
+        mcq = rng.random() < 0.8
+        questions.append(SimpleNamespace(
+            id=start_id + i, questionText=f"Question {i}?", questionType="mcq" if mcq else "descriptive",
+            options=[SimpleNamespace(text=f"Option {k}") for k in range(4)] if mcq else [],
+            correctOptionIndex=rng.randrange(4) if mcq else None,
+            correctAnswerText=None if mcq else f"answer {i}",
+            difficulty=rng.choice(("easy", "medium", "hard")),
+        ))
+    return questions
+
+
+def _answers(rng, questions):
+    return [rng.randrange(4) if q.questionType == "mcq" else f"Answer {q.id} " for q in questions]
+
+
+@benchmark("grading.module_quiz", sizes=(5, 20, 100))
+def _grade_module_quiz(size):
+    import answer_keys
+    import main
+    rng = random.Random(size)
+    questions = _questions(rng, size)
+    key = answer_keys.AnswerKey(1, 0, questions, lenient_mcq=True)
+    answers = _answers(rng, questions)
+    now = datetime(2026, 1, 1)
+    return lambda: main._module_quiz_response(key, 1, 1, 1, answers, now)
+
+
+@benchmark("grading.final_assessment", sizes=(10, 50, 200))
+def _grade_final_assessment(size):
+    import answer_keys
+    import main
+    rng = random.Random(size)
+    questions = _questions(rng, size)
+    key = answer_keys.AnswerKey(1, 0, questions, lenient_mcq=False)
+    # An adaptive attempt answers a shuffled subset of the bank
+    asked = rng.sample(key.question_ids, max(1, size // 2))
+    answers = _answers(rng, [questions[key.position[qid]] for qid in asked])
+
+    def grade():
+        positions = key.positions_for(asked)
+        return main._final_assessment_response(key.grade(answers, positions), len(positions))
+    return grade
+
+
+# --- serialisers ---
+
+def _course(rng, modules, questions_per_module=5):
+    import models
+    next_id = iter(range(1, 10 ** 9))
+
+    def question():
+        q = _questions(rng, 1, next(next_id))[0]
+        return models.Question(
+            id=q.id, questionText=q.questionText, questionType=q.questionType, difficulty=q.difficulty,
+            correctOptionIndex=q.correctOptionIndex, correctAnswerText=q.correctAnswerText,
+            options=[models.QuestionOption(id=next(next_id), text=o.text) for o in q.options],
+        )
+
+    return models.Course(
+        id=1, title="Benchmark course", description=_words(rng, 40), thumbnail="", price=0.0, status="Published",
+        instructor_id=1, enrolment_count=100,
+        instructor=models.User(id=1, name="Instructor", email="instructor@example.com", role="instructor"),
+        modules=[
+            models.Module(id=next(next_id), title=f"Module {m}", contentLink="https://example.com",
+                          quiz=[question() for _ in range(questions_per_module)])
+            for m in range(modules)
+        ],
+        assessment=[question() for _ in range(modules * 2)],
+    )
+
+
+@benchmark("serialise.course_detail", sizes=(1, 10, 50))
+def _course_detail(size):
+    import main
+    course = _course(random.Random(size), size)
+    return lambda: main._course_detail(course, include_answers=False)
+
+
+@benchmark("serialise.course_detail_json", sizes=(1, 10, 50))
+def _course_detail_json(size):
+    import cache
+    import main
+    course = _course(random.Random(size), size)
+    return lambda: cache.encode_json(main._course_detail(course, include_answers=False))
+
+
+@benchmark("serialise.catalogue", sizes=(10, 100, 1000))
+def _catalogue(size):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import StaticPool
+
+    import main
+    import models
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    rng = random.Random(size)
+    db = Session(engine)
+    instructors = [models.User(name=f"Instructor {i}", email=f"i{i}@example.com", password="x", role="instructor")
+                   for i in range(max(1, size // 10))]
+    db.add_all(instructors)
+    db.add_all(models.Course(title=_words(rng, 4), description=_words(rng, 40), status="Published",
+                             instructor=rng.choice(instructors), enrolment_count=rng.randrange(500))
+               for _ in range(size))
+    db.commit()
+    db.close()
+
+    def build():
+        with Session(engine) as session:
+            return main._build_catalogue(None, session)
+    return build
+
+
+# --- auth ---
+
+@benchmark("auth.create_access_token", sizes=(1, 10, 100))
+def _create_access_token(size):
+    import auth
+    claims = {"sub": "learner@example.com", **{f"claim{i}": f"value{i}" for i in range(size - 1)}}
+    return lambda: auth.create_access_token(claims)
+
+
+@benchmark("auth.decode_token", sizes=(1, 10, 100))
+def _decode_token(size):
+    from jose import jwt
+
+    import auth
+    token = auth.create_access_token({"sub": "learner@example.com", **{f"claim{i}": f"value{i}" for i in range(size - 1)}})
+    # What get_current_user does before the database lookup
+    return lambda: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+
+
+# --- harness ---
+
+def _calibration_workload():
+    total = 0
+    table = {}
+    for i in range(1000):
+        table[i & 63] = table.get(i & 63, 0) + i
+        total += i * i
+    return total
+
+
+def measure(fn, min_time=MIN_TIME, repeat=REPEAT):
+    """Min, median and stdev of the per-call time of fn in nanoseconds, over `repeat` timed runs."""
+    timer = timeit.Timer(fn)
+    budget = min_time / repeat
+    # timeit.autorange() with a configurable target instead of its fixed 0.2s
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= budget:
+            break
+        loops = max(loops + 1, int(loops * min(10, 1.2 * budget / max(elapsed, 1e-9))))
+    per_call = [t / loops * 1e9 for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "median_ns": statistics.median(per_call),
+        "min_ns": min(per_call),
+        "stdev_ns": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "loops": loops,
+    }
+
+
+def run(names=None, sizes=None, min_time=MIN_TIME, repeat=REPEAT, progress=None):
+    """
+    Time the selected benchmarks (default: all) at their sizes (or only the
+    given ones). Returns the report dict; each result is keyed "name[size]".
+    """
+    results = {}
+    for name, (bench_sizes, setup) in BENCHMARKS.items():
+        if names is not None and name not in names:
+            continue
+        for size in bench_sizes:
+            if sizes is not None and size not in sizes:
+                continue
+            fn = setup(size)
+            calibration = measure(_calibration_workload, min_time / 4, repeat)["min_ns"]
+            result = measure(fn, min_time, repeat)
+            result["calibration_ns"] = calibration
+            result["normalised"] = result["min_ns"] / calibration
+            results[f"{name}[{size}]"] = result
+            if progress:
+                progress(f"{name}[{size}]", result)
+    return {
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Benchmarks at least `tolerance` slower (normalised) than in baseline, as printable lines."""
+    regressions = []
+    for key, old in baseline["results"].items():
+        new = report["results"].get(key)
+        if new is None:
+            continue
+        ratio = new["normalised"] / old["normalised"]
+        absolute = new["min_ns"] - old["normalised"] * new["calibration_ns"]
+        if ratio > 1 + tolerance and absolute > MIN_DELTA_NS:
+            regressions.append(f"{key}: {ratio:.2f}x slower ({_format_ns(old['min_ns'])} -> {_format_ns(new['min_ns'])})")
+    return regressions
+
+
+def _format_ns(ns):
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f}{unit}"
+    return f"{ns:.0f}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only benchmarks whose name starts with this")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds per benchmark and size")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    # Importing main configures logging and creates the schema; keep both out of the way
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("LOG_CONSOLE", "0")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    names = [name for name in BENCHMARKS if name.startswith(args.filter)]
+
+    def progress(key, result):
+        old = (baseline or {}).get("results", {}).get(key)
+        change = f"  {result['normalised'] / old['normalised'] - 1:+7.1%}" if old else ""
+        print(f"  {key:<40} {_format_ns(result['min_ns']):>10} (median {_format_ns(result['median_ns']):>9} ±{_format_ns(result['stdev_ns']):>9}){change}", flush=True)
+
+    report = run(names, min_time=args.min_time, repeat=args.repeat, progress=progress)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sqlite3
+import os
+
+def migrate():
+    db_path = 'edweb.db'
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Starting enrolment count migration...")
+
+        cursor.execute("PRAGMA table_info(courses)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if 'enrolment_count' not in columns:
+            print("Adding enrolment_count column to courses table...")
+            cursor.execute("ALTER TABLE courses ADD COLUMN enrolment_count INTEGER NOT NULL DEFAULT 0")
+        else:
+            print("enrolment_count column already exists.")
+
+        # Recount from scratch so the column is correct even if it drifted
+        print("Backfilling enrolment counts...")
+        cursor.execute("""
+            UPDATE courses SET enrolment_count = (
+                SELECT COUNT(*) FROM enrolments WHERE enrolments.course_id = courses.id
+            )
+        """)
+
+        # Indexes used by the counters, isEnrolled lookups and roster paging
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_enrolments_course_id ON enrolments (course_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_enrolments_user_id ON enrolments (user_id)")
+
+        conn.commit()
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
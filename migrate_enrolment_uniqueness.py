@@ -0,0 +1,50 @@
+import sqlite3
+import os
+
+def migrate():
+    db_path = 'edweb.db'
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Starting enrolment uniqueness migration...")
+
+        # Keep the earliest enrolment per learner and course; accessibility stays
+        # enabled if any of the duplicates had it
+        cursor.execute("""
+            UPDATE enrolments SET accessibility_enabled = 1
+            WHERE id IN (SELECT MIN(id) FROM enrolments GROUP BY user_id, course_id HAVING MAX(accessibility_enabled) = 1)
+        """)
+        cursor.execute("""
+            DELETE FROM enrolments
+            WHERE id NOT IN (SELECT MIN(id) FROM enrolments GROUP BY user_id, course_id)
+        """)
+        print(f"Removed {cursor.rowcount} duplicate enrolments.")
+
+        # The duplicates were counted too
+        print("Recounting enrolment counts...")
+        cursor.execute("""
+            UPDATE courses SET enrolment_count = (
+                SELECT COUNT(*) FROM enrolments WHERE enrolments.course_id = courses.id
+            )
+        """)
+
+        # Conflict target of the enrolment upserts
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_enrolments_user_course ON enrolments (user_id, course_id)")
+        # Bulk enrolment matches emails case-insensitively
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))")
+
+        conn.commit()
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,49 @@
+import sqlite3
+import os
+
+def migrate():
+    db_path = 'edweb.db'
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Starting course progress scored modules migration...")
+
+        cursor.execute("PRAGMA table_info(course_progress)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if not columns:
+            print("course_progress table not found. Run backfill_course_progress.py instead.")
+            return
+
+        # Completed modules that have questions: the denominator of the module average
+        if 'scored_modules' not in columns:
+            print("Adding scored_modules column to course_progress table...")
+            cursor.execute("ALTER TABLE course_progress ADD COLUMN scored_modules INTEGER NOT NULL DEFAULT 0")
+        else:
+            print("scored_modules column already exists.")
+
+        print("Backfilling scored module counts...")
+        cursor.execute("""
+            UPDATE course_progress SET scored_modules = (
+                SELECT COUNT(DISTINCT quiz_results.module_id)
+                FROM quiz_results JOIN modules ON modules.id = quiz_results.module_id
+                WHERE quiz_results.user_id = course_progress.user_id
+                  AND modules.course_id = course_progress.course_id
+                  AND quiz_results.total_questions > 0
+            )
+        """)
+
+        conn.commit()
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,35 @@
+import sqlite3
+import os
+
+def migrate():
+    db_path = 'edweb.db'
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Starting question version migration...")
+
+        cursor.execute("PRAGMA table_info(courses)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        # Versions the compiled answer keys on every worker (see answer_keys.py)
+        if 'question_version' not in columns:
+            print("Adding question_version column to courses table...")
+            cursor.execute("ALTER TABLE courses ADD COLUMN question_version INTEGER NOT NULL DEFAULT 0")
+        else:
+            print("question_version column already exists.")
+
+        conn.commit()
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,76 @@
+import sqlite3
+import os
+
+def migrate():
+    db_path = 'edweb.db'
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        print("Starting quiz result uniqueness migration...")
+
+        cursor.execute("PRAGMA table_info(quiz_results)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if 'attempt' not in columns:
+            print("Adding attempt column to quiz_results table...")
+            cursor.execute("ALTER TABLE quiz_results ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1")
+        else:
+            print("attempt column already exists.")
+
+        if 'submission_key' not in columns:
+            print("Adding submission_key column to quiz_results table...")
+            cursor.execute("ALTER TABLE quiz_results ADD COLUMN submission_key VARCHAR")
+        else:
+            print("submission_key column already exists.")
+
+        # Module quizzes: keep the latest result per learner and module (the one
+        # the old update path would have kept) and move the responses onto it
+        cursor.execute("""
+            CREATE TEMP TABLE quiz_result_merges AS
+            SELECT id AS old_id, (
+                SELECT MAX(k.id) FROM quiz_results k
+                WHERE k.user_id = r.user_id AND k.module_id = r.module_id
+            ) AS keep_id
+            FROM quiz_results r
+            WHERE r.module_id IS NOT NULL AND r.user_id IS NOT NULL
+        """)
+        cursor.execute("DELETE FROM quiz_result_merges WHERE old_id = keep_id")
+        cursor.execute("SELECT COUNT(*) FROM quiz_result_merges")
+        duplicates = cursor.fetchone()[0]
+        print(f"Merging {duplicates} duplicate module results...")
+        cursor.execute("""
+            UPDATE question_responses SET result_id = (
+                SELECT keep_id FROM quiz_result_merges WHERE old_id = question_responses.result_id
+            ) WHERE result_id IN (SELECT old_id FROM quiz_result_merges)
+        """)
+        cursor.execute("DELETE FROM quiz_results WHERE id IN (SELECT old_id FROM quiz_result_merges)")
+        cursor.execute("DROP TABLE quiz_result_merges")
+
+        # Final assessments: duplicates become numbered attempts, oldest first
+        print("Numbering final assessment attempts...")
+        cursor.execute("""
+            UPDATE quiz_results SET attempt = (
+                SELECT COUNT(*) FROM quiz_results p
+                WHERE p.user_id = quiz_results.user_id AND p.course_id = quiz_results.course_id AND p.id <= quiz_results.id
+            ) WHERE course_id IS NOT NULL AND user_id IS NOT NULL
+        """)
+
+        # Conflict targets of the submission upserts
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_quiz_results_user_module ON quiz_results (user_id, module_id)")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_quiz_results_user_course_attempt ON quiz_results (user_id, course_id, attempt)")
+
+        conn.commit()
+        print("Migration completed successfully.")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Table, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Table, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -38,6 +38,11 @@ class User(Base):
     badges = relationship("Badge", secondary=user_badges, back_populates="users")
     notifications = relationship("Notification", back_populates="user")
 
+    __table_args__ = (
+        # Case-insensitive email lookups (bulk cohort enrolment)
+        Index("ix_users_email_lower", func.lower(email)),
+    )
+
 class Course(Base):
     __tablename__ = "courses"
 
@@ -49,6 +54,10 @@ class Course(Base):
     status = Column(String, default="Published")
     instructor_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Denormalised count of enrolments, kept in step by the enrol paths (see migrate_enrolment_count.py)
+    enrolment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Bumped with every change to the course's questions; versions the compiled answer keys (answer_keys.py)
+    question_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     instructor = relationship("User", back_populates="courses")
     modules = relationship("Module", back_populates="course", cascade="all, delete-orphan")
@@ -97,11 +106,16 @@ class Enrolment(Base):
     __tablename__ = "enrolments"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    course_id = Column(Integer, ForeignKey("courses.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), index=True)
     enrolled_at = Column(DateTime, default=datetime.utcnow)
     accessibility_enabled = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # Conflict target of the enrolment upserts (see enrolments.py)
+        Index("uq_enrolments_user_course", "user_id", "course_id", unique=True),
+    )
+
     user = relationship("User", back_populates="enrolments")
     course = relationship("Course", back_populates="enrolments")
 
@@ -117,11 +131,39 @@ class QuizResult(Base):
     answers = Column(JSON, nullable=True)
     question_ids = Column(JSON, nullable=True) # To track specific questions in order
     completed_at = Column(DateTime, default=datetime.utcnow)
+    attempt = Column(Integer, default=1, server_default="1", nullable=False) # final assessment attempt number
+    submission_key = Column(String, nullable=True) # Idempotency-Key of the submission that last wrote the row
+
+    __table_args__ = (
+        # One row per learner and module (re-submissions update it) and per final-assessment attempt
+        Index("uq_quiz_results_user_module", "user_id", "module_id", unique=True),
+        Index("uq_quiz_results_user_course_attempt", "user_id", "course_id", "attempt", unique=True),
+    )
 
     user = relationship("User", back_populates="quiz_results")
     module = relationship("Module", back_populates="results")
     course = relationship("Course")
 
+class CourseProgress(Base):
+    """Materialised per-learner progress, maintained by progress.py on quiz submission."""
+    __tablename__ = "course_progress"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), primary_key=True, index=True)
+    completed_modules = Column(Integer, default=0, nullable=False)
+    total_modules = Column(Integer, default=0, nullable=False)
+    module_score_sum = Column(Float, default=0.0, nullable=False) # sum of best module percentages
+    scored_modules = Column(Integer, default=0, server_default="0", nullable=False) # completed modules that have questions
+    final_score = Column(Float, nullable=True) # final assessment percentage, NULL if not attempted
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def progress(self):
+        return int(self.completed_modules / self.total_modules * 100) if self.total_modules else 0
+
+    @property
+    def module_average(self):
+        return self.module_score_sum / self.scored_modules if self.scored_modules else 0
+
 class Badge(Base):
     __tablename__ = "badges"
     id = Column(Integer, primary_key=True, index=True)
@@ -180,3 +222,65 @@ class Certificate(Base):
     user = relationship("User")
     course = relationship("Course")
 
+class BackgroundJob(Base):
+    """Durable queue entry for work run after the request commits (see jobs.py)."""
+    __tablename__ = "background_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    payload = Column(JSON, nullable=True)
+    idempotency_key = Column(String, unique=True, nullable=True)
+    status = Column(String, default="pending", index=True) # pending / running / done / failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ItemParameter(Base):
+    """2PL item parameters fitted offline by calibrate_irt.py (see irt.py)."""
+    __tablename__ = "item_parameters"
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), index=True)
+    discrimination = Column(Float, nullable=False, default=1.0) # a
+    difficulty = Column(Float, nullable=False, default=0.0) # b, on the ability scale
+    responses = Column(Integer, default=0)
+    calibrated_at = Column(DateTime, default=datetime.utcnow)
+
+class QuestionStat(Base):
+    """Item analysis per question, written by analyse_items.py (see item_analysis.py)."""
+    __tablename__ = "question_stats"
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), index=True)
+    module_id = Column(Integer, ForeignKey("modules.id"), nullable=True)
+    responses = Column(Integer, default=0)
+    p_value = Column(Float, nullable=True) # proportion answering correctly
+    discrimination = Column(Float, nullable=True) # corrected point-biserial with the rest of the attempt
+    option_counts = Column(JSON, nullable=True) # times each option was chosen (MCQ only)
+    invalid_answers = Column(Integer, default=0) # blank / unparseable MCQ answers
+    analysed_at = Column(DateTime, default=datetime.utcnow)
+
+class QuestionResponse(Base):
+    """
+    One answered question of a submission, appended next to QuizResult.answers
+    (see responses.py). Rows are never updated: a module retake appends a new set.
+    """
+    __tablename__ = "question_responses"
+    id = Column(Integer, primary_key=True)
+    result_id = Column(Integer, ForeignKey("quiz_results.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    position = Column(Integer, nullable=False) # order within the submission
+    chosen_index = Column(Integer, nullable=True) # MCQ option picked, NULL if blank / unparseable
+    answer_hash = Column(String(16), nullable=True) # descriptive answers: hash of the normalised text
+    is_correct = Column(Boolean, nullable=False)
+    answered_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Covering indexes: per-question analytics / distractors, a learner's history
+        # on a question (retake comparison) and the review of one submission
+        Index("ix_question_responses_question", "question_id", "is_correct", "chosen_index"),
+        Index("ix_question_responses_user_question", "user_id", "question_id", "answered_at", "is_correct"),
+        Index("ix_question_responses_result", "result_id", "answered_at", "position"),
+    )
@@ -0,0 +1,216 @@
+"""
+On-demand sampling profiler for single requests.
+
+A request is profiled when it carries X-Profile: 1 together with a valid
+X-Debug-Token (see auth.require_debug_token), or at random with probability
+PROFILE_SAMPLE_RATE. While it runs, a Sampler thread snapshots the Python
+stacks of every busy thread every PROFILE_INTERVAL_MS; sync endpoints run in
+the threadpool, so sampling one thread would miss the work. Threads parked
+in a wait (idle workers, the event loop's select) are skipped, so with a
+quiet server the samples are the request's own: dependency resolution, ORM
+loading, grading, serialisation. Streamed bodies (report exports) are produced
+after the endpoint returns, so sampling runs until their last chunk is sent.
+
+Python gives no way to tell which request a thread is working for, so on a
+busy server the profile also holds the stacks of whatever ran alongside it.
+Each profile records peak_busy_threads, the most threads seen running in one
+sample; anything above 1 means other work was mixed in, and the profile is
+best taken again on a quiet instance (or read with that in mind).
+
+Profiles are stored as folded stacks ("root;...;leaf count", the input of
+flamegraph.pl and speedscope) plus a JSON summary, in PROFILE_DIR, keeping
+only the newest PROFILE_KEEP. GET /debug/profiles lists them with their
+hottest frames, GET /debug/profiles/{name} returns the folded stacks.
+"""
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+import auth
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Stacks are cut above this depth (the outermost frames are dropped)
+MAX_DEPTH = 128
+# Leaf frames of a thread that is waiting rather than running
+_IDLE = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select")}
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def requested(headers):
+    """Profile this request? Explicitly (header + debug token) or by sampling."""
+    if headers.get("x-profile") == "1" and auth.DEBUG_TOKEN:
+        token = headers.get("x-debug-token")
+        if token and hmac.compare_digest(token, auth.DEBUG_TOKEN):
+            return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """Folded stack of a thread, root first; None if the thread is idle."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+        return None
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Samples the stacks of all busy threads (except its own) until stopped."""
+
+    def __init__(self, interval_ms=None):
+        self.interval = (INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.peak_busy_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            busy = 0
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _stack(frame)
+                if stack:
+                    self.stacks[stack] += 1
+                    busy += 1
+            self.peak_busy_threads = max(self.peak_busy_threads, busy)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+
+def hot_frames(stacks, limit=10):
+    """Frames by samples spent in them (self) and under them (inclusive)."""
+    own, inclusive = Counter(), Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += n
+        for frame in set(frames):
+            inclusive[frame] += n
+    return {
+        "self": [{"frame": f, "samples": n} for f, n in own.most_common(limit)],
+        "inclusive": [{"frame": f, "samples": n} for f, n in inclusive.most_common(limit)],
+    }
+
+
+class ProfileStore:
+    """Bounded on-disk ring of profiles: <name>.folded + <name>.json, oldest deleted first."""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def new_name(self, method, route, request_id):
+        """Name for a profile that is about to be saved; names sort oldest first."""
+        return _UNSAFE.sub("_", f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{method}-{route}-{request_id or ''}").strip("_")[:150]
+
+    def save(self, name, sampler, method, path, route, status, duration_ms, request_id):
+        summary = {
+            "name": name,
+            "created_at": datetime.utcnow().isoformat(),
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "request_id": request_id,
+            "interval_ms": sampler.interval * 1000,
+            "samples": sampler.samples,
+            "peak_busy_threads": sampler.peak_busy_threads,
+            "hot_frames": hot_frames(sampler.stacks),
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{name}.folded"), "w") as f:
+                for stack, n in sampler.stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+                json.dump(summary, f)
+            self._trim()
+        return name
+
+    def _names(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+
+    def _trim(self):
+        names = self._names()
+        for name in names[:max(0, len(names) - self.keep)]:
+            for extension in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, name + extension))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Summaries, newest first."""
+        summaries = []
+        for name in reversed(self._names()):
+            try:
+                with open(os.path.join(self.directory, f"{name}.json")) as f:
+                    summaries.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return summaries
+
+    def folded(self, name):
+        """The folded stacks of one profile, None if it does not exist (or was rotated out)."""
+        if name not in self._names():
+            return None
+        with open(os.path.join(self.directory, f"{name}.folded")) as f:
+            return f.read()
+
+
+store = ProfileStore()
+
+
+def start():
+    return Sampler().start()
+
+
+def finish(sampler, name, method, path, route, status, started, request_id):
+    """Stop sampling and store the profile under name (called off the event loop)."""
+    duration_ms = (time.perf_counter() - started) * 1000
+    sampler.stop()
+    return store.save(name, sampler, method, path, route, status, duration_ms, request_id)
+
+
+async def profiled_body(body, finish):
+    """Pass a streamed body through, then finish() once its last chunk is sent (or the client goes away)."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        await run_in_threadpool(finish)
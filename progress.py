@@ -0,0 +1,134 @@
+"""
+Maintenance of the course_progress table.
+
+Every row is derived from quiz_results with the same set-based statement:
+refresh() runs it for one (learner, course) pair after a submission,
+rebuild() runs it for a whole course (module added/removed) or for the
+whole database (backfill_course_progress.py). Dashboards then read
+progress with a single indexed lookup instead of recounting results.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, func, case, literal, union, true
+
+import database
+import models
+
+
+def _pct():
+    return case(
+        (models.QuizResult.total_questions > 0, models.QuizResult.score * 100.0 / models.QuizResult.total_questions),
+        else_=None,
+    )
+
+
+def _progress_select(user_id=None, course_id=None):
+    """SELECT producing course_progress rows, restricted to a learner and/or course when given."""
+    qr = models.QuizResult
+
+    def scoped(stmt, user_col, course_col):
+        if user_id is not None:
+            stmt = stmt.where(user_col == user_id)
+        if course_id is not None:
+            stmt = stmt.where(course_col == course_id)
+        return stmt
+
+    if user_id is not None and course_id is not None:
+        pairs = select(literal(user_id).label("user_id"), literal(course_id).label("course_id")).subquery()
+    else:
+        pairs = union(
+            scoped(select(models.Enrolment.user_id, models.Enrolment.course_id), models.Enrolment.user_id, models.Enrolment.course_id),
+            scoped(
+                select(qr.user_id, models.Module.course_id).join(models.Module, models.Module.id == qr.module_id),
+                qr.user_id, models.Module.course_id,
+            ),
+            scoped(select(qr.user_id, qr.course_id).where(qr.course_id.is_not(None)), qr.user_id, qr.course_id),
+        ).subquery()
+
+    # Best attempt per module, so duplicate result rows can't inflate the counts
+    per_module = scoped(
+        select(qr.user_id, models.Module.course_id, qr.module_id, func.max(_pct()).label("pct"))
+        .join(models.Module, models.Module.id == qr.module_id)
+        .group_by(qr.user_id, models.Module.course_id, qr.module_id),
+        qr.user_id, models.Module.course_id,
+    ).subquery()
+
+    module_stats = (
+        select(
+            per_module.c.user_id,
+            per_module.c.course_id,
+            func.count().label("completed_modules"),
+            func.coalesce(func.sum(per_module.c.pct), 0.0).label("module_score_sum"),
+            # Modules without questions have no percentage and stay out of the average
+            func.count(per_module.c.pct).label("scored_modules"),
+        )
+        .group_by(per_module.c.user_id, per_module.c.course_id)
+        .subquery()
+    )
+
+    final_stats = scoped(
+        select(qr.user_id, qr.course_id, func.max(func.coalesce(_pct(), 0.0)).label("final_score"))
+        .where(qr.course_id.is_not(None))
+        .group_by(qr.user_id, qr.course_id),
+        qr.user_id, qr.course_id,
+    ).subquery()
+
+    totals = select(models.Module.course_id, func.count(models.Module.id).label("total_modules")).group_by(models.Module.course_id)
+    if course_id is not None:
+        totals = totals.where(models.Module.course_id == course_id)
+    totals = totals.subquery()
+
+    return (
+        select(
+            pairs.c.user_id,
+            pairs.c.course_id,
+            func.coalesce(module_stats.c.completed_modules, 0),
+            func.coalesce(totals.c.total_modules, 0),
+            func.coalesce(module_stats.c.module_score_sum, 0.0),
+            func.coalesce(module_stats.c.scored_modules, 0),
+            final_stats.c.final_score,
+            literal(datetime.utcnow()),
+        )
+        .select_from(pairs)
+        .outerjoin(module_stats, (module_stats.c.user_id == pairs.c.user_id) & (module_stats.c.course_id == pairs.c.course_id))
+        .outerjoin(final_stats, (final_stats.c.user_id == pairs.c.user_id) & (final_stats.c.course_id == pairs.c.course_id))
+        .outerjoin(totals, totals.c.course_id == pairs.c.course_id)
+        # SQLite needs a WHERE on INSERT ... SELECT ... ON CONFLICT to parse the upsert
+        .where(true())
+    )
+
+
+def _upsert(db, select_stmt):
+    table = models.CourseProgress.__table__
+    columns = ["user_id", "course_id", "completed_modules", "total_modules", "module_score_sum", "scored_modules", "final_score", "updated_at"]
+    stmt = database.dialect_insert(table).from_select(columns, select_stmt)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "course_id"],
+        set_={c: stmt.excluded[c] for c in columns[2:]},
+    )
+    return db.execute(stmt)
+
+
+def refresh(db, user_id, course_id):
+    """Recompute one learner's row after a submission. Does not commit."""
+    if course_id is None:
+        return None
+    _upsert(db, _progress_select(user_id=user_id, course_id=course_id))
+    return db.get(models.CourseProgress, (user_id, course_id), populate_existing=True)
+
+
+def rebuild(db, course_id=None):
+    """Recompute every row of a course, or of the whole database. Does not commit."""
+    _upsert(db, _progress_select(course_id=course_id))
+
+
+def delete_course(db, course_id):
+    db.query(models.CourseProgress).filter(models.CourseProgress.course_id == course_id).delete(synchronize_session=False)
+
+
+def for_learner(db, user_id, course_ids=None):
+    """{course_id: CourseProgress} for a learner, from one indexed lookup."""
+    query = db.query(models.CourseProgress).filter(models.CourseProgress.user_id == user_id)
+    if course_ids is not None:
+        query = query.filter(models.CourseProgress.course_id.in_(course_ids))
+    return {p.course_id: p for p in query}
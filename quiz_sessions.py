@@ -0,0 +1,216 @@
+"""
+Server-side state for adaptive assessments.
+
+/adaptive/start creates a session and returns its id; every /adaptive/next
+call then carries just that id, the id of the question being answered
+and the answer. The session holds the
+answered question ids and answers, the answered bitset over the course's
+QuestionBank, the current question and the IRT ability posterior (irt.py),
+so a step is a constant amount of work however long the quiz runs, and
+/submit grades what the server recorded instead of client-supplied
+question ids.
+
+Sessions live in an in-process LRU with a TTL. Set SESSION_REDIS_URL
+(or "fake://" for the in-memory FakeRedis) to keep them in a shared store
+so any worker can serve the next step.
+
+A step reads the session, checks it against the question being answered
+and writes it back. step() serialises that per session: a local lock, plus
+a SET NX lock key in the shared store, so two concurrent requests (on one
+worker or several) cannot both record the same answer.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import cache
+import irt
+
+logger = logging.getLogger("edweb.quiz_sessions")
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "7200"))
+SESSION_LOCAL_SIZE = int(os.getenv("SESSION_LOCAL_SIZE", "10000"))
+# Expiry of a step lock in the shared store; outlasts a step that waits for the LLM
+SESSION_LOCK_SECONDS = int(os.getenv("SESSION_LOCK_SECONDS", "150"))
+
+
+class SessionBusy(Exception):
+    """Another request is working on the same session step."""
+
+
+class AdaptiveSession:
+    def __init__(self, session_id, user_id, course_id, current_id=None, ability=0.0, standard_error=None,
+                 log_posterior=None, question_ids=None, answers=None, correct=0, bank_version=None, answered_bits=0):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.course_id = course_id
+        self.current_id = current_id
+        self.ability = ability
+        self.standard_error = standard_error
+        # Log posterior of the ability over irt.THETA_GRID; None until the first answer
+        self.log_posterior = log_posterior
+        self.question_ids = question_ids or []
+        self.answers = answers or []
+        self.correct = correct
+        self.bank_version = bank_version
+        self.answered_bits = answered_bits
+
+    @property
+    def finished(self):
+        return self.current_id is None
+
+    @property
+    def difficulty(self):
+        """Difficulty label matching the current ability, for newly generated questions."""
+        return irt.difficulty_label(self.ability)
+
+    @property
+    def converged(self):
+        return irt.should_stop(len(self.question_ids), self.standard_error)
+
+    def bits_for(self, bank):
+        """Answered bitset for this bank; rebuilt only if the bank changed since the last step."""
+        if self.bank_version != bank.key.version:
+            self.answered_bits = bank.answered_bits(self.question_ids)
+            self.bank_version = bank.key.version
+        return self.answered_bits
+
+    def record(self, bank, answer, is_correct):
+        """Store the answer to the current question and update the ability estimate."""
+        bits = self.bits_for(bank)
+        position = bank.key.position.get(self.current_id)
+        self.question_ids.append(self.current_id)
+        self.answers.append(answer)
+        if is_correct:
+            self.correct += 1
+
+        # A question deleted since it was served still counts as answered but carries no information
+        if position is not None:
+            self.answered_bits = bits | 1 << position
+            log_posterior, self.ability, self.standard_error = bank.items.update(self.log_posterior, position, is_correct)
+            self.log_posterior = log_posterior.tolist()
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "course_id": self.course_id,
+            "current_id": self.current_id,
+            "ability": self.ability,
+            "standard_error": self.standard_error,
+            "log_posterior": self.log_posterior,
+            "question_ids": self.question_ids,
+            "answers": self.answers,
+            "correct": self.correct,
+            "bank_version": self.bank_version,
+            # Hex keeps arbitrarily large bitsets JSON-safe
+            "answered_bits": format(self.answered_bits, "x"),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["question_ids"] = list(data.get("question_ids") or [])
+        data["answers"] = list(data.get("answers") or [])
+        data["answered_bits"] = int(data.get("answered_bits") or "0", 16)
+        return cls(**data)
+
+
+class SessionStore:
+    def __init__(self, shared=None, local_size=SESSION_LOCAL_SIZE, ttl=SESSION_TTL_SECONDS, prefix="edweb:adaptive"):
+        self.local = cache.LRUCache(maxsize=local_size, ttl=ttl)
+        self.shared = shared
+        self.ttl = ttl
+        self.prefix = prefix
+        self._busy = set()
+        self._busy_lock = threading.Lock()
+
+    def _key(self, session_id):
+        return f"{self.prefix}:{session_id}"
+
+    @contextmanager
+    def step(self, session_id):
+        """Hold a session for one read-check-write step; raises SessionBusy if another request has it."""
+        with self._busy_lock:
+            if session_id in self._busy:
+                raise SessionBusy(session_id)
+            self._busy.add(session_id)
+        lock_key, token = f"{self._key(session_id)}:lock", uuid.uuid4().hex
+        locked = False
+        try:
+            if self.shared is not None:
+                try:
+                    locked = self.shared.set(lock_key, token, nx=True, ex=SESSION_LOCK_SECONDS)
+                except Exception as e:
+                    logger.warning("Session store unavailable (%s); step locked locally only.", e)
+                else:
+                    if not locked:
+                        raise SessionBusy(session_id)
+            yield
+        finally:
+            if locked:
+                try:
+                    # Only release our own lock, not one taken after ours expired
+                    if self.shared.get(lock_key) == token.encode():
+                        self.shared.delete(lock_key)
+                except Exception as e:
+                    logger.warning("Session store unavailable (%s); step lock left to expire.", e)
+            with self._busy_lock:
+                self._busy.discard(session_id)
+
+    def create(self, user_id, course_id, question):
+        session = AdaptiveSession(
+            session_id=uuid.uuid4().hex,
+            user_id=user_id,
+            course_id=course_id,
+            current_id=question["id"],
+        )
+        self.save(session)
+        return session
+
+    def get(self, session_id):
+        if self.shared is not None:
+            # The shared store is authoritative: another worker may have served the last step
+            try:
+                raw = self.shared.get(self._key(session_id))
+            except Exception as e:
+                logger.warning("Session store unavailable (%s); using local sessions.", e)
+            else:
+                return AdaptiveSession.from_dict(json.loads(raw)) if raw is not None else None
+        data = self.local.get(session_id)
+        return AdaptiveSession.from_dict(data) if data is not None else None
+
+    def save(self, session):
+        data = session.to_dict()
+        # Serialised before anything is stored: a session that cannot be encoded is a bug, not an outage
+        payload = json.dumps(data)
+        # Stored as plain data so callers never share a mutable session object
+        self.local.set(session.session_id, data)
+        if self.shared is not None:
+            key = self._key(session.session_id)
+            try:
+                self.shared.set(key, payload, ex=self.ttl)
+            except Exception as e:
+                logger.warning("Session store unavailable (%s); session kept locally.", e)
+                # get() trusts the shared tier, so never leave an older copy there
+                try:
+                    self.shared.delete(key)
+                except Exception:
+                    pass
+
+    def delete(self, session_id):
+        self.local.delete(session_id)
+        if self.shared is not None:
+            try:
+                self.shared.delete(self._key(session_id))
+            except Exception as e:
+                logger.warning("Session store unavailable (%s); session removed locally only.", e)
+
+    def clear(self):
+        self.local.clear()
+
+
+store = SessionStore(shared=cache.shared_backend_from_env("SESSION_REDIS_URL"))
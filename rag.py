@@ -2,9 +2,11 @@ import os
 import math
 import logging
 import json
-from datetime import datetime
 from dotenv import load_dotenv
-from groq import Groq
+
+import llm
+import metrics
+import tracing
 
 load_dotenv(override=True)
 logger = logging.getLogger(__name__)
@@ -19,14 +21,22 @@ if GROQ_API_KEY:
 else:
     print("WARNING: GROQ_API_KEY NOT FOUND in environment!")
 
-# Initialize Groq Client
-client = None
-if GROQ_API_KEY:
-    client = Groq(api_key=GROQ_API_KEY)
+# Initialize the LLM client: Groq unless LLM_BACKEND says otherwise (see llm.py)
+client = llm.make_client(api_key=GROQ_API_KEY)
+
+def chat_completion(operation, **kwargs):
+    """client.chat.completions.create, timed into the LLM metrics and traced under `operation`."""
+    attributes = {"gen_ai.operation.name": "chat", "gen_ai.request.model": kwargs.get("model"), "edweb.llm.operation": operation}
+    with metrics.llm_call(operation), tracing.span(f"chat {operation}", tracing.SpanKind.CLIENT, attributes):
+        # The provider (or a local stand-in) can join the trace
+        headers = tracing.inject(dict(kwargs.pop("extra_headers", None) or {}))
+        if headers:
+            kwargs["extra_headers"] = headers
+        return client.chat.completions.create(**kwargs)
 
 def log_debug(msg):
-    with open("rag_debug.log", "a") as f:
-        f.write(f"{datetime.now()}: {msg}\n")
+    # Queued and written by the logging thread (logs.py); off unless LOG_LEVEL=DEBUG
+    logger.debug(msg)
 
 # In-memory vector store
 VECTOR_STORE = None
@@ -40,7 +50,7 @@ def save_index():
     
     os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
     try:
-        with open(INDEX_FILE, "w") as f:
+        with tracing.span("rag.save_index", attributes={"rag.chunks": len(VECTOR_STORE)}), open(INDEX_FILE, "w") as f:
             json.dump(VECTOR_STORE, f)
         log_debug(f"Index persisted to {INDEX_FILE}")
     except Exception as e:
@@ -51,7 +61,7 @@ def load_index():
     global VECTOR_STORE
     if os.path.exists(INDEX_FILE):
         try:
-            with open(INDEX_FILE, "r") as f:
+            with tracing.span("rag.load_index"), open(INDEX_FILE, "r") as f:
                 VECTOR_STORE = json.load(f)
             log_debug(f"Index loaded from {INDEX_FILE} ({len(VECTOR_STORE)} chunks)")
             return True
@@ -97,18 +107,19 @@ def is_indexed():
 def retrieve(query, top_k=3):
     """Retrieve context chunks, loading index from disk if necessary."""
     global VECTOR_STORE
-    if VECTOR_STORE is None:
-        if not load_index():
-            log_debug("Retrieve called but no index found.")
-            return []
-
-    query_emb = get_embedding(query)
-    scored = []
-    for chunk in VECTOR_STORE:
-        score = cosine_similarity(query_emb, chunk["embedding"])
-        scored.append((score, chunk["text"]))
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [text for _, text in scored[:top_k]]
+    with tracing.span("rag.retrieve", attributes={"rag.top_k": top_k}):
+        if VECTOR_STORE is None:
+            if not load_index():
+                log_debug("Retrieve called but no index found.")
+                return []
+
+        query_emb = get_embedding(query)
+        scored = []
+        for chunk in VECTOR_STORE:
+            score = cosine_similarity(query_emb, chunk["embedding"])
+            scored.append((score, chunk["text"]))
+        scored.sort(reverse=True, key=lambda x: x[0])
+        return [text for _, text in scored[:top_k]]
 
 def generate_response(query, context_chunks):
     if not client:
@@ -129,7 +140,8 @@ Explain clearly and simply.
 """
         log_debug(f"Requesting Groq with model: llama-3.1-8b-instant")
         
-        result = client.chat.completions.create(
+        result = chat_completion(
+            "chat",
             model="llama-3.1-8b-instant",
             messages=[
                 {"role": "user", "content": prompt}
@@ -147,8 +159,7 @@ Explain clearly and simply.
         return "AI Error: No response generated by AI."
 
     except Exception as e:
-        print("AI ERROR:", str(e))
-        log_debug(f"AI ERROR: {str(e)}")
+        logger.exception("AI ERROR")
         raise e
 
 def generate_questions(topic, question_type, count=10, difficulty="medium"):
@@ -186,7 +197,8 @@ Each object MUST follow this structure exactly:
 """
         log_debug(f"Generating {count} {question_type} questions for topic: {topic}")
 
-        result = client.chat.completions.create(
+        result = chat_completion(
+            "generate_questions",
             model="llama-3.1-8b-instant",
             messages=[
                 {"role": "system", "content": "You are a helpful educational assistant that generates structured quiz questions in JSON format."},
@@ -214,8 +226,7 @@ Each object MUST follow this structure exactly:
         return []
 
     except Exception as e:
-        print("AI ERROR (Generation):", str(e))
-        log_debug(f"Generation Error: {str(e)}")
+        logger.exception("AI ERROR (Generation)")
         raise e
 
 def generate_single_adaptive_question(topic, difficulty, question_type="mcq", context=""):
@@ -256,7 +267,8 @@ Return a JSON object following this structure exactly:
 """
         log_debug(f"Generating single {difficulty} {question_type} question for topic: {topic}")
 
-        result = client.chat.completions.create(
+        result = chat_completion(
+            "adaptive_question",
             model="llama-3.1-8b-instant",
             messages=[
                 {"role": "system", "content": "You are a professional educational assessment designer."},
@@ -275,7 +287,7 @@ Return a JSON object following this structure exactly:
         return None
 
     except Exception as e:
-        log_debug(f"Adaptive Generation Error: {str(e)}")
+        logger.warning("Adaptive Generation Error: %s", e)
         return None
 
 def clean_speech(text):
@@ -304,7 +316,8 @@ Corrected sentence:"""
 
         log_debug(f"Cleaning speech with strict prompt: {text[:50]}...")
         
-        result = client.chat.completions.create(
+        result = chat_completion(
+            "clean_speech",
             model="llama-3.1-8b-instant",
             messages=[
                 {"role": "user", "content": prompt}
@@ -344,7 +357,6 @@ Corrected sentence:"""
         return text
 
     except Exception as e:
-        print("AI ERROR (Clean Speech):", str(e))
-        log_debug(f"Clean Speech Error: {str(e)}")
+        logger.exception("AI ERROR (Clean Speech)")
         # If parsing or API fails, log error and return original text safely per requirements
         return text
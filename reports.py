@@ -0,0 +1,168 @@
+"""
+Streaming exports for instructor reports.
+
+Each report is one SQL query consumed with yield_per and written
+row-by-row, so memory stays flat however many learners a course has.
+CSV is always available; XLSX needs openpyxl and Parquet needs pyarrow.
+"""
+import csv
+import os
+import tempfile
+
+from sqlalchemy import select, func
+
+import database
+import models
+
+FETCH_SIZE = 1000
+CHUNK_ROWS = 500
+FILE_CHUNK_BYTES = 64 * 1024
+
+PERFORMANCE_HEADER = ["Student Name", "Email", "Progress (%)", "Module Quiz Avg (%)", "Final Assessment Status", "Final Grade (%)"]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ReportFormatUnavailable(Exception):
+    pass
+
+
+def check_format(fmt):
+    """Raise ReportFormatUnavailable if the format is unknown or its library is missing."""
+    if fmt not in FORMATS:
+        raise ReportFormatUnavailable(f"Unsupported report format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    try:
+        if fmt == "xlsx":
+            import openpyxl  # noqa: F401
+        elif fmt == "parquet":
+            import pyarrow  # noqa: F401
+    except ImportError:
+        package = "openpyxl" if fmt == "xlsx" else "pyarrow"
+        raise ReportFormatUnavailable(f"The '{fmt}' format needs the '{package}' package installed on the server")
+
+
+def performance_query(course_id):
+    """One row per enrolled learner, read from the precomputed course_progress table."""
+    return (
+        select(
+            models.User.name,
+            models.User.email,
+            func.coalesce(models.CourseProgress.completed_modules, 0),
+            models.CourseProgress.module_score_sum,
+            models.CourseProgress.scored_modules,
+            models.CourseProgress.final_score,
+        )
+        .select_from(models.Enrolment)
+        .join(models.User, models.User.id == models.Enrolment.user_id)
+        .outerjoin(
+            models.CourseProgress,
+            (models.CourseProgress.user_id == models.Enrolment.user_id) & (models.CourseProgress.course_id == models.Enrolment.course_id),
+        )
+        .where(models.Enrolment.course_id == course_id)
+        .order_by(models.Enrolment.id)
+    )
+
+
+def performance_rows(course_id):
+    """Yield formatted report rows, reading the grouped query in FETCH_SIZE batches."""
+    db = database.SessionLocal()
+    try:
+        total_modules = db.query(func.count(models.Module.id)).filter(models.Module.course_id == course_id).scalar() or 0
+        result = db.execute(performance_query(course_id).execution_options(yield_per=FETCH_SIZE))
+        for name, email, completed, score_sum, scored, final_score in result:
+            progress = (completed / total_modules * 100) if total_modules > 0 else 0
+            module_avg = score_sum / scored if scored else 0
+            yield [
+                name,
+                email,
+                f"{int(progress)}%",
+                f"{int(module_avg)}%",
+                "Completed" if final_score is not None else "Not Attempted",
+                f"{int(final_score)}%" if final_score is not None else "N/A",
+            ]
+    finally:
+        db.close()
+
+
+class _LineBuffer:
+    """csv.writer target that just hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(header)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _stream_file(path):
+    try:
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(FILE_CHUNK_BYTES)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.remove(path)
+
+
+def stream_xlsx(header, rows):
+    # write_only workbooks spill rows to disk as they are appended
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    wb.save(path)
+    yield from _stream_file(path)
+
+
+def stream_parquet(header, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.string()) for name in header])
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= FETCH_SIZE * 10:
+                writer.write_table(pa.Table.from_pylist([dict(zip(header, r)) for r in batch], schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(header, r)) for r in batch], schema=schema))
+    finally:
+        writer.close()
+    yield from _stream_file(path)
+
+
+def stream_performance_report(course_id, fmt="csv"):
+    rows = performance_rows(course_id)
+    if fmt == "xlsx":
+        return stream_xlsx(PERFORMANCE_HEADER, rows)
+    if fmt == "parquet":
+        return stream_parquet(PERFORMANCE_HEADER, rows)
+    return stream_csv(PERFORMANCE_HEADER, rows)
@@ -0,0 +1,60 @@
+"""
+Per-question rows for quiz submissions (question_responses).
+
+QuizResult keeps the submitted answers as JSON for the review screens; every
+submission also appends one question_responses row per answered question,
+graded with the compiled answer key and written in a single bulk INSERT, so
+question-level analytics and history are indexed SQL instead of parsing
+every result's JSON.
+
+MCQ answers are stored as chosen_index; descriptive answers as a short hash
+of the normalised text, enough to group identical answers without keeping
+free text twice.
+"""
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import models
+
+
+def answer_hash(answer):
+    return hashlib.sha1(str(answer).strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+def build_rows(result_id, user_id, key, positions, answers, answered_at):
+    """question_responses rows for answers[i] given to the question at key position positions[i]."""
+    rows = []
+    for order, (p, answer) in enumerate(zip(positions, answers or ())):
+        if p is None:
+            continue
+        qid = key.question_ids[p]
+        chosen, hashed = None, None
+        if key.mcq[p]:
+            try:
+                chosen = int(answer)
+            except (ValueError, TypeError):
+                pass
+        else:
+            hashed = answer_hash(answer)
+        rows.append({
+            "result_id": result_id,
+            "user_id": user_id,
+            "question_id": qid,
+            "position": order,
+            "chosen_index": chosen,
+            "answer_hash": hashed,
+            "is_correct": key.is_correct(qid, answer),
+            "answered_at": answered_at,
+        })
+    return rows
+
+
+def record(db, result_id, user_id, key, positions, answers, answered_at=None):
+    """Append the responses of one submission. Does not commit."""
+    rows = build_rows(result_id, user_id, key, positions, answers, answered_at or datetime.utcnow())
+    if rows:
+        db.execute(insert(models.QuestionResponse), rows)
+    return len(rows)
+
@@ -84,26 +84,46 @@ class CourseResponse(CourseBase):
     id: int
     instructor_id: int
     created_at: datetime
-    enrolledStudents: List[int] = pydantic.Field(default=[], validation_alias=pydantic.AliasChoices("enrolledStudents", "enrolments"))
+    enrolledCount: int = pydantic.Field(default=0, validation_alias=pydantic.AliasChoices("enrolledCount", "enrolment_count"))
+    isEnrolled: bool = False
     modules: Optional[List[Module]] = []
     assessment: Optional[List[Question]] = []
     instructor: Optional[UserResponse] = None
     progress: Optional[int] = 0
 
-    @pydantic.field_validator("enrolledStudents", mode="before")
-    @classmethod
-    def map_enrolments(cls, v, info):
-        # If the input is a list of Enrolment objects (from ORM), extract user_ids
-        if isinstance(v, list) and v and not isinstance(v[0], int):
-            try:
-                # Check if it's an Enrolment object by looking for user_id attribute
-                return [getattr(e, 'user_id', e) for e in v if hasattr(e, 'user_id') or isinstance(e, int)]
-            except:
-                return v
-        return v
-
     model_config = {"from_attributes": True}
 
+# ---------------- ROSTER ----------------
+
+class RosterEntry(BaseModel):
+    enrolment_id: int
+    id: int
+    name: Optional[str] = None
+    email: str
+    enrolled_at: Optional[datetime] = None
+    accessibility_enabled: Optional[bool] = False
+
+class RosterPage(BaseModel):
+    students: List[RosterEntry]
+    total: int
+    next_after: Optional[int] = None   # pass back as ?after= to fetch the next page
+
+class BulkEnrolmentRequest(BaseModel):
+    user_ids: List[int] = []
+    emails: List[str] = []
+
+class BulkEnrolmentRow(BaseModel):
+    user_id: Optional[int] = None
+    email: Optional[str] = None
+    status: str   # enrolled / already_enrolled / not_found / not_a_learner / duplicate
+
+class BulkEnrolmentResult(BaseModel):
+    enrolled: int
+    already_enrolled: int
+    duplicates: int
+    failed: int
+    results: List[BulkEnrolmentRow]
+
 # ---------------- UPDATE SCHEMAS ----------------
 
 class QuestionUpdate(BaseModel):
@@ -172,15 +192,29 @@ class QuizResultResponse(QuizResultBase):
     correctCount: Optional[int] = None
     model_config = {"from_attributes": True}
 
+class QuestionStatResponse(BaseModel):
+    question_id: int
+    questionText: Optional[str] = None
+    module_id: Optional[int] = None
+    difficulty: Optional[str] = None
+    responses: int
+    p_value: Optional[float] = None
+    discrimination: Optional[float] = None
+    option_counts: Optional[List[int]] = None
+    invalid_answers: int = 0
+    analysed_at: Optional[datetime] = None
+
 class AdaptiveNextRequest(BaseModel):
-    answered_ids: List[int]
-    last_answer: Any
-    last_difficulty: str
+    session_id: str
+    answer: Any = None
+    # Id of the question being answered; a stale or repeated step is rejected
+    question_id: int
 
 class QuizSubmitRequest(BaseModel):
-    answers: List[Any]
+    answers: Optional[List[Any]] = []
     is_adaptive: Optional[bool] = False
-    question_ids: Optional[List[int]] = None
+    # Adaptive attempts are graded from the server-side session
+    session_id: Optional[str] = None
 
 
 # ---------------- PASSWORD RESET ----------------
@@ -248,13 +282,19 @@ class BatchBase(BaseModel):
 class BatchCreate(BatchBase):
     pass
 
-class Batch(BatchBase):
+class BatchSummary(BatchBase):
     id: int
     instructor_id: int
-    students: List[UserResponse] = []
     created_at: datetime
+    course_title: Optional[str] = None
+    member_count: int = 0
     model_config = {"from_attributes": True}
 
+class BatchMemberPage(BaseModel):
+    students: List[UserResponse]
+    total: int
+    next_after: Optional[int] = None   # pass back as ?after= to fetch the next page
+
 class AIGenerateRequest(BaseModel):
     topic: str
     questionType: str = "mcq"   # mcq / descriptive
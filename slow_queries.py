@@ -0,0 +1,227 @@
+"""
+Opt-in slow-query log with query plans.
+
+With SLOW_QUERY_MS set, install() hooks the engine's cursor events. Every
+statement slower than the threshold is logged (edweb.slow_query) with its
+normalised template, the shape of its bound parameters, its duration and
+the route being served, and folded into a per-template aggregate.
+
+The first time a template is slow, its plan (EXPLAIN QUERY PLAN on SQLite,
+EXPLAIN on PostgreSQL) is captured by a background thread on its own
+connection, so the request that ran the statement never waits for it.
+Plans that scan whole tables or sort through a temporary b-tree are
+flagged in the report (GET /debug/slow-queries, and SLOW_QUERY_REPORT
+written at shutdown).
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+import metrics
+
+logger = logging.getLogger("edweb.slow_query")
+
+THRESHOLD_MS = os.getenv("SLOW_QUERY_MS")
+REPORT_FILE = os.getenv("SLOW_QUERY_REPORT", "logs/slow_queries.json")
+
+# Plans waiting for the explain thread; more are dropped, not buffered
+QUEUE_SIZE = 1000
+# Distinct shapes / routes kept per template
+MAX_VARIANTS = 10
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def template(statement):
+    """Statement with whitespace collapsed, literals replaced by ? and IN (?, ?, ...) lists folded."""
+    text = _WHITESPACE.sub(" ", statement).strip()
+    text = _NUMBER.sub("?", _STRING.sub("?", text))
+    return _IN_LIST.sub("(?...)", text)
+
+
+def parameter_shape(parameters, executemany=False):
+    """Types of the bound parameters, e.g. "(int, str)", without their values."""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {parameter_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in (parameters or ())) + ")"
+
+
+def plan_flags(plan):
+    """Warnings for a captured plan: full table scans and temporary sort / group b-trees."""
+    flags = []
+    for line in plan or ():
+        # SQLite: SCAN visits every row (of the table or of an index), SEARCH seeks
+        if line.startswith("SCAN "):
+            flags.append(f"full scan: {line[5:]}")
+        elif "Seq Scan" in line:
+            flags.append(f"full scan: {line.strip()}")
+        elif "USE TEMP B-TREE" in line:
+            flags.append(line.lower())
+    return flags
+
+
+class _Template:
+    __slots__ = ("statement", "count", "total_ms", "max_ms", "shapes", "routes", "plan")
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.shapes = {}
+        self.routes = {}
+        self.plan = None
+
+    def add(self, ms, shape, route):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for variants, key in ((self.shapes, shape), (self.routes, route)):
+            if key in variants or len(variants) < MAX_VARIANTS:
+                variants[key] = variants.get(key, 0) + 1
+
+
+class SlowQueryLog:
+    def __init__(self, engine, threshold_ms):
+        self.engine = engine
+        self.threshold_ms = float(threshold_ms)
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._plans = queue.Queue(QUEUE_SIZE)
+        self._explainer = None
+
+    # --- engine events ---
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        # The explain thread's own statements are not candidates
+        if context is not None and not context.execution_options.get("slow_query_explain"):
+            context._slow_query_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None:
+            return
+        ms = (time.perf_counter() - started) * 1000
+        if ms >= self.threshold_ms:
+            self.record(statement, parameters, ms, executemany)
+
+    def install(self):
+        event.listen(self.engine, "before_cursor_execute", self._before)
+        event.listen(self.engine, "after_cursor_execute", self._after)
+        return self
+
+    def uninstall(self):
+        event.remove(self.engine, "before_cursor_execute", self._before)
+        event.remove(self.engine, "after_cursor_execute", self._after)
+
+    # --- recording ---
+
+    def record(self, statement, parameters, ms, executemany=False):
+        key = template(statement)
+        shape = parameter_shape(parameters, executemany)
+        route = metrics.current_route() or "-"
+        with self._lock:
+            entry = self._templates.get(key)
+            first = entry is None
+            if first:
+                entry = self._templates[key] = _Template(key)
+            entry.add(ms, shape, route)
+        logger.warning("Slow query (%.1f ms): %s", ms, key, extra={"duration_ms": round(ms, 3), "parameter_shape": shape, "route": route})
+        if first and statement.lstrip().upper().startswith(_EXPLAINABLE):
+            sample = list(parameters)[0] if executemany and parameters else parameters
+            self._queue_plan(key, statement, sample)
+
+    def _queue_plan(self, key, statement, parameters):
+        try:
+            self._plans.put_nowait((key, statement, parameters))
+        except queue.Full:
+            return
+        if self._explainer is None:
+            self._explainer = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+            self._explainer.start()
+
+    def _explain_loop(self):
+        prefix = "EXPLAIN " if self.engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN "
+        while True:
+            key, statement, parameters = self._plans.get()
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execution_options(slow_query_explain=True).exec_driver_sql(prefix + statement, parameters or ()).fetchall()
+                plan = [str(row[-1]) for row in rows]
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            with self._lock:
+                entry = self._templates.get(key)
+                if entry is not None:
+                    entry.plan = plan
+            self._plans.task_done()
+
+    def wait_for_plans(self):
+        """Block until every queued plan has been captured."""
+        self._plans.join()
+
+    # --- reporting ---
+
+    def report(self):
+        """Per-template aggregates, most total time first."""
+        with self._lock:
+            entries = sorted(self._templates.values(), key=lambda e: e.total_ms, reverse=True)
+            return [
+                {
+                    "template": e.statement,
+                    "count": e.count,
+                    "total_ms": round(e.total_ms, 3),
+                    "mean_ms": round(e.total_ms / e.count, 3),
+                    "max_ms": round(e.max_ms, 3),
+                    "parameter_shapes": dict(e.shapes),
+                    "routes": dict(e.routes),
+                    "plan": e.plan,
+                    "warnings": plan_flags(e.plan),
+                } for e in entries
+            ]
+
+    def save_report(self, path=REPORT_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"threshold_ms": self.threshold_ms, "queries": self.report()}, f, indent=2)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+# The process-wide recorder, None unless enabled
+recorder = None
+
+
+def install(engine, threshold_ms=None):
+    """Start recording slow statements on engine (SLOW_QUERY_MS by default). Returns the recorder or None."""
+    global recorder
+    threshold_ms = THRESHOLD_MS if threshold_ms is None else threshold_ms
+    if threshold_ms in (None, ""):
+        return None
+    if recorder is None:
+        recorder = SlowQueryLog(engine, threshold_ms).install()
+    return recorder
+
+
+def uninstall():
+    global recorder
+    if recorder is not None:
+        recorder.uninstall()
+        recorder = None
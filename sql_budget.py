@@ -0,0 +1,154 @@
+"""
+Test-time SQL statement budgets and N+1 detection for API routes.
+
+capture() records every statement the engine sends while a block runs.
+build_dataset() fills the (test) database with a generated dataset whose
+size grows with `scale`. check() compares the statement count of each route
+at a small and a large scale: a route whose count grows with the data, or
+exceeds its declared budget, fails with its most repeated statement
+templates, which is where an N+1 shows up.
+
+Used by test_sql_budgets.py; SQL_BUDGET_SCALE sets the large scale.
+"""
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event, insert
+
+import auth
+import cache
+import database
+import models
+import slow_queries
+
+# A route, its path (formatted with the dataset's ids), who calls it and its statement budget
+Route = namedtuple("Route", "name method path actor budget")
+
+# Statements are grouped the same way as in the slow-query log
+template = slow_queries.template
+
+
+class StatementLog:
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def templates(self):
+        return Counter(template(s) for s in self.statements)
+
+    def repeated(self, min_count=2):
+        return [(t, n) for t, n in self.templates().most_common() if n >= min_count]
+
+    def report(self, limit=3):
+        lines = []
+        for t, n in self.repeated()[:limit]:
+            lines.append(f"    {n}x {t[:200]}")
+        return "\n".join(lines) or "    (no repeated statements)"
+
+
+@contextmanager
+def capture(engine=None):
+    engine = engine or database.engine
+    log = StatementLog()
+    event.listen(engine, "before_cursor_execute", log._record)
+    try:
+        yield log
+    finally:
+        event.remove(engine, "before_cursor_execute", log._record)
+
+
+def _headers(email):
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': email})}"}
+
+
+def build_dataset(db, scale):
+    """
+    Generate a dataset that grows with scale and commit it. The main instructor
+    owns `scale` courses (each with `scale` modules and assessment questions);
+    `scale` more courses have an instructor each. 2 * scale learners are
+    enrolled everywhere, with progress, module and final results, certificates
+    and batch memberships. Returns the ids and auth headers routes need.
+    """
+    now = datetime.utcnow()
+    instructors = [models.User(name=f"inst{i}", email=f"budget_inst{i}@example.com", password="x", role="instructor") for i in range(scale + 1)]
+    learners = [models.User(name=f"learner{i}", email=f"budget_learner{i}@example.com", password="x", role="learner") for i in range(2 * scale)]
+    db.add_all(instructors + learners)
+    db.flush()
+
+    owners = [instructors[0]] * scale + instructors[1:]
+    courses = [models.Course(title=f"Course {i}", description="D", instructor_id=owner.id, enrolment_count=len(learners)) for i, owner in enumerate(owners)]
+    db.add_all(courses)
+    db.flush()
+
+    for course in courses:
+        for m in range(scale):
+            module = models.Module(title=f"M{m}", course_id=course.id)
+            module.quiz = [models.Question(questionText="q", correctOptionIndex=0, options=[models.QuestionOption(text=t) for t in "abc"]) for _ in range(2)]
+            db.add(module)
+        db.add_all(models.Question(questionText="a", course_id=course.id, correctOptionIndex=1, options=[models.QuestionOption(text=t) for t in "abc"]) for _ in range(scale))
+    db.flush()
+
+    main_course = courses[0]
+    module_ids = [m.id for m in db.query(models.Module.id).filter(models.Module.course_id == main_course.id)]
+    db.execute(insert(models.Enrolment), [{"user_id": l.id, "course_id": c.id} for l in learners for c in courses])
+    db.execute(insert(models.CourseProgress), [
+        {"user_id": l.id, "course_id": c.id, "completed_modules": scale, "total_modules": scale, "module_score_sum": 80.0 * scale, "scored_modules": scale, "final_score": 75.0}
+        for l in learners for c in courses
+    ])
+    db.execute(insert(models.QuizResult), [
+        {"user_id": l.id, "module_id": mid, "score": 1, "total_questions": 2, "answers": [0, 0], "completed_at": now}
+        for l in learners for mid in module_ids
+    ] + [
+        {"user_id": l.id, "course_id": main_course.id, "score": 1, "total_questions": scale, "answers": [1] * scale, "completed_at": now}
+        for l in learners
+    ])
+    db.execute(insert(models.Certificate), [
+        {"user_id": l.id, "course_id": c.id, "certificate_code": f"CERT-{l.id}-{c.id}", "issued_at": now}
+        for l in learners for c in courses
+    ])
+
+    batches = [models.Batch(name=f"Batch {i}", course_id=courses[i % len(courses)].id, instructor_id=instructors[0].id) for i in range(scale)]
+    db.add_all(batches)
+    db.flush()
+    db.execute(insert(models.batch_students), [{"batch_id": b.id, "student_id": l.id} for b in batches for l in learners])
+    db.commit()
+
+    return {
+        "course_id": main_course.id,
+        "instructor": _headers(instructors[0].email),
+        "learner": _headers(learners[0].email),
+    }
+
+
+def measure(client, routes, dataset):
+    """Statement log of one cold (uncached) call per route."""
+    logs = {}
+    for route in routes:
+        cache.response_cache.clear()
+        with capture() as log:
+            resp = client.request(route.method, route.path.format(**dataset), headers=dataset[route.actor])
+            resp.read()
+        assert resp.status_code == 200, f"{route.name}: HTTP {resp.status_code} {resp.text[:200]}"
+        logs[route.name] = log
+    return logs
+
+
+def check(routes, small, large):
+    """Failure messages for routes over budget or whose statement count grows with the data."""
+    failures = []
+    for route in routes:
+        before, after = small[route.name], large[route.name]
+        problems = []
+        if len(after) > len(before):
+            problems.append(f"statement count grows with the data ({len(before)} -> {len(after)})")
+        if len(after) > route.budget:
+            problems.append(f"{len(after)} statements, budget is {route.budget}")
+        if problems:
+            failures.append(f"{route.name}: {'; '.join(problems)}\n{after.report()}")
+    return failures
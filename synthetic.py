@@ -0,0 +1,422 @@
+"""
+Deterministic synthetic datasets for load and performance testing.
+
+generate() fills an empty database with instructors, courses (modules, quiz
+and assessment questions, options) and learners who enrol, work through the
+module quizzes, sit final assessments and receive what the award jobs would
+give them: badges, tier batches, certificates and notifications. Learners
+also message their instructors. Derived data is written consistent with the
+app: course_progress matches progress.rebuild(), enrolment_count matches
+the enrolments, tiers come from awards.tier_for().
+
+Answers are drawn per learner ability and question difficulty, so scores,
+p-values and distractor counts look like real cohorts. Every part of the
+dataset has its own random.Random stream seeded from `seed`: the same seed
+and scale give the same rows (only the bcrypt salt of the shared password
+hash differs), and changing one count leaves the other tables alone. Ids
+are assigned here, so foreign keys are computed instead of read back, and
+rows go out in multi-row INSERTs of CHUNK_SIZE inside a single transaction.
+
+Presets (rows, roughly): tiny 2k, small 150k, medium 1.3M, large 12M.
+See generate_data.py for the command line.
+"""
+import math
+import random
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text, update
+
+import auth
+import awards
+import models
+import responses
+
+CHUNK_SIZE = 5000
+
+Scale = namedtuple("Scale", [
+    "instructors", "learners", "courses",
+    "modules_per_course", "questions_per_module", "options_per_question", "assessment_questions",
+    "enrolments_per_learner",  # mean; popular courses get more (Zipf)
+    "module_completion",  # chance a learner goes on to the next module
+    "final_attempt_rate",  # chance a learner who finished every module sits the final assessment
+    "notifications_per_user", "messages_per_learner",  # means
+    "descriptive_share",  # share of descriptive (free-text) questions
+    "responses",  # also write question_responses rows
+])
+
+PRESETS = {
+    "tiny": Scale(3, 40, 6, 3, 3, 4, 5, 3, 0.8, 0.6, 2, 1, 0.1, True),
+    "small": Scale(20, 2000, 100, 5, 4, 4, 8, 4, 0.8, 0.6, 3, 2, 0.1, True),
+    "medium": Scale(200, 20000, 1000, 8, 5, 4, 10, 8, 0.8, 0.6, 3, 2, 0.1, False),
+    "large": Scale(2000, 200000, 10000, 8, 5, 4, 10, 8, 0.8, 0.6, 3, 2, 0.1, False),
+}
+
+PASSWORD = "password123"
+START = datetime(2024, 1, 1)
+MINUTES_PER_YEAR = 365 * 24 * 60
+# Course popularity: the course of rank r is chosen with weight 1 / r ** ZIPF_EXPONENT
+ZIPF_EXPONENT = 0.9
+# Answering: P(correct) = GUESS + (1 - GUESS) * logistic(1.7 * (ability - difficulty))
+GUESS = 0.2
+BLANK_RATE = 0.02
+PASS_PERCENTAGE = 50
+# Batch names awards.tier_for() hands out
+TIERS = ("Bronze", "Silver", "Gold", "Diamond")
+
+TOPICS = ["Python", "SQL", "Statistics", "Machine Learning", "Web Development", "Data Structures", "Algorithms",
+          "Networking", "Cloud Computing", "Cyber Security", "UX Design", "Linear Algebra", "Calculus", "Economics"]
+LEVELS = ["Foundations", "Essentials", "in Practice", "Deep Dive", "for Beginners", "Advanced"]
+WORDS = ["index", "query", "cache", "latency", "vector", "gradient", "schema", "tensor", "thread", "packet",
+         "matrix", "cluster", "sample", "model", "kernel", "function", "variable", "pointer", "stack", "graph"]
+NOTIFICATIONS = [("Welcome!", "Welcome to EdWeb", "info"), ("New module", "A new module was published", "info"),
+                 ("Deadline", "Your assessment closes soon", "warning"), ("Streak", "Five days in a row!", "success")]
+
+
+def _rng(seed, part):
+    # str seeds are hashed with SHA-512: stable across runs and Python versions
+    return random.Random(f"{seed}:{part}")
+
+
+def _minutes(rng, low, high):
+    return timedelta(minutes=rng.randrange(low, high))
+
+
+def _certificate_code(certificate_id):
+    # Multiplying by an odd constant is a bijection mod 2**32: unique, random-looking codes
+    return f"CERT-{certificate_id * 2654435761 % 2 ** 32:08X}"
+
+
+def estimate(scale):
+    """Approximate row count of a scale, for progress messages."""
+    questions = scale.courses * (scale.modules_per_course * scale.questions_per_module + scale.assessment_questions)
+    enrolments = scale.learners * scale.enrolments_per_learner
+    p = scale.module_completion
+    modules_done = sum(p ** (k + 1) for k in range(scale.modules_per_course))
+    results = enrolments * modules_done
+    answered = results * scale.questions_per_module if scale.responses else 0
+    users = scale.instructors + scale.learners
+    return int(users + questions * (1 + scale.options_per_question * (1 - scale.descriptive_share))
+               + 2 * enrolments + results + answered + users * scale.notifications_per_user
+               + scale.learners * scale.messages_per_learner + enrolments * p ** scale.modules_per_course * 4)
+
+
+class _Writer:
+    """Buffers rows per table and flushes them, parents first, in multi-row INSERTs."""
+
+    def __init__(self, conn, chunk_size):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.pending = {}
+        self.counts = Counter()
+        self._order = {table: i for i, table in enumerate(models.Base.metadata.sorted_tables)}
+
+    def add(self, table, row):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        # Foreign keys are checked on PostgreSQL, so referenced tables go first
+        for table in sorted(self.pending, key=self._order.get):
+            rows = self.pending[table]
+            if rows:
+                self.conn.execute(insert(table), rows)
+                self.counts[table.name] += len(rows)
+        self.pending = {}
+
+
+class _Catalogue:
+    """Courses, modules and questions, with what answering needs kept in memory."""
+
+    def __init__(self, writer, rng, scale, instructor_ids, password):
+        self.scale = scale
+        self.instructor_of = {}
+        self.title_of = {}
+        self.modules_of = {}
+        self.assessment_of = {}
+        self.questions_of = {}
+        # Per question id: correct option (None if descriptive), expected text, difficulty
+        self.correct = {}
+        self.key_text = {}
+        self.difficulty = {}
+
+        tables = models.Base.metadata.tables
+        for uid in instructor_ids:
+            writer.add(tables["users"], {
+                "id": uid, "name": f"Instructor {uid}", "email": f"instructor{uid}@synthetic.edweb", "password": password,
+                "role": "instructor", "created_at": START - _minutes(rng, 1, MINUTES_PER_YEAR),
+            })
+
+        module_id = question_id = option_id = 0
+        for course_id in range(1, scale.courses + 1):
+            instructor = rng.choice(instructor_ids)
+            title = f"{rng.choice(TOPICS)} {rng.choice(LEVELS)} {course_id}"
+            self.instructor_of[course_id], self.title_of[course_id] = instructor, title
+            writer.add(tables["courses"], {
+                "id": course_id, "title": title, "description": f"Learn {title.lower()} step by step.",
+                "price": rng.choice([0.0, 0.0, 19.0, 49.0]), "status": "Published", "instructor_id": instructor,
+                "created_at": START + _minutes(rng, 0, MINUTES_PER_YEAR // 4), "enrolment_count": 0,
+            })
+            modules = []
+            for m in range(scale.modules_per_course):
+                module_id += 1
+                modules.append(module_id)
+                writer.add(tables["modules"], {
+                    "id": module_id, "title": f"Module {m + 1}: {rng.choice(WORDS).title()}s",
+                    "contentLink": f"https://example.com/courses/{course_id}/modules/{m + 1}", "course_id": course_id,
+                })
+                first = question_id + 1
+                for _ in range(scale.questions_per_module):
+                    question_id += 1
+                    option_id = self._question(writer, rng, question_id, option_id, module_id=module_id)
+                self.questions_of[module_id] = range(first, question_id + 1)
+            self.modules_of[course_id] = modules
+            first = question_id + 1
+            for _ in range(scale.assessment_questions):
+                question_id += 1
+                option_id = self._question(writer, rng, question_id, option_id, course_id=course_id)
+            self.assessment_of[course_id] = range(first, question_id + 1)
+
+            # What the award jobs create: one badge per milestone, one batch per tier
+            for suffix, description, icon in (("Graduate", "Completed", "Award"), ("Master", "Mastered", "Star")):
+                writer.add(tables["badges"], {
+                    "id": self.badge_id(course_id, suffix), "name": f"{title} {suffix}",
+                    "description": f"{description} {title}", "icon": icon,
+                })
+            for tier in TIERS:
+                writer.add(tables["batches"], {
+                    "id": self.batch_id(course_id, tier), "name": tier, "course_id": course_id,
+                    "instructor_id": instructor, "created_at": START,
+                })
+
+    def _question(self, writer, rng, question_id, option_id, module_id=None, course_id=None):
+        tables = models.Base.metadata.tables
+        b = rng.gauss(0, 1)
+        label = "easy" if b < -0.5 else "hard" if b > 0.5 else "medium"
+        words = rng.sample(WORDS, 3)
+        row = {
+            "id": question_id, "questionText": f"What does the {words[0]} do to the {words[1]} of a {words[2]}?",
+            "questionType": "mcq", "correctOptionIndex": None, "correctAnswerText": None,
+            "module_id": module_id, "course_id": course_id, "difficulty": label,
+        }
+        self.difficulty[question_id] = b
+        if rng.random() < self.scale.descriptive_share:
+            row["questionType"] = "descriptive"
+            row["correctAnswerText"] = self.key_text[question_id] = f"It changes the {words[1]}"
+            self.correct[question_id] = None
+        else:
+            row["correctOptionIndex"] = self.correct[question_id] = rng.randrange(self.scale.options_per_question)
+        writer.add(tables["questions"], row)
+        for i in range(self.scale.options_per_question if row["questionType"] == "mcq" else 0):
+            option_id += 1
+            writer.add(tables["question_options"], {"id": option_id, "text": f"Option {i + 1}: {rng.choice(WORDS)}", "question_id": question_id})
+        return option_id
+
+    def badge_id(self, course_id, suffix):
+        return 2 * course_id - (suffix == "Graduate")
+
+    def batch_id(self, course_id, tier):
+        return (course_id - 1) * len(TIERS) + TIERS.index(tier) + 1
+
+    def answer(self, rng, ability, question_ids):
+        """(answers, correct flags) of a learner of `ability` for the questions."""
+        answers, correct = [], []
+        for qid in question_ids:
+            p = GUESS + (1 - GUESS) / (1 + math.exp(-1.7 * (ability - self.difficulty[qid])))
+            ok = rng.random() < p
+            key = self.correct[qid]
+            if key is None:
+                answers.append(self.key_text[qid] if ok else f"Something about the {rng.choice(WORDS)}")
+            elif rng.random() < BLANK_RATE:
+                answers.append(None)
+                ok = False
+            elif ok:
+                answers.append(key)
+            else:
+                wrong = rng.randrange(self.scale.options_per_question - 1)
+                answers.append(wrong + (wrong >= key))
+            correct.append(ok)
+        return answers, correct
+
+
+def _is_empty(conn):
+    return conn.execute(select(func.count()).select_from(models.User.__table__)).scalar() == 0
+
+
+def generate(engine, scale, seed=0, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Fill the (empty) database behind engine with the dataset for scale and
+    seed, in one transaction. Returns {table: rows written}. progress, if
+    given, is called with (learners done, rows written so far).
+    """
+    if isinstance(scale, str):
+        scale = PRESETS[scale]
+    models.Base.metadata.create_all(bind=engine)
+    tables = models.Base.metadata.tables
+    password = auth.get_password_hash(PASSWORD)  # one bcrypt hash shared by every user
+
+    with engine.begin() as conn:
+        if not _is_empty(conn):
+            raise ValueError("generate() needs an empty database: ids are assigned by the generator")
+        if engine.dialect.name == "sqlite":
+            # A throwaway load-test database: skip fsyncs while building it
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        writer = _Writer(conn, chunk_size)
+        instructor_ids = list(range(1, scale.instructors + 1))
+        catalogue = _Catalogue(writer, _rng(seed, "catalogue"), scale, instructor_ids, password)
+        writer.flush()
+
+        course_ids = list(range(1, scale.courses + 1))
+        popularity = _rng(seed, "popularity")
+        ranks = list(range(1, scale.courses + 1))
+        popularity.shuffle(ranks)
+        cumulative, total = [], 0.0
+        for rank in ranks:
+            total += 1 / rank ** ZIPF_EXPONENT
+            cumulative.append(total)
+
+        learners = _rng(seed, "learners")
+        social = _rng(seed, "social")
+        ids = Counter()
+
+        def next_id(table):
+            ids[table] += 1
+            return ids[table]
+
+        for n in range(scale.learners):
+            uid = scale.instructors + 1 + n
+            ability = learners.gauss(0, 1)
+            joined = START + _minutes(learners, 0, MINUTES_PER_YEAR)
+            writer.add(tables["users"], {
+                "id": uid, "name": f"Learner {uid}", "email": f"learner{uid}@synthetic.edweb", "password": password,
+                "role": "learner", "created_at": joined,
+            })
+            wanted = min(scale.courses, 1 + learners.randrange(2 * scale.enrolments_per_learner - 1))
+            enrolled_in = set()
+            while len(enrolled_in) < wanted:
+                enrolled_in.add(learners.choices(course_ids, cum_weights=cumulative)[0])
+
+            for course_id in sorted(enrolled_in):
+                at = joined + _minutes(learners, 0, 60 * 24 * 30)
+                writer.add(tables["enrolments"], {
+                    "id": next_id("enrolments"), "user_id": uid, "course_id": course_id, "enrolled_at": at,
+                    "accessibility_enabled": learners.random() < 0.05,
+                })
+                completed, score_sum, final_score = 0, 0.0, None
+                for module_id in catalogue.modules_of[course_id]:
+                    if learners.random() >= scale.module_completion:
+                        break
+                    at += _minutes(learners, 30, 60 * 24 * 7)
+                    questions = catalogue.questions_of[module_id]
+                    answers, correct = catalogue.answer(learners, ability, questions)
+                    result_id = next_id("quiz_results")
+                    writer.add(tables["quiz_results"], {
+                        "id": result_id, "user_id": uid, "module_id": module_id, "course_id": None,
+                        "score": sum(correct), "total_questions": len(questions), "answers": answers,
+                        "question_ids": None, "completed_at": at, "attempt": 1, "submission_key": None,
+                    })
+                    if scale.responses:
+                        _responses(writer, next_id, catalogue, result_id, uid, questions, answers, correct, at)
+                    completed += 1
+                    score_sum += sum(correct) * 100 / len(questions)
+
+                if completed and completed == len(catalogue.modules_of[course_id]):
+                    # award_course_completion: graduate badge and tier batch
+                    _award(writer, next_id, uid, catalogue.badge_id(course_id, "Graduate"), at, "Badge Earned!",
+                           f"Earned '{catalogue.title_of[course_id]} Graduate'", "success")
+                    tier = awards.tier_for(score_sum / completed)
+                    writer.add(tables["batch_students"], {"batch_id": catalogue.batch_id(course_id, tier), "student_id": uid})
+                    writer.add(tables["notifications"], {
+                        "id": next_id("notifications"), "user_id": uid, "title": "Batch Assigned!",
+                        "message": f"Assigned to {tier} batch", "type": "info", "is_read": learners.random() < 0.7, "created_at": at,
+                    })
+                    if learners.random() < scale.final_attempt_rate:
+                        final_score = _final_assessment(writer, next_id, learners, catalogue, uid, course_id, ability, at)
+
+                writer.add(tables["course_progress"], {
+                    "user_id": uid, "course_id": course_id, "completed_modules": completed,
+                    "total_modules": len(catalogue.modules_of[course_id]), "module_score_sum": score_sum,
+                    "scored_modules": completed,
+                    "final_score": final_score, "updated_at": at,
+                })
+
+            for _ in range(social.randrange(2 * scale.notifications_per_user + 1)):
+                title, message, kind = social.choice(NOTIFICATIONS)
+                writer.add(tables["notifications"], {
+                    "id": next_id("notifications"), "user_id": uid, "title": title, "message": message, "type": kind,
+                    "is_read": social.random() < 0.6, "created_at": joined + _minutes(social, 0, MINUTES_PER_YEAR),
+                })
+            teachers = sorted({catalogue.instructor_of[c] for c in enrolled_in})
+            for i in range(social.randrange(2 * scale.messages_per_learner + 1)):
+                teacher = social.choice(teachers)
+                sender, receiver = (uid, teacher) if i % 2 == 0 else (teacher, uid)
+                writer.add(tables["messages"], {
+                    "id": next_id("messages"), "sender_id": sender, "receiver_id": receiver,
+                    "content": f"Question about the {social.choice(WORDS)} in module {social.randrange(1, scale.modules_per_course + 1)}",
+                    "is_read": social.random() < 0.5, "created_at": joined + _minutes(social, 0, MINUTES_PER_YEAR),
+                })
+            if progress is not None and (n + 1) % 1000 == 0:
+                progress(n + 1, sum(writer.counts.values()))
+
+        writer.flush()
+        # Derived from the enrolments just written, as migrate_enrolment_count.py does
+        enrolments = models.Enrolment.__table__
+        conn.execute(update(models.Course.__table__).values(enrolment_count=(
+            select(func.count()).where(enrolments.c.course_id == models.Course.__table__.c.id).scalar_subquery()
+        )))
+        if engine.dialect.name == "postgresql":
+            # Explicit ids leave the sequences behind
+            for table in models.Base.metadata.sorted_tables:
+                if "id" in table.c and table.c.id.autoincrement:
+                    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1)) FROM {table.name}"))
+    return dict(writer.counts)
+
+
+def _responses(writer, next_id, catalogue, result_id, uid, questions, answers, correct, at):
+    for position, (qid, answer, ok) in enumerate(zip(questions, answers, correct)):
+        mcq = catalogue.correct[qid] is not None
+        writer.add(models.QuestionResponse.__table__, {
+            "id": next_id("question_responses"), "result_id": result_id, "user_id": uid, "question_id": qid,
+            "position": position, "chosen_index": answer if mcq else None,
+            "answer_hash": None if mcq else responses.answer_hash(answer), "is_correct": ok, "answered_at": at,
+        })
+
+
+def _award(writer, next_id, uid, badge_id, at, title, message, kind):
+    tables = models.Base.metadata.tables
+    writer.add(tables["user_badges"], {"user_id": uid, "badge_id": badge_id, "earned_at": at})
+    writer.add(tables["notifications"], {
+        "id": next_id("notifications"), "user_id": uid, "title": title, "message": message, "type": kind,
+        "is_read": False, "created_at": at,
+    })
+
+
+def _final_assessment(writer, next_id, rng, catalogue, uid, course_id, ability, at):
+    """The single attempt the app allows (retakes are rejected); returns its percentage."""
+    tables = models.Base.metadata.tables
+    questions = catalogue.assessment_of[course_id]
+    if not questions:
+        return None
+    at += _minutes(rng, 60, 60 * 24 * 14)
+    answers, correct = catalogue.answer(rng, ability, questions)
+    result_id = next_id("quiz_results")
+    writer.add(tables["quiz_results"], {
+        "id": result_id, "user_id": uid, "module_id": None, "course_id": course_id,
+        "score": sum(correct), "total_questions": len(questions), "answers": answers,
+        "question_ids": None, "completed_at": at, "attempt": 1, "submission_key": None,
+    })
+    if catalogue.scale.responses:
+        _responses(writer, next_id, catalogue, result_id, uid, questions, answers, correct, at)
+    percentage = sum(correct) * 100 / len(questions)
+    if percentage >= PASS_PERCENTAGE:
+        # award_final_assessment: certificate and master badge
+        certificate_id = next_id("certificates")
+        writer.add(tables["certificates"], {
+            "id": certificate_id, "user_id": uid, "course_id": course_id,
+            "certificate_code": _certificate_code(certificate_id), "issued_at": at,
+        })
+        writer.add(tables["user_badges"], {"user_id": uid, "badge_id": catalogue.badge_id(course_id, "Master"), "earned_at": at})
+    return percentage
+
@@ -33,6 +33,7 @@ def test_adaptive_flow():
         print("Course assessment already completed.")
         return
 
+    session_id = start_data.get("session_id")
     first_q = start_data.get("question")
     if not first_q:
         print("No question returned.")
@@ -45,9 +46,9 @@ def test_adaptive_flow():
     # 4. Get Next Question (Correct Answer -> Should go to Hard)
     print("\n--- Correct Answer -> Harder ---")
     next_payload = {
-        "answered_ids": [first_q["id"]],
-        "last_answer": first_q.get("correctOptionIndex", 0), # Mock correct
-        "last_difficulty": first_q["difficulty"]
+        "session_id": session_id,
+        "question_id": first_q["id"],
+        "answer": first_q.get("correctOptionIndex", 0) # Mock correct
     }
     resp = requests.post(f"{BASE_URL}/quizzes/{course_id}/adaptive/next", json=next_payload, headers=headers)
     print("Next Response Status:", resp.status_code)
@@ -66,9 +67,9 @@ def test_adaptive_flow():
     # 5. Get Next Question (Wrong Answer -> Should go to Easy)
     print("\n--- Wrong Answer -> Easier ---")
     next_payload = {
-        "answered_ids": [first_q["id"], second_q["id"]],
-        "last_answer": 99, # Wrong answer
-        "last_difficulty": second_q["difficulty"]
+        "session_id": session_id,
+        "question_id": second_q["id"],
+        "answer": 99 # Wrong answer
     }
     resp = requests.post(f"{BASE_URL}/quizzes/{course_id}/adaptive/next", json=next_payload, headers=headers)
     next_data = resp.json()
@@ -0,0 +1,135 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import answer_keys
+import database
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def mcq(answer, question_id=None):
+    return {"id": question_id, "questionText": "q", "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": answer}
+
+
+def descriptive(text, question_id=None):
+    return {"id": question_id, "questionText": "d", "questionType": "descriptive", "options": [], "correctAnswerText": text}
+
+
+class QuestionQueries:
+    """Counts statements that read the questions / question_options tables."""
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(database.engine, "before_cursor_execute", self._listener)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(database.engine, "before_cursor_execute", self._listener)
+
+    def _listener(self, conn, cursor, statement, *args):
+        if statement.startswith("SELECT") and ("FROM questions" in statement or "FROM question_options" in statement):
+            self.count += 1
+
+
+def test_grading_uses_the_compiled_key_until_questions_change(make_user):
+    _, inst_headers = make_user("keys_inst@example.com", "instructor")
+    _, learner_headers = make_user("keys_learner@example.com", "learner")
+    course = {
+        "title": "Keys Course",
+        "description": "D",
+        "modules": [{"title": "M1", "quiz": [mcq(0), mcq(1)]}],
+        "assessment": [mcq(1), descriptive("  Paris ")],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+    module_id = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"][0]["id"]
+    url = f"/modules/{module_id}/quiz/submit"
+
+    resp = client.post(url, json={"total_questions": 2, "answers": [0, "x"]}, headers=learner_headers).json()
+    assert (resp["correctCount"], resp["total_questions"]) == (1, 2)
+    assert [r["correctOptionIndex"] for r in resp["review"]] == [0, 1]
+
+    # Warm key: no question reads at all
+    with QuestionQueries() as reads:
+        resp = client.post(url, json={"total_questions": 2, "answers": [0, 1]}, headers=learner_headers).json()
+    assert resp["percentage"] == 100
+    assert reads.count == 0
+
+    # Editing the course bumps the key version
+    detail = client.get(f"/courses/{course_id}", headers=inst_headers).json()
+    q_ids = [q["id"] for q in detail["modules"][0]["quiz"]]
+    update = {
+        "title": "Keys Course",
+        "description": "D",
+        "modules": [{"id": module_id, "title": "M1", "quiz": [mcq(1, q_ids[0]), mcq(1, q_ids[1])]}],
+        "assessment": [mcq(1, q["id"]) if q["questionType"] == "mcq" else descriptive("  Paris ", q["id"]) for q in detail["assessment"]],
+    }
+    assert client.put(f"/courses/{course_id}", json=update, headers=inst_headers).status_code == 200
+    resp = client.post(url, json={"total_questions": 2, "answers": [0, 1]}, headers=learner_headers).json()
+    assert resp["correctCount"] == 1
+
+    assert client.post("/modules/999999/quiz/submit", json={"total_questions": 0, "answers": []}, headers=learner_headers).status_code == 404
+
+    # Final assessment: MCQ index plus normalised free text
+    questions = client.get(f"/quizzes/{course_id}", headers=learner_headers).json()["questions"]
+    assert all("correctOptionIndex" not in q for q in questions)
+    with QuestionQueries() as reads:
+        resp = client.post(f"/quizzes/{course_id}/submit", json={"answers": [1, "paris"]}, headers=learner_headers).json()
+    assert (resp["score"], resp["totalQuestions"]) == (2, 2)
+    assert reads.count == 0
+
+    review = client.get(f"/quizzes/{course_id}", headers=learner_headers).json()
+    assert review["completed"] is True
+    assert [q["correctAnswerText"] for q in review["review"]] == [None, "  Paris "]
+
+
+def test_key_lookups_ignore_questions_from_other_courses(make_user):
+    _, inst_headers = make_user("keys_inst2@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "C1", "description": "D", "assessment": [mcq(0), mcq(1), mcq(0)]}, headers=inst_headers).json()["id"]
+    other_id = client.post("/courses", json={"title": "C2", "description": "D", "assessment": [mcq(0)]}, headers=inst_headers).json()["id"]
+
+    db = database.SessionLocal()
+    ids = [q.id for q in db.query(models.Question).filter(models.Question.course_id == course_id).order_by(models.Question.id)]
+    foreign = db.query(models.Question.id).filter(models.Question.course_id == other_id).scalar()
+
+    key = answer_keys.for_course(db, course_id)
+    positions = key.positions_for([ids[1], foreign])
+    assert positions == [1]
+    assert key.grade([1, 0], positions) == 1
+    assert key.is_correct(ids[2], "0") and not key.is_correct(ids[2], "zero")
+    assert not key.is_correct(foreign, 0)
+    db.close()
+
+
+def test_an_edit_on_another_worker_reaches_this_one(make_user):
+    _, inst_headers = make_user("keys_inst3@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "C3", "description": "D", "assessment": [mcq(0)]}, headers=inst_headers).json()["id"]
+    db = database.SessionLocal()
+    key = answer_keys.for_course(db, course_id)
+    assert key.grade([0]) == 1
+
+    # Another process edits the question: nothing in this process's cache is invalidated
+    other = database.SessionLocal()
+    other.query(models.Question).filter(models.Question.course_id == course_id).update({"correctOptionIndex": 1})
+    answer_keys.bump_version(other, course_id)
+    other.commit()
+    other.close()
+
+    db.expire_all()
+    fresh = answer_keys.for_course(db, course_id)
+    assert fresh is not key and fresh.grade([0]) == 0 and fresh.grade([1]) == 1
+    assert answer_keys.for_course(db, course_id) is fresh
+    db.close()
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_grading_uses_the_compiled_key_until_questions_change(conftest.create_user)
+    test_key_lookups_ignore_questions_from_other_courses(conftest.create_user)
+    test_an_edit_on_another_worker_reaches_this_one(conftest.create_user)
+    print("ANSWER KEY TESTS PASSED!")
@@ -0,0 +1,121 @@
+import logging
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import awards
+import database
+import jobs
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def question(answer):
+    return {"questionText": "q", "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": answer}
+
+
+def test_rewards_are_awarded_after_commit_and_only_once(make_user):
+    _, inst_headers = make_user("jobs_inst@example.com", "instructor")
+    learner_id, learner_headers = make_user("jobs_learner@example.com", "learner")
+    course = {
+        "title": "Jobs Course",
+        "description": "D",
+        "modules": [{"title": "M1", "quiz": [question(0)]}],
+        "assessment": [question(1)],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+    module_id = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"][0]["id"]
+
+    resp = client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 1, "answers": [0]}, headers=learner_headers)
+    assert resp.status_code == 200 and resp.json()["percentage"] == 100
+    # Double submit with the same scores enqueues nothing new
+    client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 1, "answers": [0]}, headers=learner_headers)
+
+    # Nothing is awarded inside the request
+    assert client.get("/users/me/badges", headers=learner_headers).json() == []
+
+    assert jobs.run_pending() == 1
+    assert [b["name"] for b in client.get("/users/me/badges", headers=learner_headers).json()] == ["Jobs Course Graduate"]
+    titles = sorted(n["title"] for n in client.get("/notifications", headers=learner_headers).json() if n["type"] != "course_launch")
+    assert titles == ["Badge Earned!", "Batch Assigned!"]
+
+    db = database.SessionLocal()
+    diamond = db.query(models.Batch).filter(models.Batch.course_id == course_id, models.Batch.name == "Diamond").one()
+    assert [s.id for s in diamond.students] == [learner_id]
+
+    # Running the handler again (e.g. after a crash before the job was marked done) changes nothing
+    awards.award_course_completion(db, user_id=learner_id, course_id=course_id)
+    db.commit()
+    assert db.query(models.Notification).filter(
+        models.Notification.user_id == learner_id,
+        models.Notification.type != "course_launch"
+    ).count() == 2
+    db.close()
+
+    resp = client.post(f"/quizzes/{course_id}/submit", json={"answers": [1]}, headers=learner_headers).json()
+    assert resp["certificate"] is True and resp["rewardsPending"] is True and resp["badgeEligible"] is True
+    assert client.get("/users/me/certificates", headers=learner_headers).json() == []
+    jobs.run_pending()
+    assert len(client.get("/users/me/certificates", headers=learner_headers).json()) == 1
+
+
+def test_failed_jobs_are_retried_with_backoff():
+    calls = []
+
+    @jobs.job("flaky_test_job")
+    def flaky(db, value):
+        calls.append(value)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+
+    db = database.SessionLocal()
+    jobs.enqueue(db, "flaky_test_job", {"value": 7}, idempotency_key="flaky-1")
+    jobs.enqueue(db, "flaky_test_job", {"value": 7}, idempotency_key="flaky-1")
+    db.commit()
+
+    jobs.run_pending()
+    row = db.query(models.BackgroundJob).filter(models.BackgroundJob.idempotency_key == "flaky-1").one()
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert "transient" in row.last_error
+    assert row.run_after > datetime.utcnow()
+
+    row.run_after = datetime.utcnow()
+    db.commit()
+    jobs.run_pending()
+    db.refresh(row)
+    assert row.status == "done"
+    assert calls == [7, 7]
+
+    # Out of attempts: the job is parked as failed and the traceback goes to the log
+    @jobs.job("broken_test_job")
+    def broken(db):
+        raise RuntimeError("permanent")
+
+    jobs.enqueue(db, "broken_test_job", idempotency_key="broken-1", max_attempts=1)
+    db.commit()
+    errors = []
+    handler = logging.Handler()
+    handler.emit = errors.append
+    jobs.logger.addHandler(handler)
+    try:
+        jobs.run_pending()
+    finally:
+        jobs.logger.removeHandler(handler)
+    row = db.query(models.BackgroundJob).filter(models.BackgroundJob.idempotency_key == "broken-1").one()
+    assert row.status == "failed"
+    assert len(errors) == 1 and errors[0].levelno == logging.ERROR
+    assert "broken_test_job" in errors[0].getMessage() and "RuntimeError: permanent" in errors[0].getMessage()
+    db.close()
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_rewards_are_awarded_after_commit_and_only_once(conftest.create_user)
+    test_failed_jobs_are_retried_with_backoff()
+    print("BACKGROUND JOB TESTS PASSED!")
@@ -103,8 +103,11 @@ def test_batch_assignment():
         target_batch = next((b for b in batches if b["id"] == batch_id), None)
         
         if target_batch:
-            log(f"Batch Students: {json.dumps(target_batch.get('students', []), indent=2)}")
-            student_ids = [s["id"] for s in target_batch.get("students", [])]
+            log(f"Batch member count: {target_batch.get('member_count')}")
+            resp = requests.get(f"{BASE_URL}/batches/{batch_id}/students", headers=inst_headers)
+            students = resp.json().get("students", [])
+            log(f"Batch Students: {json.dumps(students, indent=2)}")
+            student_ids = [s["id"] for s in students]
             if learner_id in student_ids:
                 log("SUCCESS: Student found in batch students list!")
             else:
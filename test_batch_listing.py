@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import database
+import main
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def count_statements(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+def test_batch_summaries_and_member_paging(make_user):
+    _, inst_headers = make_user("listing_inst@example.com", "instructor")
+    learners = [make_user(f"listing_learner{i}@example.com", "learner") for i in range(5)]
+
+    batch_ids = []
+    for c in range(3):
+        course_id = client.post("/courses", json={"title": f"Listing {c}", "description": "D"}, headers=inst_headers).json()["id"]
+        for _, headers in learners:
+            client.post(f"/courses/{course_id}/enroll", headers=headers)
+        batch = client.post("/batches", json={"name": f"B{c}", "course_id": course_id}, headers=inst_headers).json()
+        assert batch["course_title"] == f"Listing {c}" and batch["member_count"] == 0
+        client.post(f"/batches/{batch['id']}/students", json=[uid for uid, _ in learners[:c + 2]], headers=inst_headers)
+        batch_ids.append(batch["id"])
+
+    summaries, statements = count_statements(lambda: client.get("/batches", headers=inst_headers).json())
+    assert [(b["course_title"], b["member_count"]) for b in summaries] == [("Listing 0", 2), ("Listing 1", 3), ("Listing 2", 4)]
+    assert all("students" not in b for b in summaries)
+    # Caller lookup + one listing query, however many batches and members there are
+    assert statements == 2
+
+    learner_view = client.get("/batches", headers=learners[2][1]).json()
+    assert [b["id"] for b in learner_view] == batch_ids[1:]
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 3} if after is None else {"limit": 3, "after": after}
+        page = client.get(f"/batches/{batch_ids[2]}/students", params=params, headers=inst_headers).json()
+        assert page["total"] == 4
+        seen.extend(s["id"] for s in page["students"])
+        after = page["next_after"]
+        if after is None:
+            break
+    assert seen == [uid for uid, _ in learners[:4]]
+    assert client.get(f"/batches/{batch_ids[2]}/students", headers=learners[0][1]).status_code == 403
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_batch_summaries_and_member_paging(conftest.create_user)
+    print("BATCH LISTING TESTS PASSED!")
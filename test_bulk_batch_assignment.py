@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import batches
+import database
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def members(batch_id):
+    db = database.SessionLocal()
+    try:
+        return sorted(batches.member_ids(db, batch_id))
+    finally:
+        db.close()
+
+
+def test_assignment_only_touches_the_delta(make_user):
+    _, inst_headers = make_user("bulk_inst@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "Bulk Course", "description": "D"}, headers=inst_headers).json()["id"]
+
+    learners = []
+    for i in range(6):
+        learner_id, headers = make_user(f"bulk_learner{i}@example.com", "learner")
+        client.post(f"/courses/{course_id}/enroll", headers=headers)
+        learners.append(learner_id)
+    outsider_id, _ = make_user("bulk_outsider@example.com", "learner")
+
+    batch_id = client.post("/batches", json={"name": "Cohort", "course_id": course_id}, headers=inst_headers).json()["id"]
+    url = f"/batches/{batch_id}/students"
+
+    resp = client.post(url, json=learners[:4] + [outsider_id], headers=inst_headers).json()
+    assert resp["added"] == learners[:4]
+    assert resp["skipped"] == [outsider_id]
+    assert members(batch_id) == learners[:4]
+
+    resp = client.post(url, json=learners[2:5], headers=inst_headers).json()
+    assert resp["added"] == [learners[4]]
+    assert resp["removed"] == learners[:2]
+    assert members(batch_id) == learners[2:5]
+
+    # Re-sending the same cohort writes nothing
+    writes = []
+    listener = lambda conn, cursor, statement, *args: writes.append(statement) if statement.split()[0] in ("INSERT", "DELETE") else None
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        resp = client.post(url, json=learners[2:5], headers=inst_headers).json()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    assert resp["added"] == [] and resp["removed"] == []
+    assert writes == []
+
+    assert client.post(url, params={"mode": "add"}, json=[learners[5]], headers=inst_headers).json()["added"] == [learners[5]]
+    resp = client.post(url, params={"mode": "remove"}, json=[learners[2], outsider_id], headers=inst_headers).json()
+    # Ids that were not in the batch are reported, not silently dropped
+    assert resp["removed"] == [learners[2]] and resp["not_members"] == [outsider_id]
+    assert members(batch_id) == learners[3:6]
+    assert client.post(url, params={"mode": "merge"}, json=[], headers=inst_headers).status_code == 400
+
+    # One notification per newly added member
+    db = database.SessionLocal()
+    assigned = db.query(models.Notification).filter(models.Notification.title == "Batch Assigned").count()
+    db.close()
+    assert assigned == 6
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_assignment_only_touches_the_delta(conftest.create_user)
+    print("BULK BATCH ASSIGNMENT TESTS PASSED!")
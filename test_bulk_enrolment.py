@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+import database
+import enrolments
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def enrolment_count(course_id):
+    db = database.SessionLocal()
+    try:
+        rows = db.query(models.Enrolment).filter(models.Enrolment.course_id == course_id).count()
+        return rows, db.query(models.Course.enrolment_count).filter(models.Course.id == course_id).scalar()
+    finally:
+        db.close()
+
+
+def test_concurrent_enrol_clicks_create_one_enrolment(make_user):
+    _, inst_headers = make_user("enrol_inst@example.com", "instructor")
+    _, headers = make_user("enrol_learner@example.com", "learner")
+    course_id = client.post("/courses", json={"title": "Enrol", "description": "D", "modules": []}, headers=inst_headers).json()["id"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        replies = list(pool.map(lambda _: client.post(f"/courses/{course_id}/enroll", headers=headers).json()["message"], range(8)))
+    assert replies.count("Enrolled successfully") == 1
+    assert replies.count("Already enrolled") == 7
+    assert enrolment_count(course_id) == (1, 1)
+
+
+def test_bulk_enrolment_reports_a_status_per_row(make_user):
+    inst_id, inst_headers = make_user("cohort_inst@example.com", "instructor")
+    _, other_headers = make_user("cohort_other@example.com", "instructor")
+    member_id, learner_headers = make_user("cohort_member@example.com", "learner")
+    course_id = client.post("/courses", json={"title": "Cohort", "description": "D", "modules": []}, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+
+    db = database.SessionLocal()
+    db.execute(insert(models.User), [{"name": f"c{i}", "email": f"cohort{i}@example.com", "password": "x", "role": "learner"} for i in range(3000)])
+    db.commit()
+    ids = dict(db.query(models.User.email, models.User.id).filter(models.User.email.like("cohort%")))
+    db.close()
+
+    user_ids = [ids[f"cohort{i}@example.com"] for i in range(2000)] + [ids["cohort0@example.com"], inst_id, 999999]
+    emails = [f"cohort{i}@example.com" for i in range(2000, 3000)] + ["Cohort_Member@Example.com ", "nobody@example.com"]
+
+    # The whole cohort is written in a handful of chunked statements
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        resp = client.post(f"/courses/{course_id}/enrolments/bulk", json={"user_ids": user_ids, "emails": emails}, headers=inst_headers)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert len(statements) < 30
+
+    assert (body["enrolled"], body["already_enrolled"], body["duplicates"], body["failed"]) == (3000, 1, 1, 3)
+    results = body["results"]
+    assert len(results) == len(user_ids) + len(emails)
+    assert results[0] == {"user_id": ids["cohort0@example.com"], "email": "cohort0@example.com", "status": "enrolled"}
+    assert [r["status"] for r in results[2000:2003]] == ["duplicate", "not_a_learner", "not_found"]
+    assert results[2002]["user_id"] == 999999
+    # Emails match whatever their case; the row reports the stored address
+    assert results[-2] == {"user_id": member_id, "email": "cohort_member@example.com", "status": "already_enrolled"}
+    assert results[-1] == {"user_id": None, "email": "nobody@example.com", "status": "not_found"}
+    assert enrolment_count(course_id) == (3001, 3001)
+
+    # Re-running the same cohort changes nothing
+    again = client.post(f"/courses/{course_id}/enrolments/bulk", json={"user_ids": user_ids[:10]}, headers=inst_headers).json()
+    assert again["enrolled"] == 0 and again["already_enrolled"] == 10
+    assert enrolment_count(course_id) == (3001, 3001)
+
+    assert client.post(f"/courses/{course_id}/enrolments/bulk", json={"user_ids": user_ids}, headers=other_headers).status_code == 403
+    assert client.post(f"/courses/{course_id}/enrolments/bulk", json={"user_ids": [1] * (enrolments.MAX_BULK + 1)}, headers=inst_headers).status_code == 400
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_concurrent_enrol_clicks_create_one_enrolment(conftest.create_user)
+    test_bulk_enrolment_reports_a_status_per_row(conftest.create_user)
+    print("BULK ENROLMENT TESTS PASSED!")
@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+import progress
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def question(text, answer):
+    return {"questionText": text, "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": answer}
+
+
+def get_progress(user_id, course_id):
+    db = database.SessionLocal()
+    try:
+        return db.get(models.CourseProgress, (user_id, course_id))
+    finally:
+        db.close()
+
+
+def test_modules_without_questions_stay_out_of_the_average(make_user):
+    _, inst_headers = make_user("progress_inst2@example.com", "instructor")
+    learner_id, learner_headers = make_user("progress_learner2@example.com", "learner")
+    course = {
+        "title": "Reading Course",
+        "description": "D",
+        "modules": [{"title": "Quiz", "quiz": [question("q1", 0)]}, {"title": "Reading", "quiz": []}],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+    modules = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"]
+    for module, answers in zip(modules, ([0], [])):
+        resp = client.post(f"/modules/{module['id']}/quiz/submit", json={"total_questions": len(answers), "answers": answers}, headers=learner_headers)
+        assert resp.status_code == 200
+
+    row = get_progress(learner_id, course_id)
+    assert (row.completed_modules, row.total_modules, row.scored_modules) == (2, 2, 1)
+    assert row.module_average == 100.0
+    report = client.get(f"/courses/{course_id}/reports/performance", headers=inst_headers).text
+    assert "progress_learner2@example.com,100%,100%" in report
+
+
+def test_progress_is_maintained_on_submit_and_module_changes(make_user):
+    _, inst_headers = make_user("progress_inst@example.com", "instructor")
+    learner_id, learner_headers = make_user("progress_learner@example.com", "learner")
+
+    course = {
+        "title": "Progress Course",
+        "description": "D",
+        "modules": [
+            {"title": "M1", "quiz": [question("q1", 0), question("q2", 1)]},
+            {"title": "M2", "quiz": [question("q3", 0)]},
+        ],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+    modules = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"]
+
+    client.post(f"/modules/{modules[0]['id']}/quiz/submit", json={"total_questions": 2, "answers": [0, 0]}, headers=learner_headers)
+    row = get_progress(learner_id, course_id)
+    assert (row.completed_modules, row.total_modules, row.module_score_sum) == (1, 2, 50.0)
+
+    # Resubmitting replaces the score instead of counting the module twice
+    client.post(f"/modules/{modules[0]['id']}/quiz/submit", json={"total_questions": 2, "answers": [0, 1]}, headers=learner_headers)
+    row = get_progress(learner_id, course_id)
+    assert (row.completed_modules, row.module_score_sum) == (1, 100.0)
+    assert client.get("/courses/my-courses", headers=learner_headers).json()[0]["progress"] == 50
+
+    # Dropping the unfinished module makes the course complete
+    course["modules"] = [dict(modules[0], quiz=[dict(q, correctOptionIndex=i) for i, q in enumerate(modules[0]["quiz"])])]
+    assert client.put(f"/courses/{course_id}", json=course, headers=inst_headers).status_code == 200
+    row = get_progress(learner_id, course_id)
+    assert (row.completed_modules, row.total_modules) == (1, 1)
+
+    learners = client.get("/courses/my-learners", headers=inst_headers).json()
+    assert learners[0]["progress"] == 100 and learners[0]["badges"] == ["Legend"]
+
+
+def test_backfill_matches_incremental_rows():
+    db = database.SessionLocal()
+    before = {(p.user_id, p.course_id): (p.completed_modules, p.total_modules, p.module_score_sum, p.scored_modules, p.final_score) for p in db.query(models.CourseProgress)}
+    db.query(models.CourseProgress).delete()
+    db.commit()
+
+    progress.rebuild(db)
+    db.commit()
+    after = {(p.user_id, p.course_id): (p.completed_modules, p.total_modules, p.module_score_sum, p.scored_modules, p.final_score) for p in db.query(models.CourseProgress)}
+    db.close()
+    assert before and after == before
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_modules_without_questions_stay_out_of_the_average(conftest.create_user)
+    test_progress_is_maintained_on_submit_and_module_changes(conftest.create_user)
+    test_backfill_matches_incremental_rows()
+    print("COURSE PROGRESS TESTS PASSED!")
@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def test_counts_is_enrolled_and_roster_paging(make_user):
+    _, inst_headers = make_user("roster_inst@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "Roster Course", "description": "D"}, headers=inst_headers).json()["id"]
+
+    learners = [make_user(f"roster_learner{i}@example.com", "learner") for i in range(5)]
+    for _, headers in learners:
+        assert client.post(f"/courses/{course_id}/enroll", headers=headers).status_code == 200
+    # Enrolling twice must not bump the counter
+    assert client.post(f"/courses/{course_id}/enroll", headers=learners[0][1]).json()["message"] == "Already enrolled"
+
+    _, outsider_headers = make_user("roster_outsider@example.com", "learner")
+
+    anonymous = client.get("/courses").json()[0]
+    assert "enrolledStudents" not in anonymous
+    assert anonymous["enrolledCount"] == 5
+    assert anonymous["isEnrolled"] is False
+
+    assert client.get("/courses", headers=learners[0][1]).json()[0]["isEnrolled"] is True
+    assert client.get("/courses", headers=outsider_headers).json()[0]["isEnrolled"] is False
+
+    detail = client.get(f"/courses/{course_id}", headers=learners[1][1]).json()
+    assert detail["enrolledCount"] == 5 and detail["isEnrolled"] is True
+    assert client.get(f"/courses/{course_id}", headers=outsider_headers).json()["isEnrolled"] is False
+
+    mine = client.get("/courses/my-courses", headers=learners[2][1]).json()
+    assert mine[0]["isEnrolled"] is True and mine[0]["enrolledCount"] == 5
+
+    # Roster is instructor-only and keyset paginated
+    assert client.get(f"/courses/{course_id}/students", headers=learners[0][1]).status_code == 403
+    seen = []
+    after = None
+    while True:
+        params = {"limit": 2}
+        if after is not None:
+            params["after"] = after
+        page = client.get(f"/courses/{course_id}/students", params=params, headers=inst_headers).json()
+        assert page["total"] == 5
+        seen.extend(s["id"] for s in page["students"])
+        after = page["next_after"]
+        if after is None:
+            break
+    assert seen == [user_id for user_id, _ in learners]
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_counts_is_enrolled_and_roster_paging(conftest.create_user)
+    print("ENROLMENT ROSTER TESTS PASSED!")
@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+import pytest
+
+import adaptive
+import database
+import irt
+import models
+
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def simulate(theta, a, b, rng):
+    return (rng.random((len(theta), len(a))) < irt.probability(theta[:, None], a, b)).astype(float)
+
+
+def test_calibration_recovers_item_parameters():
+    rng = np.random.default_rng(0)
+    a = rng.uniform(0.7, 2.0, 20)
+    b = rng.normal(0, 1, 20)
+    theta = rng.normal(0, 1, 3000)
+    responses = simulate(theta, a, b, rng)
+    responses[rng.random(responses.shape) < 0.2] = np.nan
+
+    a_hat, b_hat, theta_hat, counts = irt.calibrate(responses)
+    assert np.corrcoef(b, b_hat)[0, 1] > 0.95
+    assert np.corrcoef(a, a_hat)[0, 1] > 0.7
+    assert np.corrcoef(theta, theta_hat)[0, 1] > 0.8
+    assert counts.min() > 2000
+
+
+def test_engine_stops_once_the_ability_is_precise():
+    rng = np.random.default_rng(1)
+    table = irt.ItemTable(np.full(200, 1.5), np.linspace(-3, 3, 200))
+    true_theta, pick_rng = 1.2, random.Random(1)
+
+    answered, log_posterior, theta, se, items = 0, None, 0.0, None, 0
+    while not irt.should_stop(items, se):
+        p = table.pick(theta, answered, pick_rng)
+        assert not answered >> p & 1
+        answered |= 1 << p
+        correct = rng.random() < irt.probability(true_theta, 1.5, table.b[p])
+        log_posterior, theta, se = table.update(log_posterior, p, correct)
+        items += 1
+
+    assert items < irt.MAX_ITEMS and se < irt.SE_THRESHOLD
+    assert abs(theta - true_theta) < 1.0
+
+
+def test_calibrated_parameters_reach_the_question_bank():
+    db = database.SessionLocal()
+    course = models.Course(title="IRT", description="D")
+    db.add(course)
+    db.flush()
+    questions = [models.Question(questionText=str(i), course_id=course.id, correctOptionIndex=0, difficulty="medium") for i in range(5)]
+    db.add_all(questions)
+    db.flush()
+
+    rng = np.random.default_rng(2)
+    b = np.array([-1.5, -0.5, 0.0, 0.5, 1.5])
+    for row in simulate(rng.normal(0, 1, 400), np.ones(5), b, rng):
+        # Correct answers are option 0
+        db.add(models.QuizResult(course_id=course.id, score=int(row.sum()), total_questions=5,
+                                 question_ids=[q.id for q in questions], answers=[0 if r else 1 for r in row]))
+    db.commit()
+    # A bank built before the calibration, with the label fallback
+    assert np.allclose(adaptive.bank_for(db, course.id).items.a, 1.0)
+
+    assert irt.calibrate_course(db, course.id) == 5
+    db.commit()
+    stored = irt.load_parameters(db, course.id)
+    assert list(np.argsort([stored[q.id][1] for q in questions])) == [0, 1, 2, 3, 4]
+
+    # The calibration bumps the course version, so the bank is rebuilt right away
+    bank = adaptive.bank_for(db, course.id)
+    assert np.allclose(bank.items.b, [stored[q.id][1] for q in questions])
+    db.close()
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_calibration_recovers_item_parameters()
+    test_engine_stops_once_the_ability_is_precise()
+    test_calibrated_parameters_reach_the_question_bank()
+    print("IRT TESTS PASSED!")
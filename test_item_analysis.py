@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+import answer_keys
+import database
+import item_analysis
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def mcq(answer):
+    return {"questionText": "q", "options": [{"text": "a"}, {"text": "b"}, {"text": "c"}], "correctOptionIndex": answer}
+
+
+def expected_stats(answers, key):
+    """Dense reference computation for one fixed-form quiz."""
+    correct = np.array([[1.0 if key.is_correct(qid, a) else 0.0 for qid, a in zip(key.question_ids, row)] for row in answers])
+    rest = (correct.sum(axis=1, keepdims=True) - correct) / (correct.shape[1] - 1)
+    p_values = correct.mean(axis=0)
+    r = [np.corrcoef(correct[:, j], rest[:, j])[0, 1] for j in range(correct.shape[1])]
+    return p_values, r
+
+
+def test_item_statistics_match_a_dense_computation(make_user):
+    _, inst_headers = make_user("items_inst@example.com", "instructor")
+    _, other_headers = make_user("items_other@example.com", "instructor")
+    course = {
+        "title": "Items",
+        "description": "D",
+        "modules": [{"title": "M1", "quiz": [mcq(0), mcq(2)]}],
+        "assessment": [mcq(0), mcq(1), mcq(2), mcq(1), {"questionText": "d", "questionType": "descriptive", "options": [], "correctAnswerText": "yes"}],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+
+    db = database.SessionLocal()
+    key = answer_keys.for_course(db, course_id)
+    module_id = db.query(models.Module.id).filter(models.Module.course_id == course_id).scalar()
+
+    # Learners of varying ability; option 0 also picked as a distractor, some blanks
+    rng = np.random.default_rng(3)
+    answers = []
+    for ability in rng.uniform(0, 1, 300):
+        row = []
+        for p, qid in enumerate(key.question_ids):
+            right = rng.random() < 0.2 + 0.7 * ability
+            if key.mcq[p]:
+                row.append(key.expected[p] if right else (None if rng.random() < 0.05 else int(rng.integers(0, 3))))
+            else:
+                row.append("Yes " if right else "no")
+        answers.append(row)
+        db.add(models.QuizResult(course_id=course_id, score=0, total_questions=len(row), question_ids=list(key.question_ids), answers=row))
+        db.add(models.QuizResult(module_id=module_id, score=0, total_questions=2, answers=[0, 2] if right else [1, 1]))
+    db.commit()
+
+    assert item_analysis.analyse(db, course_id=course_id, chunk_size=7) == 7
+    stats = {s.question_id: s for s in db.query(models.QuestionStat)}
+    p_values, r = expected_stats(answers, key)
+    for p, qid in enumerate(key.question_ids):
+        assert stats[qid].responses == 300
+        assert abs(stats[qid].p_value - p_values[p]) < 1e-9
+        assert abs(stats[qid].discrimination - r[p]) < 1e-9
+
+    first = stats[key.question_ids[0]]
+    assert sum(first.option_counts) + first.invalid_answers == 300
+    assert first.option_counts[0] == max(first.option_counts)
+    assert stats[key.question_ids[4]].option_counts is None
+
+    # Chunking does not change the result
+    before = {qid: (s.p_value, s.discrimination, s.option_counts) for qid, s in stats.items()}
+    item_analysis.analyse(db, course_id=course_id, chunk_size=10000)
+    db.expire_all()
+    assert {s.question_id: (s.p_value, s.discrimination, s.option_counts) for s in db.query(models.QuestionStat)} == before
+
+    # Recalibration relabels questions and bumps the version every worker's answer key follows
+    version = db.get(models.Course, course_id).question_version
+    item_analysis.analyse(db, course_id=course_id, recalibrate=True)
+    db.expire_all()
+    assert db.get(models.Course, course_id).question_version == version + 1
+    labels = dict(db.query(models.Question.id, models.Question.difficulty).filter(models.Question.course_id == course_id))
+    for p, qid in enumerate(key.question_ids):
+        expected = "easy" if p_values[p] >= 0.8 else "hard" if p_values[p] <= 0.4 else "medium"
+        assert labels[qid] == expected
+    assert answer_keys.for_course(db, course_id).difficulties == tuple(labels[qid] for qid in key.question_ids)
+    db.close()
+
+    resp = client.get(f"/courses/{course_id}/item-stats", headers=inst_headers)
+    assert resp.status_code == 200 and len(resp.json()) == 7
+    assert client.get(f"/courses/{course_id}/item-stats", headers=other_headers).status_code == 403
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_item_statistics_match_a_dense_computation(conftest.create_user)
+    print("ITEM ANALYSIS TESTS PASSED!")
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import llm
+import llm_simulator
+import main
+import rag
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def test_latency_distributions():
+    rng = random.Random(0)
+    assert llm_simulator.Latency.parse("fixed:250").sample(rng) == 0.25
+    assert all(0.1 <= llm_simulator.Latency.parse("uniform:100:300").sample(rng) <= 0.3 for _ in range(200))
+    lognormal = [llm_simulator.Latency.parse("lognormal:400:0.5").sample(rng) for _ in range(4000)]
+    assert statistics.median(lognormal) == pytest.approx(0.4, rel=0.05)
+    # Long right tail: p99 well above the median
+    assert sorted(lognormal)[int(len(lognormal) * 0.99)] > 2.5 * 0.4
+    assert min(llm_simulator.Latency.parse("normal:10:50").sample(rng) for _ in range(200)) == 0.0
+    with pytest.raises(ValueError):
+        llm_simulator.Latency.parse("gamma:1:2")
+    # Profiles set the token rate too
+    assert llm_simulator.Simulator("openai").tokens_per_second == llm_simulator.PROFILES["openai"][1]
+
+
+def test_canned_payloads_fit_every_ai_path(monkeypatch):
+    simulator = llm_simulator.Simulator(latency="fixed:0", seed=1)
+    monkeypatch.setattr(rag, "client", simulator)
+
+    mcq = rag.generate_questions("SQL", "mcq", count=3, difficulty="hard")
+    assert len(mcq) == 3 and all(len(q["options"]) == 4 and 0 <= q["correctOptionIndex"] < 4 for q in mcq)
+    assert all(q["questionType"] == "mcq" and "SQL" in q["questionText"] for q in mcq)
+    descriptive = rag.generate_questions("Python", "descriptive", count=2)
+    assert [q["questionType"] for q in descriptive] == ["descriptive", "descriptive"] and descriptive[0]["correctAnswerText"]
+
+    single = rag.generate_single_adaptive_question("Statistics", "hard", "mcq", "context")
+    assert single["difficulty"] == "hard" and single["questionType"] == "mcq"
+    assert rag.clean_speech("what what is is an index") == "What is an index."
+    assert "what is sql" in rag.generate_response("what is sql?", ["Course: SQL"])
+
+    resp = client.post("/api/chat", json={"message": "what is sql"})
+    assert resp.status_code == 200 and resp.json()["response"]
+    assert simulator.statuses[200] == 6 and len(simulator.latencies) == 6
+
+    # Truncated JSON: the adaptive path degrades to no question instead of failing
+    monkeypatch.setattr(rag, "client", llm_simulator.Simulator(latency="fixed:0", malformed_rate=1.0))
+    assert rag.generate_single_adaptive_question("SQL", "easy") is None
+    monkeypatch.setattr(rag, "client", llm_simulator.Simulator(latency="fixed:0", error_rate=1.0, error_statuses=(503,)))
+    with pytest.raises(llm.LLMError) as error:
+        rag.generate_questions("SQL", "mcq")
+    assert error.value.status == 503
+
+
+def test_http_server_streaming_errors_and_both_clients(monkeypatch):
+    simulator = llm_simulator.Simulator(latency="fixed:20", tokens_per_second=2000, seed=2)
+    server = llm_simulator.serve(simulator)
+    try:
+        http = llm.ChatCompletionsClient(f"{server.url}/v1", max_retries=2)
+        messages = [{"role": "user", "content": "Student Question:\nwhat is a join\n"}]
+        started = time.perf_counter()
+        result = http.chat.completions.create(model="llama-3.1-8b-instant", messages=messages, max_tokens=8)
+        assert time.perf_counter() - started >= 0.02
+        assert result.object == "chat.completion" and result.usage.completion_tokens == 8
+        assert len(result.choices[0].message.content.split()) == 8
+
+        chunks = list(http.chat.completions.create(model="m", messages=messages, stream=True))
+        assert chunks[0].choices[0].delta.role == "assistant" and chunks[-1].choices[0].finish_reason == "stop"
+        streamed = "".join(getattr(c.choices[0].delta, "content", "") for c in chunks)
+        assert "what is a join" in streamed and len(chunks) > 10
+
+        # The Groq SDK speaks to the same server through its own URL layout
+        monkeypatch.setattr(llm, "LLM_BASE_URL", server.url)
+        monkeypatch.setattr(rag, "client", llm.make_client(backend="groq"))
+        assert len(rag.generate_questions("Algorithms", "mcq", count=4)) == 4
+
+        # Injected 429s are retried after the server's Retry-After, then surface
+        simulator.error_rate, simulator.error_statuses, simulator.retry_after = 1.0, (429,), 0.01
+        with pytest.raises(llm.LLMError) as error:
+            http.chat.completions.create(model="m", messages=messages)
+        assert error.value.status == 429 and simulator.statuses[429] == 3
+
+        # A stall outlasts the caller's timeout
+        simulator.error_rate, simulator.stall_rate, simulator.stall_seconds = 0.0, 1.0, 0.3
+        with pytest.raises(llm.LLMError) as error:
+            llm.ChatCompletionsClient(f"{server.url}/v1", max_retries=0).chat.completions.create(model="m", messages=messages, timeout=0.05)
+        assert error.value.status is None
+        http.close()
+    finally:
+        server.shutdown()
+
+
+def test_backend_selection(monkeypatch):
+    assert isinstance(llm.make_client(backend="simulator"), llm_simulator.Simulator)
+    warnings = []
+    monkeypatch.setattr(llm.logger, "warning", lambda message, *args: warnings.append(message % args))
+    assert llm.make_client(backend="nonsense") is None
+    assert warnings == ["Unknown LLM_BACKEND 'nonsense' (expected one of groq, openai, simulator). AI features are off."]
+    monkeypatch.setattr(llm, "LLM_BASE_URL", None)
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    assert llm.make_client(api_key=None, backend="groq") is None
+    assert llm.make_client(backend="openai") is None
+    monkeypatch.setattr(llm, "LLM_BASE_URL", "http://127.0.0.1:1/v1")
+    assert isinstance(llm.make_client(backend="openai"), llm.ChatCompletionsClient)
+
+
+if __name__ == "__main__":
+    import conftest
+    from _pytest.monkeypatch import MonkeyPatch
+    conftest.reset_database()
+    test_latency_distributions()
+    patch = MonkeyPatch()
+    for test in (test_canned_payloads_fit_every_ai_path, test_http_server_streaming_errors_and_both_clients, test_backend_selection):
+        test(patch)
+        patch.undo()
+    print("LLM SIMULATOR TESTS PASSED!")
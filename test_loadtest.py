@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+import database
+import llm_simulator
+import loadtest
+import main
+import rag
+import synthetic
+
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def test_percentiles_and_baseline_comparison():
+    assert loadtest.percentile([], 50) is None
+    assert loadtest.percentile([3, 1, 2], 50) == 2
+    assert loadtest.percentile(list(range(1, 101)), 95) == pytest.approx(95.05)
+
+    baseline = {"throughput_rps": 100.0, "endpoints": {
+        "GET /courses": {"p95_ms": 40.0, "p99_ms": 60.0, "error_rate": 0.0},
+        "GET /batches": {"p95_ms": 2.0, "p99_ms": 3.0, "error_rate": 0.0},
+    }}
+    same = {"throughput_rps": 95.0, "endpoints": {
+        "GET /courses": {"p95_ms": 44.0, "p99_ms": 60.0, "error_rate": 0.005},
+        # Three times slower, but by less than the noise floor
+        "GET /batches": {"p95_ms": 6.0, "p99_ms": 7.0, "error_rate": 0.0},
+    }}
+    assert loadtest.compare(same, baseline, tolerance=0.2) == []
+    worse = {"throughput_rps": 70.0, "endpoints": {
+        "GET /courses": {"p95_ms": 80.0, "p99_ms": 61.0, "error_rate": 0.05},
+    }}
+    regressions = loadtest.compare(worse, baseline, tolerance=0.2)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("GET /courses: p95_ms") and "error rate" in regressions[1]
+    assert regressions[2].startswith("throughput")
+
+
+def test_traffic_mix_runs_cleanly_against_synthetic_data(monkeypatch):
+    synthetic.generate(database.engine, "tiny", seed=1)
+    simulator = llm_simulator.Simulator(latency="fixed:1", seed=1)
+    monkeypatch.setattr(rag, "client", simulator)
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            mix = {**loadtest.DEFAULT_MIX, "ai": 1}
+            return await loadtest.run(client, users=4, duration=3, mix=mix, scale="tiny", seed=1)
+
+    report = asyncio.run(go()).report()
+    endpoints = report["endpoints"]
+    assert {"POST /auth/login", "GET /courses", "GET /courses/{course_id}", "POST /modules/{module_id}/quiz/submit",
+            "POST /quizzes/{course_id}/adaptive/start", "GET /courses/{course_id}/reports/performance",
+            "GET /courses/my-learners", "POST /api/chat", "POST /api/ai/generate-questions"} <= set(endpoints)
+    upstream = loadtest.upstream_report(simulator)
+    assert upstream["requests"] == upstream["statuses"]["200"] >= endpoints["POST /api/chat"]["requests"]
+    assert upstream["p50_ms"] >= 1
+    assert report["error_rate"] == 0, {e: s["error_rate"] for e, s in endpoints.items() if s["error_rate"]}
+    assert report["requests"] == sum(s["requests"] for s in endpoints.values())
+    for stats in endpoints.values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+
+if __name__ == "__main__":
+    import conftest
+    from _pytest.monkeypatch import MonkeyPatch
+    conftest.reset_database()
+    test_percentiles_and_baseline_comparison()
+    patch = MonkeyPatch()
+    test_traffic_mix_runs_cleanly_against_synthetic_data(patch)
+    patch.undo()
+    print("LOAD TEST TESTS PASSED!")
@@ -0,0 +1,83 @@
+import json
+import logging
+import queue
+
+from fastapi.testclient import TestClient
+
+import logs
+import main
+
+client = TestClient(main.app)
+logger = logging.getLogger("edweb.test")
+
+
+@main.app.get("/test-logging/{n}", include_in_schema=False)
+def log_something(n: int):
+    logger.warning("handled %s", n, extra={"course_id": n})
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("failed %s", n)
+    return {"ok": True}
+
+
+def records(message_prefix):
+    logs.flush()
+    with open(logs._listener.handlers[0].baseFilename, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [e for e in entries if e["message"].startswith(message_prefix)]
+
+
+def test_records_are_json_lines_with_the_request_id():
+    resp = client.get("/test-logging/7", headers={"X-Request-ID": "req-abc"})
+    assert resp.headers["X-Request-ID"] == "req-abc"
+    handled, failed = records("handled 7")[-1], records("failed 7")[-1]
+    assert handled["level"] == "WARNING" and handled["logger"] == "edweb.test"
+    assert handled["request_id"] == "req-abc" and handled["course_id"] == 7
+    assert failed["request_id"] == "req-abc"
+    assert "ZeroDivisionError" in failed["exception"]
+
+    # Without a header the middleware assigns one
+    resp = client.get("/test-logging/8")
+    generated = resp.headers["X-Request-ID"]
+    assert len(generated) == 32
+    assert records("handled 8")[-1]["request_id"] == generated
+
+    # Outside a request there is no id
+    logger.warning("handled outside")
+    assert records("handled outside")[-1]["request_id"] is None
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs._QueueHandler(queue.Queue(1))
+    record = logging.LogRecord("edweb.test", logging.INFO, __file__, 1, "x %s", (1,), None)
+    for _ in range(3):
+        handler.handle(record)
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().msg == "x 1"
+
+
+def test_file_size_is_bounded_by_rotation(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_MAX_BYTES", "2000")
+    monkeypatch.setenv("LOG_BACKUP_COUNT", "2")
+    handler = logs._file_handler(str(tmp_path / "app" / "edweb.log"))
+    handler.setFormatter(logs.JsonFormatter())
+    for i in range(500):
+        handler.handle(logging.LogRecord("edweb.test", logging.INFO, __file__, 1, "line %s", (i,), None))
+    handler.close()
+    files = sorted(p.name for p in (tmp_path / "app").iterdir())
+    assert files == ["edweb.log", "edweb.log.1", "edweb.log.2"]
+    assert all((tmp_path / "app" / name).stat().st_size <= 2000 for name in files)
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    from _pytest.monkeypatch import MonkeyPatch
+    test_records_are_json_lines_with_the_request_id()
+    test_full_queue_drops_instead_of_blocking()
+    with tempfile.TemporaryDirectory() as tmp:
+        patch = MonkeyPatch()
+        test_file_size_is_bounded_by_rotation(pathlib.Path(tmp), patch)
+        patch.undo()
+    print("LOGGING TESTS PASSED!")
@@ -0,0 +1,110 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+import rag
+
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+client = TestClient(main.app, raise_server_exceptions=False)
+
+
+@main.app.get("/test-metrics/boom/{n}", include_in_schema=False)
+def boom(n: int):
+    raise RuntimeError("boom")
+
+
+def sample(text, name, **labels):
+    """Value of one sample in the exposition text."""
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = "^" + re.escape(name + ("{" + label_text + "}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_exposition_format():
+    hist = metrics.Histogram("test_exposition_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0), registry=[])
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(value, route='/a"b')
+    text = "\n".join(hist.render())
+    assert "# TYPE test_exposition_seconds histogram" in text
+    assert 'test_exposition_seconds_bucket{route="/a\\"b",le="0.1"} 1' in text
+    assert 'test_exposition_seconds_bucket{route="/a\\"b",le="1.0"} 3' in text
+    assert 'test_exposition_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in text
+    assert 'test_exposition_seconds_count{route="/a\\"b"} 4' in text
+    assert hist.sum(route='/a"b') == pytest.approx(4.05)
+    with pytest.raises(ValueError):
+        hist.observe(1.0, path="/a")
+
+
+def test_requests_are_measured_by_route_template(make_user):
+    _, inst_headers = make_user("metrics_inst@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "Metrics", "description": "D", "modules": []}, headers=inst_headers).json()["id"]
+    route = {"method": "GET", "route": "/courses/{course_id}"}
+    before = metrics.REQUEST_LATENCY.count(**route)
+
+    for _ in range(3):
+        assert client.get(f"/courses/{course_id}", headers=inst_headers).status_code == 200
+    assert client.get("/courses/999999/students", headers=inst_headers).status_code == 404
+
+    assert metrics.REQUEST_LATENCY.count(**route) == before + 3
+    assert metrics.REQUESTS.value(method="GET", route="/courses/{course_id}/students", status=404) == 1
+    # Every request was charged the SQL it ran
+    assert metrics.REQUEST_STATEMENTS.count(**route) == before + 3
+    assert metrics.REQUEST_STATEMENTS.sum(**route) >= 3
+    assert metrics.REQUEST_SQL_TIME.sum(**route) > 0
+
+    # Unhandled errors become 500s with the route template as the label
+    resp = client.get("/test-metrics/boom/1")
+    assert resp.status_code == 500 and resp.json()["detail"] == "Internal Server Error"
+    client.get("/test-metrics/boom/2")
+    assert metrics.REQUESTS.value(method="GET", route="/test-metrics/boom/{n}", status=500) == 2
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert sample(text, "http_requests_total", method="GET", route="/courses/{course_id}", status="200") >= 3
+    assert sample(text, "http_request_duration_seconds_count", **route) == before + 3
+    assert sample(text, "http_request_db_statements_bucket", **route, le="+Inf") == before + 3
+    # The scrape itself is in flight
+    assert sample(text, "http_requests_in_flight") == 1
+    assert sample(text, "db_statements_total") > 0
+
+
+def test_llm_calls_are_counted_by_outcome():
+    original = rag.client
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if kwargs.get("max_tokens"):
+            raise RuntimeError("provider down")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{"questions": [{"questionText": "q"}]}'))])
+
+    rag.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    try:
+        ok_before = metrics.LLM_REQUESTS.value(operation="generate_questions", outcome="ok")
+        assert rag.generate_questions("topic", "mcq", 1) == [{"questionText": "q"}]
+        assert metrics.LLM_REQUESTS.value(operation="generate_questions", outcome="ok") == ok_before + 1
+        assert metrics.LLM_LATENCY.count(operation="generate_questions") >= 1
+
+        # clean_speech swallows the provider error, the metric still records it
+        error_before = metrics.LLM_REQUESTS.value(operation="clean_speech", outcome="error")
+        assert rag.clean_speech("helo wrld") == "helo wrld"
+        assert metrics.LLM_REQUESTS.value(operation="clean_speech", outcome="error") == error_before + 1
+    finally:
+        rag.client = original
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_histogram_exposition_format()
+    test_requests_are_measured_by_route_template(conftest.create_user)
+    test_llm_calls_are_counted_by_outcome()
+    print("METRICS TESTS PASSED!")
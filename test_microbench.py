@@ -0,0 +1,56 @@
+import json
+import pathlib
+
+import pytest
+
+import microbench
+import rag
+
+BASELINE = pathlib.Path(__file__).parent / "microbench_baseline.json"
+
+
+def test_every_benchmark_runs_and_the_baseline_covers_it(monkeypatch, tmp_path):
+    monkeypatch.setattr(rag, "VECTOR_STORE", None)
+    monkeypatch.setattr(rag, "INDEX_FILE", str(tmp_path / "vector_store.json"))
+    seen = []
+    report = microbench.run(min_time=0.001, repeat=2, progress=lambda key, result: seen.append(key))
+
+    baseline = json.loads(BASELINE.read_text())
+    assert set(report["results"]) == set(baseline["results"]) == set(seen)
+    for name, (sizes, _) in microbench.BENCHMARKS.items():
+        assert len(sizes) > 1 and all(f"{name}[{size}]" in report["results"] for size in sizes)
+    for result in report["results"].values():
+        assert 0 < result["min_ns"] <= result["median_ns"] and result["loops"] >= 1
+        assert result["normalised"] == pytest.approx(result["min_ns"] / result["calibration_ns"])
+    # Bigger inputs cost more
+    assert report["results"]["rag.retrieve[1000]"]["min_ns"] > report["results"]["rag.retrieve[10]"]["min_ns"]
+
+
+def test_regressions_are_judged_on_normalised_time():
+    def result(min_ns, calibration_ns):
+        return {"min_ns": min_ns, "calibration_ns": calibration_ns, "normalised": min_ns / calibration_ns}
+
+    baseline = {"results": {"rag.retrieve[100]": result(50000.0, 1000.0), "auth.decode_token[1]": result(400.0, 1000.0)}}
+    # Everything twice as slow on a machine half as fast: no regression
+    slower_machine = {"results": {"rag.retrieve[100]": result(100000.0, 2000.0), "auth.decode_token[1]": result(800.0, 2000.0)}}
+    assert microbench.compare(slower_machine, baseline, tolerance=0.1) == []
+
+    regressed = {"results": {
+        "rag.retrieve[100]": result(60000.0, 1000.0),
+        # 50% slower, but by less than the noise floor
+        "auth.decode_token[1]": result(600.0, 1000.0),
+    }}
+    regressions = microbench.compare(regressed, baseline, tolerance=0.1)
+    assert len(regressions) == 1 and regressions[0].startswith("rag.retrieve[100]: 1.20x slower")
+    assert microbench.compare(regressed, baseline, tolerance=0.25) == []
+
+
+if __name__ == "__main__":
+    import tempfile
+    from _pytest.monkeypatch import MonkeyPatch
+    patch = MonkeyPatch()
+    with tempfile.TemporaryDirectory() as directory:
+        test_every_benchmark_runs_and_the_baseline_covers_it(patch, pathlib.Path(directory))
+        patch.undo()
+    test_regressions_are_judged_on_normalised_time()
+    print("MICRO-BENCHMARK TESTS PASSED!")
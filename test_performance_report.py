@@ -0,0 +1,103 @@
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import auth
+import database
+import main
+import models
+import progress
+import reports
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def make_course(tag, learner_count):
+    db = database.SessionLocal()
+    instructor = models.User(name="Inst", email=f"report_inst_{tag}@example.com", password="x", role="instructor")
+    db.add(instructor)
+    db.flush()
+    course = models.Course(title=f"Report Course {tag}", description="D", instructor_id=instructor.id)
+    db.add(course)
+    db.flush()
+    modules = [models.Module(title=f"M{i}", course_id=course.id) for i in range(2)]
+    db.add_all(modules)
+    db.flush()
+
+    for i in range(learner_count):
+        learner = models.User(name=f"Learner {i}", email=f"report_{tag}_{i}@example.com", password="x", role="learner")
+        db.add(learner)
+        db.flush()
+        db.add(models.Enrolment(user_id=learner.id, course_id=course.id))
+        if i % 2 == 0:
+            # Completes the first module with 3/4 and passes the final with 1/2
+            db.add(models.QuizResult(user_id=learner.id, module_id=modules[0].id, score=3, total_questions=4))
+            db.add(models.QuizResult(user_id=learner.id, course_id=course.id, score=1, total_questions=2))
+    db.flush()
+    progress.rebuild(db, course_id=course.id)
+    db.commit()
+    token = auth.create_access_token({"sub": instructor.email})
+    course_id = course.id
+    db.close()
+    return course_id, {"Authorization": f"Bearer {token}"}
+
+
+def count_statements(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+    return len(statements)
+
+
+def test_csv_rows():
+    course_id, headers = make_course("csv", 3)
+    resp = client.get(f"/courses/{course_id}/reports/performance", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0] == reports.PERFORMANCE_HEADER
+    assert rows[1] == ["Learner 0", "report_csv_0@example.com", "50%", "75%", "Completed", "50%"]
+    assert rows[2] == ["Learner 1", "report_csv_1@example.com", "0%", "0%", "Not Attempted", "N/A"]
+    assert len(rows) == 4
+
+
+def test_query_count_does_not_grow_with_class_size():
+    small_id, headers_small = make_course("small", 2)
+    large_id, headers_large = make_course("large", 40)
+
+    small = count_statements(lambda: client.get(f"/courses/{small_id}/reports/performance", headers=headers_small))
+    large = count_statements(lambda: client.get(f"/courses/{large_id}/reports/performance", headers=headers_large))
+    assert small == large
+
+
+def test_unknown_format_is_rejected():
+    course_id, headers = make_course("fmt", 1)
+    resp = client.get(f"/courses/{course_id}/reports/performance", params={"format": "pdf"}, headers=headers)
+    assert resp.status_code == 400
+
+
+def test_xlsx_export():
+    openpyxl = pytest.importorskip("openpyxl")
+    course_id, headers = make_course("xlsx", 3)
+    resp = client.get(f"/courses/{course_id}/reports/performance", params={"format": "xlsx"}, headers=headers)
+    assert resp.status_code == 200
+    sheet = openpyxl.load_workbook(io.BytesIO(resp.content)).active
+    assert sheet.max_row == 4
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_csv_rows()
+    test_query_count_does_not_grow_with_class_size()
+    test_unknown_format_is_rejected()
+    print("PERFORMANCE REPORT TESTS PASSED!")
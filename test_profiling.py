@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import auth
+import main
+import profiling
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def _busy_grading(ms):
+    # Pure-Python work for the sampler to find
+    deadline = time.perf_counter() + ms / 1000
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(i * i for i in range(200))
+    return total
+
+
+@main.app.get("/test-profiling/busy/{ms}", include_in_schema=False)
+def busy(ms: int):
+    return {"total": _busy_grading(ms)}
+
+
+def _busy_rows(ms):
+    for _ in range(3):
+        yield f"{_busy_grading(ms / 3)}\n"
+
+
+@main.app.get("/test-profiling/stream/{ms}", include_in_schema=False)
+def stream(ms: int):
+    return StreamingResponse(_busy_rows(ms), media_type="text/csv")
+
+
+def test_folded_stacks_and_hot_frames():
+    stacks = {"main (a.py:1);grade (b.py:5)": 3, "main (a.py:1);encode (c.py:9)": 1}
+    hot = profiling.hot_frames(stacks)
+    assert hot["self"][0] == {"frame": "grade (b.py:5)", "samples": 3}
+    assert hot["inclusive"][0] == {"frame": "main (a.py:1)", "samples": 4}
+
+
+def test_profiles_are_opt_in_and_kept_in_a_ring(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "store", profiling.ProfileStore(str(tmp_path), keep=3))
+    monkeypatch.setattr(auth, "DEBUG_TOKEN", "secret")
+    debug = {"X-Debug-Token": "secret"}
+
+    # The header alone, or with a wrong token, does not profile
+    assert "X-Profile-Id" not in client.get("/test-profiling/busy/1", headers={"X-Profile": "1"}).headers
+    assert "X-Profile-Id" not in client.get("/test-profiling/busy/1", headers={"X-Profile": "1", "X-Debug-Token": "wrong"}).headers
+
+    resp = client.get("/test-profiling/busy/150", headers={"X-Profile": "1", **debug, "X-Request-ID": "prof-1"})
+    assert resp.status_code == 200
+    name = resp.headers["X-Profile-Id"]
+
+    listing = client.get("/debug/profiles", headers=debug).json()["profiles"]
+    assert [p["name"] for p in listing] == [name]
+    profile = listing[0]
+    assert profile["route"] == "/test-profiling/busy/{ms}" and profile["request_id"] == "prof-1" and profile["status"] == 200
+    assert profile["samples"] > 0 and profile["duration_ms"] >= 150 and profile["peak_busy_threads"] >= 1
+    assert any("_busy_grading" in f["frame"] for f in profile["hot_frames"]["inclusive"])
+
+    folded = client.get(f"/debug/profiles/{name}", headers=debug).text.splitlines()
+    assert folded and all(line.rsplit(" ", 1)[1].isdigit() for line in folded)
+    assert any("busy (test_profiling.py" in line and "_busy_grading" in line for line in folded)
+    assert client.get("/debug/profiles/nope", headers=debug).status_code == 404
+    assert client.get("/debug/profiles", headers={"X-Debug-Token": "wrong"}).status_code == 403
+
+    # A streamed body is produced after the endpoint returns and is still sampled
+    resp = client.get("/test-profiling/stream/150", headers={"X-Profile": "1", **debug})
+    assert resp.status_code == 200 and len(resp.text.splitlines()) == 3
+    streamed = client.get("/debug/profiles", headers=debug).json()["profiles"][0]
+    assert streamed["name"] == resp.headers["X-Profile-Id"] and streamed["duration_ms"] >= 150
+    assert any("_busy_rows" in f["frame"] for f in streamed["hot_frames"]["inclusive"])
+
+    # Sampling: every request is profiled, only the newest 3 are kept
+    monkeypatch.setattr(profiling, "SAMPLE_RATE", 1.0)
+    names = [client.get("/test-profiling/busy/1").headers["X-Profile-Id"] for _ in range(4)]
+    listing = client.get("/debug/profiles", headers=debug).json()["profiles"]
+    assert [p["name"] for p in listing] == names[::-1][:3]
+    assert len(list(tmp_path.iterdir())) == 6
+    assert client.get(f"/debug/profiles/{name}", headers=debug).status_code == 404
+
+
+if __name__ == "__main__":
+    import conftest
+    import pathlib
+    import tempfile
+    from _pytest.monkeypatch import MonkeyPatch
+    conftest.reset_database()
+    test_folded_stacks_and_hot_frames()
+    patch = MonkeyPatch()
+    with tempfile.TemporaryDirectory() as directory:
+        test_profiles_are_opt_in_and_kept_in_a_ring(patch, pathlib.Path(directory))
+    patch.undo()
+    print("PROFILING TESTS PASSED!")
@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import answer_keys
+import backfill_question_responses
+import database
+import main
+import models
+import responses
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def mcq(answer):
+    return {"questionText": "q", "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": answer}
+
+
+def response_rows(db, result_id):
+    return [
+        (r.question_id, r.position, r.chosen_index, r.answer_hash, r.is_correct)
+        for r in db.query(models.QuestionResponse).filter(models.QuestionResponse.result_id == result_id).order_by(models.QuestionResponse.id)
+    ]
+
+
+def test_submissions_append_graded_responses(make_user):
+    _, inst_headers = make_user("resp_inst@example.com", "instructor")
+    learner_id, headers = make_user("resp_learner@example.com", "learner")
+    course = {
+        "title": "Responses",
+        "description": "D",
+        "modules": [{"title": "M1", "quiz": [mcq(0), mcq(1)]}],
+        "assessment": [mcq(1), {"questionText": "d", "questionType": "descriptive", "options": [], "correctAnswerText": "Paris"}],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=headers)
+    module = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"][0]
+    m_ids = [q["id"] for q in module["quiz"]]
+
+    first = client.post(f"/modules/{module['id']}/quiz/submit", json={"total_questions": 2, "answers": [0, "x"]}, headers=headers).json()
+    client.post(f"/modules/{module['id']}/quiz/submit", json={"total_questions": 2, "answers": [1, 1]}, headers=headers)
+
+    db = database.SessionLocal()
+    # The retake updates the result but appends a second set of responses
+    assert response_rows(db, first["id"]) == [
+        (m_ids[0], 0, 0, None, True), (m_ids[1], 1, None, None, False),
+        (m_ids[0], 0, 1, None, False), (m_ids[1], 1, 1, None, True),
+    ]
+
+    client.post(f"/quizzes/{course_id}/submit", json={"answers": [1, " paris "]}, headers=headers)
+    result = db.query(models.QuizResult).filter(models.QuizResult.course_id == course_id).one()
+    rows = response_rows(db, result.id)
+    assert [r[4] for r in rows] == [True, True]
+    assert rows[1][3] == responses.answer_hash("PARIS")
+    assert {r.user_id for r in db.query(models.QuestionResponse)} == {learner_id}
+    db.close()
+
+
+def test_backfill_from_json_and_covering_index():
+    db = database.SessionLocal()
+    key = answer_keys.for_course(db, db.query(models.Course.id).scalar())
+    learner_id = db.query(models.User.id).filter(models.User.role == "learner").scalar()
+    legacy = models.QuizResult(user_id=learner_id, course_id=key.course_id, attempt=2, score=0, total_questions=2,
+                               question_ids=list(reversed(key.question_ids)), answers=["paris", 0])
+    db.add(legacy)
+    db.commit()
+
+    assert backfill_question_responses.backfill(chunk_size=1) == (1, 2)
+    assert response_rows(db, legacy.id) == [
+        (key.question_ids[1], 0, None, responses.answer_hash("paris"), True),
+        (key.question_ids[0], 1, 0, None, False),
+    ]
+    # Re-running skips results that already have responses
+    assert backfill_question_responses.backfill() == (0, 0)
+
+    plan = " ".join(str(row[-1]) for row in db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT question_id, count(*), sum(is_correct) FROM question_responses "
+        "WHERE question_id = :q GROUP BY question_id"
+    ), {"q": key.question_ids[0]}))
+    assert "COVERING INDEX ix_question_responses_question" in plan
+    db.close()
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_submissions_append_graded_responses(conftest.create_user)
+    test_backfill_from_json_and_covering_index()
+    print("QUESTION RESPONSE TESTS PASSED!")
@@ -0,0 +1,190 @@
+import json
+import logging
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+import database
+import main
+import models
+import quiz_sessions
+import rag
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def setup_module(module):
+    module.generate = rag.generate_single_adaptive_question
+    rag.generate_single_adaptive_question = lambda *args, **kwargs: None
+
+
+def teardown_module(module):
+    rag.generate_single_adaptive_question = module.generate
+
+
+def mcq(difficulty):
+    return {"questionText": f"{difficulty} q", "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": 0, "difficulty": difficulty}
+
+
+def test_session_drives_the_quiz_and_the_grade(make_user):
+    _, inst_headers = make_user("sess_inst@example.com", "instructor")
+    _, headers = make_user("sess_learner@example.com", "learner")
+    _, other_headers = make_user("sess_other@example.com", "learner")
+    course = {"title": "Sessions", "description": "D", "assessment": [mcq(d) for d in ("easy", "medium", "hard") for _ in range(3)]}
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=headers)
+
+    start = client.post(f"/quizzes/{course_id}/adaptive/start", headers=headers).json()
+    session_id, question = start["session_id"], start["question"]
+    url = f"/quizzes/{course_id}/adaptive/next"
+
+    # Correct answer: ability goes up
+    resp = client.post(url, json={"session_id": session_id, "question_id": question["id"], "answer": 0}, headers=headers).json()
+    assert resp["question"]["difficulty"] != "easy"
+    after_correct = quiz_sessions.store.get(session_id).ability
+    assert after_correct > 0
+    # Replaying the same step is rejected instead of recording a second answer
+    assert client.post(url, json={"session_id": session_id, "question_id": question["id"], "answer": 0}, headers=headers).status_code == 409
+    # ...and so is a step that does not say which question it answers
+    assert client.post(url, json={"session_id": session_id, "answer": 0}, headers=headers).status_code == 422
+    second = resp["question"]
+    # Sessions are bound to their learner and course
+    assert client.post(url, json={"session_id": session_id, "question_id": second["id"], "answer": 0}, headers=other_headers).status_code == 403
+    assert client.post(url, json={"session_id": "missing", "question_id": second["id"], "answer": 0}, headers=headers).status_code == 404
+
+    # Wrong answer: back down
+    resp = client.post(url, json={"session_id": session_id, "question_id": second["id"], "answer": 1}, headers=headers).json()
+    session = quiz_sessions.store.get(session_id)
+    assert session.ability < after_correct and session.standard_error < 1
+    assert session.question_ids == [question["id"], second["id"]]
+    assert session.answers == [0, 1] and session.correct == 1
+    assert session.current_id == resp["question"]["id"]
+
+    # Client-supplied answers are ignored; the recorded answers are graded
+    resp = client.post(f"/quizzes/{course_id}/submit", json={"is_adaptive": True, "session_id": session_id, "answers": [0, 0, 0]}, headers=headers).json()
+    assert (resp["score"], resp["totalQuestions"]) == (1, 2)
+    assert quiz_sessions.store.get(session_id) is None
+
+    db = database.SessionLocal()
+    result = db.query(models.QuizResult).filter(models.QuizResult.course_id == course_id).one()
+    assert result.question_ids == [question["id"], second["id"]] and result.answers == [0, 1]
+    db.close()
+
+    assert client.post(f"/quizzes/{course_id}/submit", json={"is_adaptive": True}, headers=headers).status_code == 400
+
+
+def test_steps_go_through_the_shared_store(make_user, monkeypatch):
+    _, inst_headers = make_user("sess_shared_inst@example.com", "instructor")
+    _, headers = make_user("sess_shared_learner@example.com", "learner")
+    course = {"title": "Shared Sessions", "description": "D", "assessment": [mcq(d) for d in ("easy", "medium", "hard") for _ in range(3)]}
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=headers)
+
+    # Two workers behind one Redis; every step is served by the other one
+    shared = cache.FakeRedis()
+    workers = [quiz_sessions.SessionStore(shared=shared), quiz_sessions.SessionStore(shared=shared)]
+    monkeypatch.setattr(quiz_sessions, "store", workers[0])
+    start = client.post(f"/quizzes/{course_id}/adaptive/start", headers=headers).json()
+    session_id, question = start["session_id"], start["question"]
+    served = [question["id"]]
+    for step in range(3):
+        monkeypatch.setattr(quiz_sessions, "store", workers[(step + 1) % 2])
+        resp = client.post(f"/quizzes/{course_id}/adaptive/next", json={"session_id": session_id, "question_id": question["id"], "answer": step % 2},
+                           headers=headers)
+        assert resp.status_code == 200, resp.text
+        question = resp.json()["question"]
+        served.append(question["id"])
+    assert len(set(served)) == 4
+    session = workers[0].get(session_id)
+    assert session.question_ids == served[:3] and session.answers == [0, 1, 0]
+    assert session.bank_version is not None
+
+    # A step still being processed on one worker turns away the same step on another
+    url, body = f"/quizzes/{course_id}/adaptive/next", {"session_id": session_id, "question_id": question["id"], "answer": 0}
+    with workers[1].step(session_id):
+        resp = client.post(url, json=body, headers=headers)
+        assert resp.status_code == 409 and resp.json()["detail"] == "This question is already being answered."
+        # ...and on the same worker
+        with pytest.raises(quiz_sessions.SessionBusy):
+            with workers[1].step(session_id):
+                pass
+    assert client.post(url, json=body, headers=headers).status_code == 200
+    assert len(workers[0].get(session_id).question_ids) == 4
+
+
+class HalfBroken(cache.FakeRedis):
+    """Reads and deletes work, writes fail."""
+
+    def set(self, *args, **kwargs):
+        raise ConnectionError("read-only replica")
+
+
+def test_a_failed_write_does_not_leave_a_stale_shared_copy():
+    shared = HalfBroken()
+    store = quiz_sessions.SessionStore(shared=shared)
+    session = store.create(1, 2, {"id": 10})
+    cache.FakeRedis.set(shared, store._key(session.session_id), json.dumps(session.to_dict()))
+    session.question_ids.append(10)
+    store.save(session)
+    # The older shared copy is gone instead of being served as the current state
+    assert store.get(session.session_id) is None
+
+
+class Unreachable:
+    def __getattr__(self, name):
+        raise ConnectionError("connection refused")
+
+
+def test_shared_store_and_ttl():
+    shared = cache.FakeRedis()
+    worker_a = quiz_sessions.SessionStore(shared=shared)
+    worker_b = quiz_sessions.SessionStore(shared=shared)
+
+    session = worker_a.create(1, 2, {"id": 10, "difficulty": "hard"})
+    session.answered_bits = 1 << 200
+    session.question_ids.append(10)
+    worker_a.save(session)
+
+    loaded = worker_b.get(session.session_id)
+    assert (loaded.current_id, loaded.question_ids, loaded.answered_bits) == (10, [10], 1 << 200)
+    worker_b.delete(session.session_id)
+    assert worker_a.get(session.session_id) is None
+
+    local = quiz_sessions.SessionStore(ttl=0.05)
+    session = local.create(1, 2, {"id": 10})
+    assert local.get(session.session_id) is not None
+    time.sleep(0.1)
+    assert local.get(session.session_id) is None
+
+    # An unreachable shared store degrades to local sessions, with a warning
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = warnings.append
+    quiz_sessions.logger.addHandler(handler)
+    try:
+        down = quiz_sessions.SessionStore(shared=Unreachable())
+        session = down.create(1, 2, {"id": 10})
+        assert down.get(session.session_id).current_id == 10
+    finally:
+        quiz_sessions.logger.removeHandler(handler)
+    assert [r.getMessage() for r in warnings] == [
+        "Session store unavailable (connection refused); session kept locally.",
+        "Session store unavailable (connection refused); using local sessions.",
+    ]
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    setup_module(__import__(__name__))
+    test_session_drives_the_quiz_and_the_grade(conftest.create_user)
+    from _pytest.monkeypatch import MonkeyPatch
+    patch = MonkeyPatch()
+    test_steps_go_through_the_shared_store(conftest.create_user, patch)
+    patch.undo()
+    test_shared_store_and_ttl()
+    test_a_failed_write_does_not_leave_a_stale_shared_copy()
+    print("ADAPTIVE SESSION TESTS PASSED!")
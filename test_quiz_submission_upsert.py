@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def mcq(answer):
+    return {"questionText": "q", "options": [{"text": "a"}, {"text": "b"}], "correctOptionIndex": answer}
+
+
+def create_course(title, inst_headers, learner_headers):
+    course = {
+        "title": title,
+        "description": "D",
+        "modules": [{"title": "M1", "quiz": [mcq(0), mcq(1)]}, {"title": "M2", "quiz": [mcq(0)]}],
+        "assessment": [mcq(1), mcq(0)],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+    client.post(f"/courses/{course_id}/enroll", headers=learner_headers)
+    modules = client.get(f"/courses/{course_id}", headers=inst_headers).json()["modules"]
+    return course_id, modules[0]["id"]
+
+
+def in_parallel(n, submit):
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(submit, range(n)))
+
+
+def count(db, model, *criteria):
+    return db.query(model).filter(*criteria).count()
+
+
+def test_parallel_module_submissions_upsert_one_result(make_user):
+    _, inst_headers = make_user("upsert_inst@example.com", "instructor")
+    learner_id, headers = make_user("upsert_learner@example.com", "learner")
+    course_id, module_id = create_course("Upsert", inst_headers, headers)
+
+    # Double-clicks without a key: every submission lands, on the same row
+    replies = in_parallel(8, lambda i: client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 2, "answers": [i % 2, 1]}, headers=headers))
+    assert [r.status_code for r in replies] == [200] * 8
+    assert len({r.json()["id"] for r in replies}) == 1
+
+    db = database.SessionLocal()
+    assert count(db, models.QuizResult, models.QuizResult.user_id == learner_id) == 1
+    assert count(db, models.QuestionResponse, models.QuestionResponse.user_id == learner_id) == 16
+    progress = db.query(models.CourseProgress).filter_by(user_id=learner_id, course_id=course_id).one()
+    assert progress.completed_modules == 1
+
+    # Retries of one submission (same Idempotency-Key) are applied once
+    retry = {**headers, "Idempotency-Key": "submit-1"}
+    replies = in_parallel(8, lambda i: client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 2, "answers": [0, 0]}, headers=retry))
+    assert {(r.status_code, r.json()["score"], r.json()["percentage"]) for r in replies} == {(200, 1, 50)}
+    assert count(db, models.QuestionResponse, models.QuestionResponse.user_id == learner_id) == 18
+
+    # The same key with a new body replays the stored submission; a new key updates it
+    replayed = client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 2, "answers": [0, 1]}, headers=retry).json()
+    assert replayed["userAnswers"] == [0, 0] and replayed["score"] == 1
+    updated = client.post(f"/modules/{module_id}/quiz/submit", json={"total_questions": 2, "answers": [0, 1]}, headers={**headers, "Idempotency-Key": "submit-2"}).json()
+    assert updated["score"] == 2 and updated["id"] == replayed["id"]
+    db.expire_all()
+    assert db.query(models.QuizResult.score).filter(models.QuizResult.user_id == learner_id).scalar() == 2
+    db.close()
+
+
+def test_parallel_final_assessment_submissions_keep_the_first_attempt(make_user):
+    _, inst_headers = make_user("final_inst@example.com", "instructor")
+    learner_id, headers = make_user("final_learner@example.com", "learner")
+    course_id, _ = create_course("Final", inst_headers, headers)
+
+    retry = {**headers, "Idempotency-Key": "final-1"}
+    replies = in_parallel(6, lambda i: client.post(f"/quizzes/{course_id}/submit", json={"answers": [1, 0]}, headers=retry))
+    assert [r.status_code for r in replies] == [200] * 6
+    assert all(r.json()["score"] == 2 and r.json()["certificate"] for r in replies)
+
+    db = database.SessionLocal()
+    assert count(db, models.QuizResult, models.QuizResult.course_id == course_id) == 1
+    assert count(db, models.QuestionResponse, models.QuestionResponse.user_id == learner_id) == 2
+    assert count(db, models.BackgroundJob, models.BackgroundJob.name == "award_final_assessment") == 1
+    db.close()
+
+    # A different submission after the attempt is taken is refused
+    resp = client.post(f"/quizzes/{course_id}/submit", json={"answers": [0, 0]}, headers=headers)
+    assert resp.status_code == 400
+    resp = client.post(f"/quizzes/{course_id}/submit", json={"answers": [0, 0]}, headers={**headers, "Idempotency-Key": "final-2"})
+    assert resp.status_code == 400
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_parallel_module_submissions_upsert_one_result(conftest.create_user)
+    test_parallel_final_assessment_submissions_keep_the_first_attempt(conftest.create_user)
+    print("QUIZ SUBMISSION UPSERT TESTS PASSED!")
@@ -0,0 +1,150 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import cache
+import database
+import main
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(database.engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(database.engine, "before_cursor_execute", self)
+
+
+def test_lru_eviction_and_ttl():
+    lru = cache.LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+
+    expired = cache.LRUCache(maxsize=2, ttl=-1)
+    expired.set("a", 1)
+    assert expired.get("a") is None
+
+
+def test_shared_tier_invalidation_is_seen_by_other_workers():
+    redis = cache.FakeRedis()
+    worker_a = cache.ResponseCache(shared=redis)
+    worker_b = cache.ResponseCache(shared=redis)
+
+    entry = worker_a.set("courses", "", ("catalogue",), [{"id": 1}])
+    # Worker B has an empty LRU but finds the entry in the shared tier
+    assert worker_b.get("courses", "", ("catalogue",)) == entry
+
+    worker_a.invalidate("catalogue")
+    assert worker_a.get("courses", "", ("catalogue",)) is None
+    assert worker_b.get("courses", "", ("catalogue",)) is None
+
+
+class Unreachable:
+    """A shared tier whose every call fails, like a Redis that went away."""
+
+    def __getattr__(self, name):
+        raise ConnectionError("connection refused")
+
+
+def test_an_unreachable_shared_tier_degrades_to_the_local_one():
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = warnings.append
+    cache.logger.addHandler(handler)
+    try:
+        worker = cache.ResponseCache(shared=Unreachable())
+        entry = worker.set("courses", "", ("catalogue",), [{"id": 1}])
+        assert worker.get("courses", "", ("catalogue",)) == entry
+        worker.invalidate("catalogue")
+        assert worker.get("courses", "", ("catalogue",)) is None
+    finally:
+        cache.logger.removeHandler(handler)
+    messages = {r.getMessage() for r in warnings}
+    assert all(r.levelno == logging.WARNING for r in warnings)
+    assert "Cache shared tier unavailable (connection refused); entry kept locally." in messages
+    assert "Cache shared tier unavailable (connection refused); invalidation is local only." in messages
+
+
+def test_catalogue_etag_and_invalidation(make_user):
+    _, inst_headers = make_user("cache_inst@example.com", "instructor")
+    _, learner_headers = make_user("cache_learner@example.com", "learner")
+
+    resp = client.post("/courses", json={"title": "Cached Course", "description": "D"}, headers=inst_headers)
+    assert resp.status_code == 200
+    course_id = resp.json()["id"]
+
+    first = client.get("/courses")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert [c["id"] for c in first.json()] == [course_id]
+
+    with StatementCounter() as counter:
+        not_modified = client.get("/courses", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert counter.count == 0, "a cached 304 must not touch the database"
+
+    # Enrolling changes enrolledCount, so the catalogue tag is invalidated
+    assert client.post(f"/courses/{course_id}/enroll", headers=learner_headers).status_code == 200
+    after = client.get("/courses", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["etag"] != etag
+    assert after.json()[0]["enrolledCount"] == 1
+
+
+def test_course_detail_is_cached_per_variant(make_user):
+    _, inst_headers = make_user("detail_inst@example.com", "instructor")
+    _, learner_headers = make_user("detail_learner@example.com", "learner")
+    course = {
+        "title": "Detail Course",
+        "description": "D",
+        "assessment": [{"questionText": "2+2?", "options": [{"text": "4"}, {"text": "5"}], "correctOptionIndex": 0}],
+    }
+    course_id = client.post("/courses", json=course, headers=inst_headers).json()["id"]
+
+    owner_view = client.get(f"/courses/{course_id}", headers=inst_headers).json()
+    learner_view = client.get(f"/courses/{course_id}", headers=learner_headers).json()
+    assert owner_view["assessment"][0]["correctOptionIndex"] == 0
+    assert "correctOptionIndex" not in learner_view["assessment"][0]
+    assert learner_view["isAssessmentCompleted"] is False
+    # Access errors keep their status instead of turning into a 500
+    resp = client.get("/courses/99999", headers=learner_headers)
+    assert resp.status_code == 404 and resp.json()["detail"] == "Course not found"
+
+    # Instructor views are served entirely from cache
+    etag = client.get(f"/courses/{course_id}", headers=inst_headers).headers["etag"]
+    with StatementCounter() as counter:
+        resp = client.get(f"/courses/{course_id}", headers={**inst_headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    # get_current_user still looks the caller up
+    assert counter.count == 1
+
+    course["title"] = "Detail Course v2"
+    assert client.put(f"/courses/{course_id}", json=course, headers=inst_headers).status_code == 200
+    assert client.get(f"/courses/{course_id}", headers=learner_headers).json()["title"] == "Detail Course v2"
+
+
+if __name__ == "__main__":
+    import conftest
+    conftest.reset_database()
+    test_lru_eviction_and_ttl()
+    test_shared_tier_invalidation_is_seen_by_other_workers()
+    test_an_unreachable_shared_tier_degrades_to_the_local_one()
+    test_catalogue_etag_and_invalidation(conftest.create_user)
+    test_course_detail_is_cached_per_variant(conftest.create_user)
+    print("RESPONSE CACHE TESTS PASSED!")
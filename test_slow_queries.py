@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import auth
+import database
+import main
+import slow_queries
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def teardown_module(module):
+    slow_queries.uninstall()
+
+
+def test_templates_shapes_and_plan_flags():
+    assert slow_queries.template("SELECT *\n  FROM users WHERE id = 42 AND name = 'o''brien' AND t1.x IN (?, ?, ?)") == \
+        "SELECT * FROM users WHERE id = ? AND name = ? AND t1.x IN (?...)"
+    assert slow_queries.parameter_shape((1, "a", None)) == "(int, str, NoneType)"
+    assert slow_queries.parameter_shape({"id": 1}) == "{id: int}"
+    assert slow_queries.parameter_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
+    assert slow_queries.plan_flags([
+        "SCAN question_responses",
+        "SEARCH users USING INDEX ix_users_email (email=?)",
+        "SCAN enrolments USING COVERING INDEX uq_enrolments_user_course",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]) == [
+        "full scan: question_responses",
+        "full scan: enrolments USING COVERING INDEX uq_enrolments_user_course",
+        "use temp b-tree for order by",
+    ]
+
+
+def test_slow_statements_are_aggregated_with_their_plans(make_user, monkeypatch):
+    # Threshold 0: every statement counts as slow
+    recorder = slow_queries.install(database.engine, threshold_ms=0)
+    recorder.clear()
+    _, inst_headers = make_user("slow_inst@example.com", "instructor")
+    client.post("/courses", json={"title": "Slow", "description": "D", "modules": []}, headers=inst_headers)
+    for _ in range(3):
+        client.get("/courses/my-courses", headers=inst_headers)
+
+    db = database.SessionLocal()
+    db.execute(text("SELECT count(*) FROM question_responses WHERE is_correct = 1")).scalar()
+    db.close()
+    recorder.wait_for_plans()
+
+    report = {q["template"]: q for q in recorder.report()}
+    my_courses = next(q for t, q in report.items() if t.startswith("SELECT courses.id") and "GET /courses/my-courses" in q["routes"])
+    assert my_courses["count"] == 3 and my_courses["routes"] == {"GET /courses/my-courses": 3}
+    assert my_courses["parameter_shapes"] == {"(int)": 3}
+    assert my_courses["plan"] and my_courses["plan"][0].startswith(("SCAN courses", "SEARCH courses"))
+
+    scan = report["SELECT count(*) FROM question_responses WHERE is_correct = ?"]
+    assert scan["routes"] == {"-": 1}
+    assert scan["warnings"][0].startswith("full scan: question_responses")
+    # Inserts are aggregated but not explained
+    assert any(q["plan"] is None for t, q in report.items() if t.startswith("INSERT INTO courses"))
+
+    monkeypatch.setattr(auth, "DEBUG_TOKEN", None)
+    assert client.get("/debug/slow-queries").status_code == 404
+    monkeypatch.setattr(auth, "DEBUG_TOKEN", "secret")
+    assert client.get("/debug/slow-queries", headers={"X-Debug-Token": "wrong"}).status_code == 403
+    resp = client.get("/debug/slow-queries", headers={"X-Debug-Token": "secret"})
+    assert resp.status_code == 200 and resp.json()["threshold_ms"] == 0
+    assert any(q["template"] == scan["template"] for q in resp.json()["queries"])
+
+
+if __name__ == "__main__":
+    import conftest
+    from _pytest.monkeypatch import MonkeyPatch
+    conftest.reset_database()
+    test_templates_shapes_and_plan_flags()
+    patch = MonkeyPatch()
+    test_slow_statements_are_aggregated_with_their_plans(conftest.create_user, patch)
+    patch.undo()
+    teardown_module(None)
+    print("SLOW QUERY TESTS PASSED!")
@@ -0,0 +1,65 @@
+import os
+
+from fastapi.testclient import TestClient
+
+import conftest
+import database
+import main
+import sql_budget
+
+client = TestClient(main.app)
+
+SMALL_SCALE = 2
+# Raise to hunt for N+1s on bigger data, e.g. SQL_BUDGET_SCALE=20
+LARGE_SCALE = int(os.getenv("SQL_BUDGET_SCALE", "5"))
+
+ROUTES = [
+    sql_budget.Route("get_course (owner)", "GET", "/courses/{course_id}", "instructor", 8),
+    sql_budget.Route("get_course (learner)", "GET", "/courses/{course_id}", "learner", 12),
+    sql_budget.Route("get_my_learners", "GET", "/courses/my-learners", "instructor", 2),
+    sql_budget.Route("get_my_courses (instructor)", "GET", "/courses/my-courses", "instructor", 2),
+    sql_budget.Route("get_my_courses (learner)", "GET", "/courses/my-courses", "learner", 3),
+    sql_budget.Route("get_batches (instructor)", "GET", "/batches", "instructor", 2),
+    sql_budget.Route("get_batches (learner)", "GET", "/batches", "learner", 2),
+    sql_budget.Route("get_my_certificates", "GET", "/users/me/certificates", "learner", 2),
+    sql_budget.Route("get_performance_report", "GET", "/courses/{course_id}/reports/performance", "instructor", 4),
+]
+
+
+def measure_at(scale):
+    conftest.reset_database()
+    db = database.SessionLocal()
+    try:
+        dataset = sql_budget.build_dataset(db, scale)
+    finally:
+        db.close()
+    return sql_budget.measure(client, ROUTES, dataset)
+
+
+def test_routes_stay_within_their_statement_budgets():
+    small = measure_at(SMALL_SCALE)
+    large = measure_at(LARGE_SCALE)
+    for route in ROUTES:
+        print(f"{route.name}: {len(small[route.name])} -> {len(large[route.name])} statements")
+    failures = sql_budget.check(ROUTES, small, large)
+    assert not failures, "\n" + "\n".join(failures)
+
+
+def test_repeated_templates_are_reported():
+    log = sql_budget.StatementLog()
+    for _ in range(3):
+        log._record(None, None, "SELECT users.id FROM users\n WHERE users.id = ?", (), None, False)
+    log._record(None, None, "SELECT courses.id FROM courses WHERE courses.id IN (?, ?, ?)", (), None, False)
+    assert log.repeated() == [("SELECT users.id FROM users WHERE users.id = ?", 3)]
+    assert sql_budget.template(log.statements[-1]).endswith("IN (?...)")
+
+    route = sql_budget.Route("lazy", "GET", "/", "learner", 2)
+    failures = sql_budget.check([route], {"lazy": sql_budget.StatementLog()}, {"lazy": log})
+    assert "grows with the data (0 -> 4)" in failures[0] and "budget is 2" in failures[0]
+    assert "3x SELECT users.id" in failures[0]
+
+
+if __name__ == "__main__":
+    test_routes_stay_within_their_statement_budgets()
+    test_repeated_templates_are_reported()
+    print("SQL BUDGET TESTS PASSED!")
@@ -0,0 +1,100 @@
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select, text
+
+import auth
+import database
+import main
+import models
+import progress
+import synthetic
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+
+def fingerprint(engine):
+    """Hash of every row of every table, in primary key order (bcrypt salts the password hash)."""
+    digest = hashlib.sha1()
+    with engine.connect() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            order = list(table.primary_key.columns) or list(table.c)
+            columns = [c for c in table.c if c.name != "password"]
+            for row in conn.execute(select(*columns).order_by(*order)):
+                digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def test_same_seed_same_database(tmp_path):
+    engines = [create_engine(f"sqlite:///{tmp_path / name}.db") for name in ("a", "b", "c")]
+    counts = [synthetic.generate(engine, "tiny", seed=seed) for engine, seed in zip(engines, (7, 7, 8))]
+    assert counts[0] == counts[1]
+    assert fingerprint(engines[0]) == fingerprint(engines[1]) != fingerprint(engines[2])
+    # More notifications leave the enrolments untouched
+    more = create_engine(f"sqlite:///{tmp_path / 'd'}.db")
+    synthetic.generate(more, synthetic.PRESETS["tiny"]._replace(notifications_per_user=6), seed=7)
+    with engines[0].connect() as a, more.connect() as d:
+        enrolments = "SELECT user_id, course_id, enrolled_at FROM enrolments ORDER BY id"
+        assert a.execute(text(enrolments)).all() == d.execute(text(enrolments)).all()
+        assert a.scalar(text("SELECT count(*) FROM notifications")) < d.scalar(text("SELECT count(*) FROM notifications"))
+    with pytest.raises(ValueError):
+        synthetic.generate(engines[0], "tiny", seed=7)
+
+
+def test_generated_data_is_consistent_with_the_app():
+    counts = synthetic.generate(database.engine, "tiny", seed=3)
+    db = database.SessionLocal()
+    try:
+        assert counts["users"] == 43 and counts["courses"] == 6 and counts["modules"] == 18
+        # Denormalised counters and materialised progress agree with what the app derives
+        for course in db.query(models.Course):
+            assert course.enrolment_count == db.query(models.Enrolment).filter_by(course_id=course.id).count()
+        written = {(p.user_id, p.course_id): (p.completed_modules, p.total_modules, p.module_score_sum, p.scored_modules, p.final_score)
+                   for p in db.query(models.CourseProgress)}
+        progress.rebuild(db)
+        db.commit()
+        rebuilt = {(p.user_id, p.course_id): (p.completed_modules, p.total_modules, p.module_score_sum, p.scored_modules, p.final_score)
+                   for p in db.query(models.CourseProgress).populate_existing()}
+        assert written.keys() == rebuilt.keys()
+        for key, (done, total, score_sum, scored, final) in written.items():
+            assert rebuilt[key][:2] == (done, total)
+            assert rebuilt[key][2] == pytest.approx(score_sum)
+            assert rebuilt[key][3:] == (scored, pytest.approx(final))
+
+        # Answers are graded the way the app grades them
+        for result in db.query(models.QuizResult).filter(models.QuizResult.module_id.is_not(None)).limit(50):
+            assert len(result.answers) == result.total_questions
+            rows = db.query(models.QuestionResponse).filter_by(result_id=result.id).order_by(models.QuestionResponse.position).all()
+            assert sum(r.is_correct for r in rows) == result.score
+        passed = db.query(func.count()).select_from(models.QuizResult).filter(
+            models.QuizResult.course_id.is_not(None), models.QuizResult.score * 2 >= models.QuizResult.total_questions
+        ).scalar()
+        assert db.query(models.Certificate).count() == passed > 0
+        # One final attempt per learner, as the app allows
+        finals = db.query(models.QuizResult.user_id, models.QuizResult.course_id, models.QuizResult.attempt).filter(
+            models.QuizResult.course_id.is_not(None)
+        ).all()
+        assert {attempt for _, _, attempt in finals} == {1} and len({(u, c) for u, c, _ in finals}) == len(finals)
+        learner = db.query(models.User).filter_by(role="learner").join(models.Enrolment).first()
+        enrolled = db.query(models.Enrolment).filter_by(user_id=learner.id).count()
+    finally:
+        db.close()
+
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': learner.email})}"}
+    resp = client.get("/courses/my-courses", headers=headers)
+    assert resp.status_code == 200 and len(resp.json()) == enrolled
+    login = client.post("/auth/login", json={"username": learner.email, "password": synthetic.PASSWORD})
+    assert login.status_code == 200
+
+
+if __name__ == "__main__":
+    import conftest
+    import pathlib
+    import tempfile
+    conftest.reset_database()
+    with tempfile.TemporaryDirectory() as directory:
+        test_same_seed_same_database(pathlib.Path(directory))
+    test_generated_data_is_consistent_with_the_app()
+    print("SYNTHETIC DATA TESTS PASSED!")
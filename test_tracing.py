@@ -0,0 +1,151 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+import main
+import rag
+import tracing
+
+client = TestClient(main.app)
+pytestmark = pytest.mark.usefixtures("fresh_database")
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class Collector:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def trace(self, trace_id):
+        tracing.flush()
+        return [s for s in self.spans if format(s.context.trace_id, "032x") == trace_id]
+
+
+def test_request_sql_and_serialisation_spans_continue_the_callers_trace(make_user, monkeypatch):
+    collector = Collector()
+    monkeypatch.setattr(tracing.provider, "exporters", [collector])
+    _, inst_headers = make_user("trace_inst@example.com", "instructor")
+    course_id = client.post("/courses", json={"title": "Traced", "description": "D", "modules": []}, headers=inst_headers).json()["id"]
+    cache.response_cache.clear()
+
+    traceparent = f"00-{TRACE_ID}-{PARENT_ID}-01"
+    assert client.get(f"/courses/{course_id}", headers={**inst_headers, "traceparent": traceparent}).status_code == 200
+    spans = collector.trace(TRACE_ID)
+    by_id = {s.context.span_id: s for s in spans}
+
+    server = next(s for s in spans if s.kind == tracing.SpanKind.SERVER)
+    assert server.name == "GET /courses/{course_id}"
+    assert format(server.parent.span_id, "016x") == PARENT_ID and server.parent.is_remote
+    assert server.attributes["http.response.status_code"] == 200
+
+    sql = [s for s in spans if s.attributes.get("db.system.name") == "sqlite"]
+    assert sql and all(s.name == "SELECT" and s.kind == tracing.SpanKind.CLIENT for s in sql)
+    encode = next(s for s in spans if s.name == "json.encode")
+    names = {s.name for s in spans}
+    assert {"fastapi.dependencies", "fastapi.endpoint"} <= names
+    # Every span hangs off the server span
+    for s in sql + [encode]:
+        ancestor = s
+        while ancestor is not server:
+            ancestor = by_id[ancestor.parent.span_id]
+    assert all(s.end_time >= s.start_time for s in spans)
+
+    # An unsampled caller: nothing is recorded
+    client.get(f"/courses/{course_id}", headers={**inst_headers, "traceparent": f"00-{'1' * 32}-{PARENT_ID}-00"})
+    assert collector.trace("1" * 32) == []
+
+
+def test_llm_calls_and_index_loads_are_traced(monkeypatch, tmp_path):
+    collector = Collector()
+    monkeypatch.setattr(tracing.provider, "exporters", [collector])
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="An answer"))])
+
+    monkeypatch.setattr(rag, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    index_file = tmp_path / "vector_store.json"
+    index_file.write_text(json.dumps([{"text": "Course: SQL", "embedding": {"sql": 1}}]))
+    monkeypatch.setattr(rag, "INDEX_FILE", str(index_file))
+    monkeypatch.setattr(rag, "VECTOR_STORE", None)
+
+    resp = client.post("/api/chat", json={"message": "what is sql"}, headers={"traceparent": f"00-{TRACE_ID[::-1]}-{PARENT_ID}-01"})
+    assert resp.json() == {"response": "An answer"}
+    spans = {s.name: s for s in collector.trace(TRACE_ID[::-1])}
+    assert {"POST /api/chat", "rag.retrieve", "rag.load_index", "chat chat"} <= set(spans)
+    assert spans["rag.load_index"].parent.span_id == spans["rag.retrieve"].context.span_id
+    llm = spans["chat chat"]
+    assert llm.kind == tracing.SpanKind.CLIENT and llm.attributes["gen_ai.request.model"] == "llama-3.1-8b-instant"
+    # The provider is handed the LLM span as its parent
+    assert calls[0]["extra_headers"]["traceparent"] == f"00-{TRACE_ID[::-1]}-{format(llm.context.span_id, '016x')}-01"
+
+    # Tracing off: no spans, no headers
+    monkeypatch.setattr(tracing.provider, "exporters", [])
+    client.post("/api/chat", json={"message": "what is sql"})
+    assert "extra_headers" not in calls[1]
+
+
+def test_file_and_otlp_exporters(tmp_path):
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.path, self.headers["Content-Type"], json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    provider = tracing.TracerProvider()
+    provider.add_exporter(tracing.FileExporter(str(tmp_path / "traces.jsonl")))
+    provider.add_exporter(tracing.OTLPHttpExporter(f"http://127.0.0.1:{server.server_port}", service_name="edweb-test"))
+    tracer = provider.get_tracer("test")
+    try:
+        with tracer.start_as_current_span("outer", attributes={"n": 1, "ok": True}):
+            with tracer.start_as_current_span("inner", kind=tracing.SpanKind.CLIENT):
+                pass
+        provider.shutdown()
+    finally:
+        server.shutdown()
+
+    lines = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [s["name"] for s in lines] == ["inner", "outer"]
+    assert lines[0]["parent_span_id"] == lines[1]["span_id"] and lines[0]["trace_id"] == lines[1]["trace_id"]
+
+    assert all(path == "/v1/traces" and content_type == "application/json" for path, content_type, _ in received)
+    resources = [payload["resourceSpans"][0] for _, _, payload in received]
+    assert resources[0]["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "edweb-test"}}]
+    # Spans may arrive in one batch or several
+    inner, outer = [span for r in resources for span in r["scopeSpans"][0]["spans"]]
+    assert inner["kind"] == 3 and inner["parentSpanId"] == outer["spanId"] and outer["parentSpanId"] == ""
+    assert {"key": "n", "value": {"intValue": "1"}} in outer["attributes"]
+
+
+if __name__ == "__main__":
+    import conftest
+    import pathlib
+    import tempfile
+    from _pytest.monkeypatch import MonkeyPatch
+    conftest.reset_database()
+    patch = MonkeyPatch()
+    test_request_sql_and_serialisation_spans_continue_the_callers_trace(conftest.create_user, patch)
+    patch.undo()
+    with tempfile.TemporaryDirectory() as directory:
+        test_llm_calls_and_index_loads_are_traced(patch, pathlib.Path(directory))
+        patch.undo()
+    with tempfile.TemporaryDirectory() as directory:
+        test_file_and_otlp_exporters(pathlib.Path(directory))
+    print("TRACING TESTS PASSED!")
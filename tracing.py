@@ -0,0 +1,372 @@
+"""
+Request tracing: OpenTelemetry spans with offline exporters.
+
+FastAPI already emits OpenTelemetry spans for every request (the server span
+named after the route, plus fastapi.dependencies / fastapi.endpoint /
+fastapi.serialization) and continues W3C traceparent headers, once it is
+given a TracerProvider. This module is that provider, implemented on the
+opentelemetry-api package FastAPI depends on (no SDK needed), and adds the
+spans the framework cannot see: every SQL statement (instrument_engine),
+LLM calls, RAG index load/save/retrieve and JSON encoding (span()).
+Outgoing LLM calls carry the traceparent (inject()).
+
+Finished spans are exported by a background thread, so requests never wait
+for an exporter. Settings (environment):
+  TRACE_EXPORTER               comma-separated: console, file, otlp; unset disables tracing
+  TRACE_FILE                   JSON-lines file for the file exporter (logs/traces.jsonl)
+  TRACE_SAMPLE_RATE            share of new traces recorded (1.0); continued traces follow the caller's flag
+  OTEL_EXPORTER_OTLP_ENDPOINT  OTLP/HTTP collector, e.g. a local one (http://localhost:4318)
+  OTEL_SERVICE_NAME            service.name of exported spans (edweb)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+import urllib.request
+from contextlib import contextmanager, nullcontext
+from time import time_ns
+
+from opentelemetry import propagate, trace
+from opentelemetry.trace import NonRecordingSpan, SpanContext, SpanKind, Status, StatusCode, TraceFlags
+from sqlalchemy import event
+
+logger = logging.getLogger("edweb.tracing")
+
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "edweb")
+
+# Finished spans waiting for the exporters; more are dropped, not buffered
+QUEUE_SIZE = 10000
+# Spans per export call
+BATCH_SIZE = 512
+
+
+class Span(trace.Span):
+    """A recording span; handed to the exporters when it ends."""
+
+    def __init__(self, provider, scope, name, context, parent, kind, attributes, start_time):
+        self._provider = provider
+        self.scope = scope
+        self.name = name
+        self.context = context
+        self.parent = parent
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = Status(StatusCode.UNSET)
+        self.start_time = start_time or time_ns()
+        self.end_time = None
+
+    def get_span_context(self):
+        return self.context
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, attributes=None, timestamp=None):
+        self.events.append((name, dict(attributes or {}), timestamp or time_ns()))
+
+    def update_name(self, name):
+        self.name = name
+
+    def is_recording(self):
+        return self.end_time is None
+
+    def set_status(self, status, description=None):
+        self.status = status if isinstance(status, Status) else Status(status, description)
+
+    def record_exception(self, exception, attributes=None, timestamp=None, escaped=False):
+        self.add_event("exception", {
+            "exception.type": type(exception).__qualname__,
+            "exception.message": str(exception),
+            "exception.stacktrace": "".join(traceback.format_exception(exception)),
+            "exception.escaped": escaped,
+            **(attributes or {}),
+        }, timestamp)
+
+    def end(self, end_time=None):
+        if self.end_time is None:
+            self.end_time = end_time or time_ns()
+            self._provider._finished(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": format(self.context.trace_id, "032x"),
+            "span_id": format(self.context.span_id, "016x"),
+            "parent_span_id": format(self.parent.span_id, "016x") if self.parent else None,
+            "name": self.name,
+            "kind": self.kind.name,
+            "scope": self.scope,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.end_time,
+            "duration_ms": round((self.end_time - self.start_time) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": [{"name": n, "attributes": a, "time_unix_nano": t} for n, a, t in self.events],
+            "status": {"code": self.status.status_code.name, "description": self.status.description},
+        }
+
+
+class Tracer(trace.Tracer):
+    def __init__(self, provider, scope):
+        self._provider = provider
+        self.scope = scope
+
+    def start_span(self, name, context=None, kind=SpanKind.INTERNAL, attributes=None, links=None,
+                   start_time=None, record_exception=True, set_status_on_exception=True):
+        return self._provider._start(self.scope, name, context, kind, attributes, start_time)
+
+    @contextmanager
+    def start_as_current_span(self, name, context=None, kind=SpanKind.INTERNAL, attributes=None, links=None,
+                              start_time=None, record_exception=True, set_status_on_exception=True, end_on_exit=True):
+        span = self.start_span(name, context, kind, attributes, links, start_time)
+        with trace.use_span(span, end_on_exit=end_on_exit, record_exception=record_exception,
+                            set_status_on_exception=set_status_on_exception) as span:
+            yield span
+
+
+class TracerProvider(trace.TracerProvider):
+    """Samples new traces, follows the sampled flag of continued ones, exports finished spans in the background."""
+
+    def __init__(self, sample_rate=1.0):
+        self.sample_rate = sample_rate
+        self.exporters = []
+        self.dropped = 0
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.exporters)
+
+    def get_tracer(self, instrumenting_module_name, instrumenting_library_version=None, schema_url=None, attributes=None):
+        return Tracer(self, instrumenting_module_name)
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def _start(self, scope, name, context, kind, attributes, start_time):
+        if not self.exporters:
+            return trace.INVALID_SPAN
+        parent = trace.get_current_span(context).get_span_context()
+        if parent.is_valid:
+            trace_id, sampled = parent.trace_id, parent.trace_flags.sampled
+        else:
+            trace_id, sampled = random.getrandbits(128) or 1, random.random() < self.sample_rate
+        span_context = SpanContext(
+            trace_id, random.getrandbits(64) or 1, is_remote=False,
+            trace_flags=TraceFlags(TraceFlags.SAMPLED if sampled else TraceFlags.DEFAULT),
+            trace_state=parent.trace_state if parent.is_valid else None,
+        )
+        if not sampled:
+            # Not recorded, but still propagated so downstream calls agree
+            return NonRecordingSpan(span_context)
+        return Span(self, scope, name, span_context, parent if parent.is_valid else None, kind, attributes, start_time)
+
+    # --- export ---
+
+    def _finished(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._export_loop, name="trace-export", daemon=True)
+                    self._worker.start()
+
+    def _export_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for exporter in list(self.exporters):
+                try:
+                    exporter.export(batch)
+                except Exception:
+                    logger.warning("Trace export to %s failed", type(exporter).__name__, exc_info=True)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every finished span has been exported."""
+        self._queue.join()
+
+    def shutdown(self):
+        self.flush()
+        for exporter in self.exporters:
+            close = getattr(exporter, "shutdown", None)
+            if close is not None:
+                close()
+        self.exporters = []
+
+
+# --- exporters ---
+
+class ConsoleExporter:
+    """One JSON line per span on stderr."""
+
+    def export(self, spans):
+        sys.stderr.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans))
+
+
+class FileExporter:
+    """One JSON line per span, appended to a file."""
+
+    def __init__(self, path=TRACE_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans):
+        self._file.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans))
+        self._file.flush()
+
+    def shutdown(self):
+        self._file.close()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def otlp_payload(spans, service_name=SERVICE_NAME):
+    """An OTLP/JSON ExportTraceServiceRequest for the spans, grouped by instrumentation scope."""
+    scopes = {}
+    for s in spans:
+        scopes.setdefault(s.scope, []).append({
+            "traceId": format(s.context.trace_id, "032x"),
+            "spanId": format(s.context.span_id, "016x"),
+            "parentSpanId": format(s.parent.span_id, "016x") if s.parent else "",
+            "name": s.name,
+            # OTLP numbers kinds from 1 (INTERNAL), the API from 0
+            "kind": s.kind.value + 1,
+            "startTimeUnixNano": str(s.start_time),
+            "endTimeUnixNano": str(s.end_time),
+            "attributes": _otlp_attributes(s.attributes),
+            "events": [{"name": n, "timeUnixNano": str(t), "attributes": _otlp_attributes(a)} for n, a, t in s.events],
+            "status": {"code": s.status.status_code.value, "message": s.status.description or ""},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+        "scopeSpans": [{"scope": {"name": name}, "spans": items} for name, items in scopes.items()],
+    }]}
+
+
+class OTLPHttpExporter:
+    """OTLP/HTTP with JSON encoding, e.g. to a collector or Jaeger running locally."""
+
+    def __init__(self, endpoint=OTLP_ENDPOINT, service_name=SERVICE_NAME, timeout=5):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans):
+        body = json.dumps(otlp_payload(spans, self.service_name)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+EXPORTERS = {"console": ConsoleExporter, "file": FileExporter, "otlp": OTLPHttpExporter}
+
+provider = TracerProvider(float(os.getenv("TRACE_SAMPLE_RATE", "1.0")))
+tracer = provider.get_tracer("edweb")
+
+
+def configure(exporters=None):
+    """Add the exporters named in TRACE_EXPORTER (once per process). Returns the provider."""
+    names = os.getenv("TRACE_EXPORTER", "") if exporters is None else exporters
+    if not provider.exporters:
+        for name in filter(None, (n.strip().lower() for n in names.split(","))):
+            if name not in EXPORTERS:
+                raise ValueError(f"Unknown TRACE_EXPORTER {name!r}, expected one of {', '.join(EXPORTERS)}")
+            provider.add_exporter(EXPORTERS[name]())
+        if provider.exporters:
+            atexit.register(provider.shutdown)
+    return provider
+
+
+def flush():
+    provider.flush()
+
+
+_NO_SPAN = nullcontext(trace.INVALID_SPAN)
+
+
+def span(name, kind=SpanKind.INTERNAL, attributes=None):
+    """Context manager timing a block as a child of the current span (a no-op while tracing is off)."""
+    if not provider.exporters:
+        return _NO_SPAN
+    return tracer.start_as_current_span(name, kind=kind, attributes=attributes)
+
+
+def inject(headers=None):
+    """headers (a new dict by default) with the current traceparent added, for outgoing calls."""
+    headers = {} if headers is None else headers
+    if provider.exporters:
+        propagate.inject(headers)
+    return headers
+
+
+# --- SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Only statements run within a trace; startup, migrations and background threads would each start one
+    if context is None or not provider.exporters or not trace.get_current_span().get_span_context().is_valid:
+        return
+    operation = statement.lstrip()[:16].split(None, 1)[0].upper() if statement.strip() else "SQL"
+    attributes = {"db.system.name": conn.dialect.name, "db.operation.name": operation, "db.query.text": statement}
+    if executemany:
+        attributes["db.operation.batch.size"] = len(parameters)
+    context._trace_span = tracer.start_span(operation, kind=SpanKind.CLIENT, attributes=attributes)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        context._trace_span = None
+        span.end()
+
+
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        exception_context.execution_context._trace_span = None
+        span.record_exception(exception_context.original_exception)
+        span.set_status(StatusCode.ERROR)
+        span.end()
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
@@ -27,6 +27,7 @@ def test_adaptive():
         print(f"Start failed: {start_res.text}")
         return
     
+    session_id = start_res.json()["session_id"]
     q1 = start_res.json()["question"]
     print(f"Q1 (ID: {q1['id']}, Difficulty: {q1.get('difficulty')}): {q1['questionText'][:50]}...")
     
@@ -42,9 +43,9 @@ def test_adaptive():
     
     print(f"Answering Q1...")
     next_res = requests.post(f"{BASE_URL}/quizzes/{course_id}/adaptive/next", headers=headers, json={
-        "answered_ids": [q1['id']],
-        "last_answer": 0, # Assuming 0 might be right or we just see it change
-        "last_difficulty": last_difficulty
+        "session_id": session_id,
+        "question_id": q1['id'],
+        "answer": 0, # Assuming 0 might be right or we just see it change
     })
     
     if next_res.status_code == 200: